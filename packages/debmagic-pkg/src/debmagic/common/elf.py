@@ -0,0 +1,358 @@
+"""
+minimal ELF reader, enough to classify files and read notes and sections
+without running readelf/objdump for every file.
+"""
+
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Self
+
+ELF_MAGIC = b"\x7fELF"
+
+# e_type
+ET_REL = 1
+ET_EXEC = 2
+ET_DYN = 3
+ET_CORE = 4
+
+# sh_type
+SHT_NOTE = 7
+SHT_NOBITS = 8
+
+# d_tag
+DT_NULL = 0
+DT_NEEDED = 1
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+# symbol st_info binding and type
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STB_WEAK = 2
+STB_GNU_UNIQUE = 10
+STT_FUNC = 2
+STT_OBJECT = 1
+SHN_UNDEF = 0
+
+NT_GNU_BUILD_ID = 3
+
+
+def is_elf(path: Path) -> bool:
+    try:
+        with path.open("rb") as fd:
+            return fd.read(4) == ELF_MAGIC
+    except OSError:
+        return False
+
+
+@dataclass
+class Section:
+    name: str
+    type: int
+    offset: int
+    size: int
+    link: int
+    entsize: int
+
+
+@dataclass
+class Symbol:
+    name: str
+    #: symbol version, like "GLIBC_2.34"
+    version: str | None
+    #: False for symbols imported from another object
+    defined: bool
+    binding: int
+    type: int
+    #: hidden version, can't be linked against
+    hidden: bool = False
+
+
+@dataclass
+class ElfFile:
+    path: Path
+    #: 32 or 64
+    bits: int
+    little_endian: bool
+    #: ET_REL, ET_EXEC, ET_DYN, ...
+    type: int
+    machine: int
+    sections: list[Section] = field(default_factory=list)
+
+    @classmethod
+    def read(cls, path: Path) -> Self | None:
+        """
+        parse the ELF header and section table, None if this isn't an ELF file.
+        """
+        with path.open("rb") as fd:
+            ident = fd.read(16)
+            if len(ident) < 16 or ident[:4] != ELF_MAGIC or ident[4] not in (1, 2) or ident[5] not in (1, 2):
+                return None
+
+            bits = 32 if ident[4] == 1 else 64
+            endian = "<" if ident[5] == 1 else ">"
+            if bits == 64:
+                header_fmt = f"{endian}HHIQQQIHHHHHH"
+            else:
+                header_fmt = f"{endian}HHIIIIIHHHHHH"
+            header = fd.read(struct.calcsize(header_fmt))
+            if len(header) < struct.calcsize(header_fmt):
+                return None
+            e_type, e_machine, _, _, _, e_shoff, _, _, _, _, e_shentsize, e_shnum, e_shstrndx = struct.unpack(
+                header_fmt, header
+            )
+
+            elf = cls(path=path, bits=bits, little_endian=endian == "<", type=e_type, machine=e_machine)
+            elf.sections = elf._read_sections(fd, e_shoff, e_shentsize, e_shnum, e_shstrndx)
+            return elf
+
+    def _read_sections(self, fd: BinaryIO, offset: int, entsize: int, count: int, strndx: int) -> list[Section]:
+        if offset == 0 or count == 0:
+            return []
+
+        if self.bits == 64:
+            section_fmt = f"{self._endian}IIQQQQIIQQ"
+        else:
+            section_fmt = f"{self._endian}IIIIIIIIII"
+
+        fd.seek(offset)
+        table = fd.read(entsize * count)
+        raw_sections = [
+            struct.unpack_from(section_fmt, table, idx * entsize)
+            for idx in range(count)
+            if (idx + 1) * entsize <= len(table)
+        ]
+        if strndx >= len(raw_sections):
+            return []
+
+        # section names are stored in the section name string table
+        _, _, _, _, str_offset, str_size, _, _, _, _ = raw_sections[strndx]
+        fd.seek(str_offset)
+        names = fd.read(str_size)
+
+        sections: list[Section] = []
+        for name_idx, sh_type, _, _, sh_offset, sh_size, sh_link, _, _, sh_entsize in raw_sections:
+            name = names[name_idx : names.find(b"\0", name_idx)].decode(errors="replace")
+            sections.append(
+                Section(name=name, type=sh_type, offset=sh_offset, size=sh_size, link=sh_link, entsize=sh_entsize)
+            )
+        return sections
+
+    @property
+    def _endian(self) -> str:
+        return "<" if self.little_endian else ">"
+
+    def section(self, name: str) -> Section | None:
+        return next((section for section in self.sections if section.name == name), None)
+
+    def section_data(self, section: Section) -> bytes:
+        if section.type == SHT_NOBITS:
+            return b""
+        with self.path.open("rb") as fd:
+            fd.seek(section.offset)
+            return fd.read(section.size)
+
+    @property
+    def has_debug_info(self) -> bool:
+        return any(section.name.startswith((".debug_", ".zdebug_")) for section in self.sections)
+
+    @property
+    def has_symtab(self) -> bool:
+        return self.section(".symtab") is not None
+
+    @property
+    def build_id(self) -> str | None:
+        """
+        the GNU build-id as hex string
+        """
+        for section in self.sections:
+            if section.type != SHT_NOTE:
+                continue
+            for name, note_type, desc in self._notes(self.section_data(section)):
+                if name == b"GNU" and note_type == NT_GNU_BUILD_ID:
+                    return desc.hex()
+        return None
+
+    def _notes(self, data: bytes) -> list[tuple[bytes, int, bytes]]:
+        notes: list[tuple[bytes, int, bytes]] = []
+        pos = 0
+        while pos + 12 <= len(data):
+            namesz, descsz, note_type = struct.unpack_from(f"{self._endian}III", data, pos)
+            pos += 12
+            name = data[pos : pos + namesz].rstrip(b"\0")
+            pos += (namesz + 3) & ~3
+            desc = data[pos : pos + descsz]
+            pos += (descsz + 3) & ~3
+            notes.append((name, note_type, desc))
+        return notes
+
+    def _strings(self, section_idx: int) -> bytes:
+        if section_idx >= len(self.sections):
+            return b""
+        return self.section_data(self.sections[section_idx])
+
+    @staticmethod
+    def _string(strings: bytes, offset: int) -> str:
+        return strings[offset : strings.find(b"\0", offset)].decode(errors="replace")
+
+    def _dynamic(self) -> tuple[list[tuple[int, int]], bytes]:
+        """
+        the dynamic section's (d_tag, d_val) entries and its string table
+        """
+        section = self.section(".dynamic")
+        if section is None:
+            return [], b""
+        data = self.section_data(section)
+        entry_fmt = f"{self._endian}qQ" if self.bits == 64 else f"{self._endian}iI"
+        entries: list[tuple[int, int]] = []
+        for tag, value in struct.iter_unpack(entry_fmt, data[: len(data) - len(data) % struct.calcsize(entry_fmt)]):
+            if tag == DT_NULL:
+                break
+            entries.append((tag, value))
+        return entries, self._strings(section.link)
+
+    @property
+    def needed(self) -> list[str]:
+        """
+        DT_NEEDED entries, the sonames of the libraries this object links to
+        """
+        entries, strings = self._dynamic()
+        return [self._string(strings, value) for tag, value in entries if tag == DT_NEEDED]
+
+    @property
+    def soname(self) -> str | None:
+        entries, strings = self._dynamic()
+        return next((self._string(strings, value) for tag, value in entries if tag == DT_SONAME), None)
+
+    @property
+    def library_path(self) -> list[str]:
+        """
+        the object's own library search dirs: DT_RUNPATH, or DT_RPATH if there's none, like ld.so.
+        `$ORIGIN` is left for the caller to expand.
+        """
+        entries, strings = self._dynamic()
+        for wanted in (DT_RUNPATH, DT_RPATH):
+            paths = [self._string(strings, value) for tag, value in entries if tag == wanted]
+            if paths:
+                return [directory for path in paths for directory in path.split(":") if directory]
+        return []
+
+    def dynamic_symbols(self) -> list[Symbol]:
+        """
+        the dynamic symbol table, with symbol versions
+        """
+        section = self.section(".dynsym")
+        if section is None:
+            return []
+        data = self.section_data(section)
+        strings = self._strings(section.link)
+
+        versions = self._version_names()
+        version_section = self.section(".gnu.version")
+        version_idx: list[int] = []
+        if version_section is not None:
+            version_data = self.section_data(version_section)
+            version_idx = [idx for (idx,) in struct.iter_unpack(f"{self._endian}H", version_data)]
+
+        if self.bits == 64:
+            symbol_fmt = f"{self._endian}IBBHQQ"
+        else:
+            symbol_fmt = f"{self._endian}IIIBBH"
+        entsize = section.entsize or struct.calcsize(symbol_fmt)
+
+        symbols: list[Symbol] = []
+        # the first entry is always the null symbol
+        for idx in range(1, len(data) // entsize):
+            fields = struct.unpack_from(symbol_fmt, data, idx * entsize)
+            if self.bits == 64:
+                st_name, st_info, _, st_shndx, _, _ = fields
+            else:
+                st_name, _, _, st_info, _, st_shndx = fields
+            name = self._string(strings, st_name)
+            if not name:
+                continue
+
+            version: str | None = None
+            hidden = False
+            if idx < len(version_idx):
+                # index 0 is local, 1 is the unversioned global
+                hidden = bool(version_idx[idx] & 0x8000)
+                version = versions.get(version_idx[idx] & 0x7FFF)
+
+            symbols.append(
+                Symbol(
+                    name=name,
+                    version=version,
+                    defined=st_shndx != SHN_UNDEF,
+                    binding=st_info >> 4,
+                    type=st_info & 0xF,
+                    hidden=hidden,
+                )
+            )
+        return symbols
+
+    def _version_names(self) -> dict[int, str]:
+        """
+        symbol version index -> version name, from version definitions and requirements
+        """
+        versions: dict[int, str] = {}
+
+        if (verdef := self.section(".gnu.version_d")) is not None:
+            data = self.section_data(verdef)
+            strings = self._strings(verdef.link)
+            pos = 0
+            while pos + 20 <= len(data):
+                _, flags, ndx, cnt, _, aux, next_offset = struct.unpack_from(f"{self._endian}HHHHIII", data, pos)
+                # VER_FLG_BASE is the object's own name, not a symbol version
+                if cnt and not flags & 0x1:
+                    (name_offset, _) = struct.unpack_from(f"{self._endian}II", data, pos + aux)
+                    versions[ndx] = self._string(strings, name_offset)
+                if not next_offset:
+                    break
+                pos += next_offset
+
+        if (verneed := self.section(".gnu.version_r")) is not None:
+            data = self.section_data(verneed)
+            strings = self._strings(verneed.link)
+            pos = 0
+            while pos + 16 <= len(data):
+                _, cnt, _, aux, next_offset = struct.unpack_from(f"{self._endian}HHIII", data, pos)
+                aux_pos = pos + aux
+                for _ in range(cnt):
+                    _, _, other, name_offset, aux_next = struct.unpack_from(f"{self._endian}IHHII", data, aux_pos)
+                    versions[other] = self._string(strings, name_offset)
+                    if not aux_next:
+                        break
+                    aux_pos += aux_next
+                if not next_offset:
+                    break
+                pos += next_offset
+
+        return versions
+
+    def version_requirements(self) -> dict[str, str]:
+        """
+        symbol version -> soname of the library that has to provide it
+        """
+        requirements: dict[str, str] = {}
+        if (verneed := self.section(".gnu.version_r")) is None:
+            return requirements
+        data = self.section_data(verneed)
+        strings = self._strings(verneed.link)
+        pos = 0
+        while pos + 16 <= len(data):
+            _, cnt, file_offset, aux, next_offset = struct.unpack_from(f"{self._endian}HHIII", data, pos)
+            soname = self._string(strings, file_offset)
+            aux_pos = pos + aux
+            for _ in range(cnt):
+                _, _, _, name_offset, aux_next = struct.unpack_from(f"{self._endian}IHHII", data, aux_pos)
+                requirements[self._string(strings, name_offset)] = soname
+                if not aux_next:
+                    break
+                aux_pos += aux_next
+            if not next_offset:
+                break
+            pos += next_offset
+        return requirements
@@ -0,0 +1,235 @@
+"""
+executors run the commands issued through `run_cmd` and `Build.cmd`.
+
+- `LocalExecutor` spawns them, the default
+- `RecordingExecutor` only records what would be run: arguments, working directory and environment
+- `ReplayExecutor` answers them with canned results, to test rules files and presets without spawning anything
+
+```
+build.executor = ReplayExecutor().respond(["make", "-pRrq"], stdout="all: foo\n")
+...
+assert build.executor.commands() == [["make", "-j8"], ...]
+```
+"""
+
+import os
+import shlex
+import signal
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Self, Sequence
+
+from .errors import DebmagicError
+
+
+class UnexpectedCommandError(DebmagicError):
+    pass
+
+
+@dataclass
+class CommandCall:
+    #: a string for shell commands
+    args: Sequence[str | Path] | str
+    cwd: Path | None = None
+    #: the complete environment, or None when inheriting it
+    env: dict[str, str] | None = None
+    #: the remaining `subprocess.run` arguments, like `input` or `capture_output`
+    options: dict[str, Any] = field(default_factory=dict)
+    #: when set, the running command is terminated
+    cancel: threading.Event | None = None
+
+    @property
+    def argv(self) -> list[str]:
+        return shlex.split(self.args) if isinstance(self.args, str) else [os.fspath(arg) for arg in self.args]
+
+    def result(
+        self, returncode: int = 0, stdout: str | bytes = "", stderr: str | bytes = ""
+    ) -> subprocess.CompletedProcess:
+        """
+        a result as `subprocess.run` would return it for this call's options
+        """
+        text = any(self.options.get(name) for name in ("text", "universal_newlines", "encoding", "errors"))
+
+        def output(value: str | bytes, stream: str) -> str | bytes | None:
+            if not (self.options.get("capture_output") or self.options.get(stream) == subprocess.PIPE):
+                return None
+            if text:
+                return value.decode() if isinstance(value, bytes) else value
+            return value.encode() if isinstance(value, str) else value
+
+        return subprocess.CompletedProcess(self.args, returncode, output(stdout, "stdout"), output(stderr, "stderr"))
+
+
+class Executor:
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        """
+        run the command. raises subprocess.CalledProcessError when check is set and it fails.
+        """
+        raise NotImplementedError()
+
+    def dry_run(self, call: CommandCall) -> subprocess.CompletedProcess:
+        """
+        the command is not run because the build is a dry-run
+        """
+        return call.result()
+
+
+class LocalExecutor(Executor):
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        kwargs = dict(call.options)
+        if call.cwd is not None:
+            kwargs["cwd"] = call.cwd
+        if call.env is not None:
+            kwargs["env"] = call.env
+        if call.cancel is None:
+            return subprocess.run(call.args, check=check, **kwargs)
+        return _run_cancellable(call.args, call.cancel, check, **kwargs)
+
+
+def _run_cancellable(
+    args: Sequence[str | Path] | str,
+    cancel: threading.Event,
+    check: bool,
+    input: str | bytes | None = None,
+    capture_output: bool = False,
+    **kwargs,
+) -> subprocess.CompletedProcess:
+    """
+    subprocess.run, but terminating the command and all its child processes once cancel is set
+    """
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+
+    # in its own process group, so `make` or `sh -c` are terminated with the commands they started
+    proc: subprocess.Popen[Any] = subprocess.Popen(args, process_group=0, **kwargs)
+    with proc:
+        try:
+            while True:
+                try:
+                    stdout, stderr = proc.communicate(input, timeout=0.1)
+                    break
+                except subprocess.TimeoutExpired:
+                    # the input is sent once, the following calls continue sending it
+                    input = None
+                    if cancel.is_set():
+                        _terminate_group(proc)
+                        stdout, stderr = proc.communicate()
+                        break
+        except BaseException:
+            # e.g. KeyboardInterrupt, which doesn't reach the separate process group
+            _terminate_group(proc)
+            raise
+    returncode = proc.wait()
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, args, stdout, stderr)
+    return subprocess.CompletedProcess(args, returncode, stdout, stderr)
+
+
+def _terminate_group(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        # the whole group already exited
+        pass
+
+
+class RecordingExecutor(Executor):
+    """
+    record the commands instead of running them. they all succeed without output.
+
+    with a `probe_executor`, only the commands of a dry-run build are recorded in `calls`.
+    the others are probes whose output the build needs, like `make -pq` or `dh --no-act`:
+    they are run by the probe executor and recorded in `probes`.
+    """
+
+    def __init__(self, probe_executor: Executor | None = None):
+        self.probe_executor = probe_executor
+        self.calls: list[CommandCall] = []
+        self.probes: list[CommandCall] = []
+        # presets issue commands from threads
+        self._lock = threading.Lock()
+
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        if self.probe_executor is not None:
+            with self._lock:
+                self.probes.append(call)
+            return self.probe_executor.run(call, check)
+        with self._lock:
+            self.calls.append(call)
+        return call.result()
+
+    def dry_run(self, call: CommandCall) -> subprocess.CompletedProcess:
+        with self._lock:
+            self.calls.append(call)
+        return call.result()
+
+    def commands(self) -> list[list[str]]:
+        return [call.argv for call in self.calls]
+
+
+@dataclass
+class _Response:
+    prefix: list[str]
+    returncode: int
+    stdout: str | bytes
+    stderr: str | bytes
+
+
+class ReplayExecutor(RecordingExecutor):
+    """
+    record the commands and answer them with the result of the first response whose argument prefix matches.
+    commands without a matching response fail with `UnexpectedCommandError`, unless `strict` is False:
+    then they succeed without output.
+    """
+
+    def __init__(self, strict: bool = True):
+        super().__init__()
+        self.strict = strict
+        self._responses: list[_Response] = []
+
+    def respond(
+        self,
+        prefix: Sequence[str | Path] | str,
+        returncode: int = 0,
+        stdout: str | bytes = "",
+        stderr: str | bytes = "",
+    ) -> Self:
+        prefix_args = shlex.split(prefix) if isinstance(prefix, str) else [str(arg) for arg in prefix]
+        self._responses.append(_Response(prefix_args, returncode, stdout, stderr))
+        return self
+
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        with self._lock:
+            self.calls.append(call)
+        argv = call.argv
+        for response in self._responses:
+            if argv[: len(response.prefix)] == response.prefix:
+                result = call.result(response.returncode, response.stdout, response.stderr)
+                if check:
+                    result.check_returncode()
+                return result
+        if self.strict:
+            raise UnexpectedCommandError(f"no response for command {shlex.join(argv)}")
+        return call.result()
+
+
+def make_call(
+    cmd_args: Sequence[str | Path] | str, kwargs: dict[str, Any], cancel: threading.Event | None = None
+) -> CommandCall:
+    """
+    turn `subprocess.run` arguments into a CommandCall
+    """
+    options = dict(kwargs)
+    cwd = options.pop("cwd", None)
+    env = options.pop("env", None)
+    return CommandCall(
+        args=cmd_args if isinstance(cmd_args, str) else list(cmd_args),
+        cwd=Path(cwd) if cwd is not None else None,
+        env=dict(env) if env is not None else None,
+        options=options,
+        cancel=cancel,
+    )
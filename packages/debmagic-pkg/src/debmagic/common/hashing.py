@@ -0,0 +1,32 @@
+import hashlib
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+# files larger than this are hashed through mmap instead of chunked reads
+MMAP_THRESHOLD = 1 << 20
+
+
+def hash_file(path: Path, algorithm: str = "md5") -> str:
+    digest = hashlib.new(algorithm)
+    with path.open("rb") as fd:
+        size = os.fstat(fd.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                digest.update(data)
+        else:
+            digest.update(fd.read())
+    return digest.hexdigest()
+
+
+def hash_files(paths: Iterable[Path], algorithm: str = "md5", workers: int | None = None) -> dict[Path, str]:
+    """
+    hash many files concurrently.
+    hashlib releases the GIL while hashing, so threads hash in parallel.
+    """
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = pool.map(lambda path: hash_file(path, algorithm), paths)
+        return dict(zip(paths, digests, strict=True))
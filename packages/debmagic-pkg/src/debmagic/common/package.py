@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Self
@@ -19,6 +21,26 @@ class SourcePackage:
     name: str
     binary_packages: list[BinaryPackage]
     changelog: Changelog
+    ctrl: deb822.Deb822 | None = None
+
+    @property
+    def version(self) -> str:
+        return str(self.changelog.entries[0].version)
+
+    @property
+    def build_depends(self) -> list[list[deb822.PkgRelation.ParsedRelation]]:
+        """
+        the relations of Build-Depends, Build-Depends-Arch and Build-Depends-Indep.
+        each entry is a list of alternatives, parsed like `deb822.PkgRelation.parse_relations`.
+        """
+        if self.ctrl is None:
+            return []
+        relations: list[list[deb822.PkgRelation.ParsedRelation]] = []
+        for field_name in ("Build-Depends", "Build-Depends-Arch", "Build-Depends-Indep"):
+            # trailing commas are allowed, but not by the parser
+            if value := self.ctrl.get(field_name, "").strip().rstrip(","):
+                relations.extend(deb822.PkgRelation.parse_relations(value))
+        return relations
 
     @classmethod
     def from_debian_directory(cls, debian_dir_path: Path) -> Self:
@@ -37,7 +59,7 @@ class SourcePackage:
                 if src_pkg is not None:
                     raise RuntimeError("encountered multiple Source: blocks in control file")
                 src_name = block["Source"]
-                src_pkg = cls(src_name, bin_pkgs, changelog=changelog)
+                src_pkg = cls(src_name, bin_pkgs, changelog=changelog, ctrl=block)
 
             if "Package" in block:
                 bin_pkg = BinaryPackage(
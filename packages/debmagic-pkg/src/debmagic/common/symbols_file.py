@@ -0,0 +1,116 @@
+"""
+parser for dpkg symbols files (`deb-symbols(5)`),
+as found in `/var/lib/dpkg/info/*.symbols` and `debian/*.symbols`.
+"""
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+_TAGS = re.compile(r"^\(([^)]*)\)")
+_INCLUDE = re.compile(r'^#include\s+"([^"]+)"\s*$')
+
+
+@dataclass
+class SymbolEntry:
+    #: symbol name with version, like "acl_init@ACL_1.0" or "foo@Base"
+    name: str
+    minver: str
+    #: tags like "c++", "optional" or "arch=amd64" -> value (empty for flags)
+    tags: dict[str, str] = field(default_factory=dict)
+    #: index of the alternative dependency template to use
+    dep_id: int = 0
+
+
+@dataclass
+class LibrarySymbols:
+    soname: str
+    #: dependency templates, containing `#MINVER#`. the first one is the main dependency.
+    dependencies: list[str]
+    #: meta-information fields like "Build-Depends-Package"
+    fields: dict[str, str] = field(default_factory=dict)
+    symbols: dict[str, SymbolEntry] = field(default_factory=dict)
+
+    def dependency(self, minver: str | None, dep_id: int = 0) -> str:
+        """
+        fill in the dependency template of this library
+        """
+        template = self.dependencies[dep_id] if dep_id < len(self.dependencies) else self.dependencies[0]
+        return template.replace("#MINVER#", f"(>= {minver})" if minver else "").strip()
+
+
+def parse_symbol_line(line: str) -> SymbolEntry:
+    """
+    >>> parse_symbol_line(' (c++|optional)"foo()@Base" 1.2 1')
+    SymbolEntry(name='foo()@Base', minver='1.2', tags={'c++': '', 'optional': ''}, dep_id=1)
+    >>> parse_symbol_line(" acl_init@ACL_1.0 2.2.23")
+    SymbolEntry(name='acl_init@ACL_1.0', minver='2.2.23', tags={}, dep_id=0)
+    """
+    rest = line.strip()
+    tags: dict[str, str] = {}
+    if match := _TAGS.match(rest):
+        for tag in match.group(1).split("|"):
+            tag_name, _, tag_value = tag.partition("=")
+            tags[tag_name.strip()] = tag_value.strip()
+        rest = rest[match.end() :]
+
+    if rest.startswith('"'):
+        name, _, rest = rest[1:].partition('"')
+    else:
+        name, _, rest = rest.partition(" ")
+
+    minver, _, dep_id = rest.strip().partition(" ")
+    return SymbolEntry(name=name, minver=minver, tags=tags, dep_id=int(dep_id) if dep_id.strip() else 0)
+
+
+def parse_symbols_file(text: str, only_headers: bool = False) -> list[LibrarySymbols]:
+    """
+    parse a symbols file, optionally only reading the library headers without their symbols.
+    """
+    libraries: list[LibrarySymbols] = []
+    current: LibrarySymbols | None = None
+
+    for line in text.splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+
+        if line[0] in (" ", "\t"):
+            if current is not None and not only_headers:
+                entry = parse_symbol_line(line)
+                current.symbols[entry.name] = entry
+        elif line.startswith("|"):
+            if current is not None:
+                current.dependencies.append(line[1:].strip())
+        elif line.startswith("*"):
+            if current is not None:
+                field_name, _, value = line[1:].partition(":")
+                current.fields[field_name.strip()] = value.strip()
+        else:
+            soname, _, dependency = line.partition(" ")
+            current = LibrarySymbols(soname=soname, dependencies=[dependency.strip()])
+            libraries.append(current)
+
+    return libraries
+
+
+def read_symbols_file(path: Path, only_headers: bool = False, package: str | None = None) -> list[LibrarySymbols]:
+    """
+    read a symbols file with the files it `#include`s, relative to its directory.
+    `package` replaces `#PACKAGE#`, like dpkg-gensymbols does for the maintainer's symbols files.
+    """
+    text = _expand_includes(path, set())
+    if package is not None:
+        text = text.replace("#PACKAGE#", package)
+    return parse_symbols_file(text, only_headers=only_headers)
+
+
+def _expand_includes(path: Path, seen: set[Path]) -> str:
+    if path in seen:
+        raise ValueError(f"{path} includes itself")
+    lines: list[str] = []
+    for line in path.read_text(errors="replace").splitlines(keepends=True):
+        if match := _INCLUDE.match(line):
+            lines.append(_expand_includes(path.parent / match.group(1), seen | {path}))
+        else:
+            lines.append(line)
+    return "".join(line if line.endswith("\n") else f"{line}\n" for line in lines)
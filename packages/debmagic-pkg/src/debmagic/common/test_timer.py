@@ -0,0 +1,66 @@
+"""
+wrapper around an automake test driver.
+
+used as `LOG_DRIVER=python3 -m debmagic.common.test_timer <original driver>`,
+it records the test duration in the test's .trs file
+and skips tests not belonging to the shard in `$DEBMAGIC_TEST_SHARD` ("<index>/<count>").
+
+this is run once per test, so it must not import anything expensive.
+"""
+
+import os
+import subprocess
+import sys
+import time
+import zlib
+from pathlib import Path
+
+DURATION_FIELD = ":debmagic-duration:"
+
+
+def in_shard(test_name: str, shard: str | None) -> bool:
+    """
+    >>> in_shard("t/foo.test", None)
+    True
+    >>> [in_shard("t/foo.test", f"{idx}/3") for idx in range(3)].count(True)
+    1
+    """
+    if not shard:
+        return True
+    index, _, count = shard.partition("/")
+    return zlib.crc32(test_name.encode()) % int(count) == int(index)
+
+
+def _option(args: list[str], name: str) -> str | None:
+    try:
+        return args[args.index(name) + 1]
+    except (ValueError, IndexError):
+        return None
+
+
+def main() -> int:
+    driver_args = sys.argv[1:]
+    test_name = _option(driver_args, "--test-name")
+    log_file = _option(driver_args, "--log-file")
+    trs_file = _option(driver_args, "--trs-file")
+
+    if test_name and log_file and trs_file and not in_shard(test_name, os.environ.get("DEBMAGIC_TEST_SHARD")):
+        Path(log_file).write_text(f"skipped by debmagic, not in test shard {os.environ['DEBMAGIC_TEST_SHARD']}\n")
+        Path(trs_file).write_text(
+            ":test-result: SKIP\n:global-test-result: SKIP\n:recheck: no\n:copy-in-global-log: no\n"
+        )
+        return 0
+
+    start = time.monotonic()
+    ret = subprocess.run(driver_args, check=False).returncode
+    duration = time.monotonic() - start
+
+    if trs_file and Path(trs_file).is_file():
+        with open(trs_file, "a") as trs:
+            trs.write(f"{DURATION_FIELD} {duration:.3f}\n")
+
+    return ret
+
+
+if __name__ == "__main__":
+    sys.exit(main())
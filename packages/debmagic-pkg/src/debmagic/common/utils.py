@@ -6,9 +6,12 @@ import shutil
 import signal
 import subprocess
 import sys
+import threading
 from pathlib import Path
 from typing import Callable, Sequence, TypeVar
 
+from .executor import Executor, LocalExecutor, make_call
+
 
 class Namespace:
     """
@@ -44,8 +47,15 @@ def run_cmd(
     cmd: Sequence[str | Path] | str,
     check: bool = True,
     dry_run: bool = False,
+    executor: Executor | None = None,
+    cancel: threading.Event | None = None,
     **kwargs,
 ) -> subprocess.CompletedProcess:
+    """
+    run a command through the executor, by default spawning it locally.
+    the kwargs are those of subprocess.run.
+    setting `cancel` terminates the command.
+    """
     cmd_args: Sequence[str | Path] | str = cmd
     cmd_pretty: str
 
@@ -63,14 +73,18 @@ def run_cmd(
 
     print(f"debmagic: {cmd_pretty}")
 
+    call = make_call(cmd_args, kwargs, cancel)
     if dry_run:
-        return subprocess.CompletedProcess(cmd_args, 0)
+        return (executor or _local_executor).dry_run(call)
 
-    ret = subprocess.run(cmd_args, check=check, **kwargs)
+    ret = (executor or _local_executor).run(call, check=check)
 
     return ret
 
 
+_local_executor = LocalExecutor()
+
+
 def run_cmd_in_foreground(args: Sequence[str | Path], **kwargs):
     """
     the "correct" way of spawning a new subprocess:
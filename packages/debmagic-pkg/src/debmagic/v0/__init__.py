@@ -1,15 +1,58 @@
+from debmagic.common.executor import Executor, LocalExecutor, RecordingExecutor, ReplayExecutor
 from debmagic.common.utils import run_cmd
 
-from ._build import Build
-from ._module import autotools, dh
+from ._build import Build, CommandResult
+from ._file_index import FileIndex, FileInfo, FileKind
+from ._module import (
+    autotools,
+    builddeb,
+    cargo,
+    cmake,
+    compress,
+    dedup,
+    dh,
+    install,
+    make,
+    md5sums,
+    meson,
+    ninja,
+    python,
+    shlibdeps,
+    strip,
+    symbols,
+)
 from ._package import package
 from ._preset import Preset
+from ._steps import Step
 
 __all__ = [
     "Build",
+    "CommandResult",
+    "Executor",
+    "FileIndex",
+    "FileInfo",
+    "FileKind",
+    "LocalExecutor",
     "Preset",
+    "RecordingExecutor",
+    "ReplayExecutor",
+    "Step",
     "autotools",
+    "builddeb",
+    "cargo",
+    "cmake",
+    "compress",
+    "dedup",
     "dh",
+    "install",
+    "make",
+    "md5sums",
+    "meson",
+    "ninja",
     "package",
+    "python",
     "run_cmd",
+    "shlibdeps",
+    "strip",
+    "symbols",
 ]
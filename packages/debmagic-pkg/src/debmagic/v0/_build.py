@@ -1,16 +1,24 @@
 from __future__ import annotations
 
+import shlex
 import shutil
 import subprocess
+import threading
+import time
 import typing
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Sequence
+from typing import Mapping, Self, Sequence
 
+from debmagic.common.executor import Executor, LocalExecutor
 from debmagic.common.utils import run_cmd
 
 from ._build_stage import BuildStage
+from ._file_index import FileIndex
 from ._preset import Preset
+from ._steps import Step, StepDurations, StepGraph
 
 if typing.TYPE_CHECKING:
     from debmagic.common.package import BinaryPackage
@@ -30,21 +38,185 @@ class Build:
     parallel: int
     prefix: Path
     dry_run: bool = False
+    #: cleaning is the goal (`rules clean`), not the start of a build:
+    #: also remove what is kept for incremental rebuilds, like the stamps in `stamp_dir`
+    full_clean: bool = False
+    #: runs the commands of `cmd`, e.g. a `RecordingExecutor` to test presets without running anything
+    executor: Executor = field(default_factory=LocalExecutor)
 
     _completed_stages: set[BuildStage] = field(default_factory=set)
+    #: scanned roots and the index of them
+    _file_index: tuple[list[Path], FileIndex] | None = field(default=None, repr=False)
+    #: runs the commands of `submit`, created on first use and shut down at the end of `run`
+    _command_pool: ThreadPoolExecutor | None = field(default=None, repr=False, compare=False)
+    _command_pool_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    #: terminates the commands submitted without their own `cancel` when the build fails
+    _command_cancel: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
 
-    def cmd(self, cmd: Sequence[str] | str, **kwargs) -> subprocess.CompletedProcess:
+    def cmd(self, cmd: Sequence[str | Path] | str, **kwargs) -> subprocess.CompletedProcess:
         """
         execute a command, auto-converts command strings/lists.
         use this to supports build dry-runs.
         """
-        return run_cmd(cmd, dry_run=self.dry_run, **kwargs)
+        try:
+            return run_cmd(cmd, dry_run=self.dry_run, executor=self.executor, **kwargs)
+        finally:
+            # the command may have changed the install trees, like `dh_install` or `make install`
+            if not self.dry_run:
+                self.invalidate_file_index()
+
+    def cmds(
+        self,
+        cmds: Sequence[Sequence[str | Path] | str] | Mapping[str, Sequence[str | Path] | str],
+        fail_fast: bool = True,
+        **kwargs,
+    ) -> list[CommandResult]:
+        """
+        execute independent commands concurrently, at most `parallel` at a time.
+        the output of each is printed once it finished, prefixed with its label (the mapping's keys).
+        raises BuildError when a command failed, after cancelling the others if `fail_fast`.
+        """
+        labelled = cmds.items() if isinstance(cmds, Mapping) else [(None, cmd) for cmd in cmds]
+        with self.batch(fail_fast=fail_fast) as batch:
+            for label, cmd in labelled:
+                batch.submit(cmd, label=label, **kwargs)
+        return batch.results
+
+    def batch(self, fail_fast: bool = True, echo: bool = True) -> CommandBatch:
+        """
+        a group of concurrent commands, for commands with differing arguments:
+
+        ```
+        with build.batch() as batch:
+            for doc_dir in doc_dirs:
+                batch.submit(["make", "html"], cwd=doc_dir, label=doc_dir.name)
+        ```
+        """
+        return CommandBatch(self, fail_fast=fail_fast, echo=echo)
+
+    def submit(
+        self,
+        cmd: Sequence[str | Path] | str,
+        label: str | None = None,
+        cancel: threading.Event | None = None,
+        echo: bool = True,
+        **kwargs,
+    ) -> Future[CommandResult]:
+        """
+        execute a command in the background, at most `parallel` commands run at a time.
+        its output is collected in the result, and printed prefixed with the label if `echo`.
+        setting `cancel` terminates the command, or skips it if it didn't start yet.
+        commands still running when the build fails are terminated.
+        """
+        label = label or _command_name(cmd)
+        with self._command_pool_lock:
+            if self._command_pool is None:
+                self._command_pool = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix="debmagic-cmd")
+            return self._command_pool.submit(
+                self._run_buffered, cmd, label, cancel or self._command_cancel, echo, kwargs
+            )
+
+    def _shutdown_commands(self, cancel: bool = False) -> None:
+        """
+        wait for the submitted commands and stop their threads.
+        with `cancel`, the queued commands are skipped and the running ones terminated.
+        """
+        with self._command_pool_lock:
+            pool, self._command_pool = self._command_pool, None
+        if pool is None:
+            return
+        if cancel:
+            self._command_cancel.set()
+        pool.shutdown(wait=True, cancel_futures=cancel)
+        self._command_cancel.clear()
+
+    def _run_buffered(
+        self,
+        cmd: Sequence[str | Path] | str,
+        label: str,
+        cancel: threading.Event | None,
+        echo: bool,
+        kwargs: dict,
+    ) -> CommandResult:
+        if cancel is not None and cancel.is_set():
+            return CommandResult(label, cmd, cancelled=True)
+
+        start = time.monotonic()
+        proc = self.cmd(
+            cmd, check=False, cancel=cancel, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, **kwargs
+        )
+        result = CommandResult(
+            label,
+            cmd,
+            returncode=proc.returncode,
+            output=proc.stdout or "",
+            duration=time.monotonic() - start,
+            cancelled=cancel is not None and cancel.is_set() and proc.returncode != 0,
+        )
+        if echo:
+            result.print()
+        return result
 
     @property
     def install_dirs(self) -> dict[str, Path]:
         """return { binary_package_name: install_directory }"""
         return {pkg.name: self.install_base_dir / pkg.name for pkg in self.binary_packages}
 
+    @property
+    def main_package(self) -> BinaryPackage:
+        """
+        the first binary package in debian/control, even when it isn't built this time.
+        debhelper uses package files without package name prefix (like `debian/install`) for it.
+        """
+        return self.package.source_package.binary_packages[0]
+
+    @property
+    def build_dir(self) -> Path:
+        """
+        out-of-tree build directory for build systems supporting it,
+        named like debhelper's default build directory.
+        """
+        return self.source_dir / f"obj-{self.architecture_host}"
+
+    @property
+    def staging_dir(self) -> Path:
+        """
+        shared install destination of multi-package builds (`debian/tmp`),
+        distributed into the binary packages by the `install` module.
+        """
+        return self.install_base_dir / "tmp"
+
+    @property
+    def state_dir(self) -> Path:
+        """
+        directory for debmagic's own build state, like logs and test results.
+        removed when cleaning.
+        """
+        return self.source_dir / "debian" / ".debmagic"
+
+    @property
+    def stamp_dir(self) -> Path:
+        """
+        directory for the stamps that let an unchanged step be skipped on the next build.
+        it's kept by the clean stage that starts each build, and removed by a `full_clean`.
+        """
+        return self.source_dir / "debian" / ".debmagic-stamps"
+
+    def file_index(self) -> FileIndex:
+        """
+        classification of all files in the install dirs and their `-dbgsym` trees.
+        scanned on first use and cached until a command runs through `cmd()` or the install stage reruns.
+        helpers modifying the trees themselves have to call `invalidate_file_index()`.
+        """
+        roots = [*self.install_dirs.values()]
+        roots.extend(self.install_base_dir / ".debhelper" / name / "dbgsym-root" for name in self.install_dirs)
+        if self._file_index is None or self._file_index[0] != roots:
+            self._file_index = (roots, FileIndex.scan(roots, workers=self.parallel))
+        return self._file_index[1]
+
+    def invalidate_file_index(self) -> None:
+        self._file_index = None
+
     def select_packages(self, names: set[str]):
         """only build those packages"""
         self.binary_packages = []
@@ -71,12 +243,56 @@ class Build:
         self._completed_stages.add(stage)
         # TODO: persist state in build dir
 
+    def stage_steps(self, stage: BuildStage) -> tuple[StepGraph, str | None]:
+        """
+        the steps of a stage, and where its main work comes from: the rules file or a preset.
+        """
+        steps = StepGraph(stage)
+        provider: str | None = None
+        # the stage function from debian/rules.py
+        if rules_stage_function := self.package.stage_functions.get(stage):
+            print("debmagic:  running stage from rules file...")
+            steps.add(Step(str(stage), rules_stage_function))
+            provider = "rules file"
+
+        else:
+            # or the stage function from first providing preset
+            for preset in self.package.presets:
+                print(f"debmagic:  trying preset {preset}...")
+                if preset_stage_function := preset.get_stage(stage):
+                    print("debmagic:   running stage from preset")
+                    for step in preset.steps(stage) or [Step(str(stage), preset_stage_function)]:
+                        steps.add(step)
+                    provider = f"{type(preset).__module__}.{type(preset).__qualname__}"
+                    break  # stop preset processing
+
+        # with the steps from debian/rules.py
+        for step in self.package.stage_steps.get(stage, []):
+            steps.add(step)
+        return steps, provider
+
     def run(
         self,
         target_stage: BuildStage | None = None,
     ) -> None:
+        # late import, the preflight checks use modules depending on this one
+        from ._preflight import preflight
+
+        preflight(self, target_stage)
+
         internal_stages = InternalPreset()
+        durations = StepDurations.load(self.package.source_package.name)
+
+        try:
+            self._run_stages(target_stage, internal_stages, durations)
+        except BaseException:
+            self._shutdown_commands(cancel=True)
+            raise
+        self._shutdown_commands()
 
+    def _run_stages(
+        self, target_stage: BuildStage | None, internal_stages: InternalPreset, durations: StepDurations
+    ) -> None:
         for stage in BuildStage:
             print(f"debmagic: stage {stage!s}", end="")
 
@@ -90,22 +306,15 @@ class Build:
             if internal_stage_function := internal_stages.get_stage(stage):
                 internal_stage_function(self)
 
-            # run stage function from debian/rules.py
-            if rules_stage_function := self.package.stage_functions.get(stage):
-                print("debmagic:  running stage from rules file...")
-                rules_stage_function(self)
+            steps, _ = self.stage_steps(stage)
+            if steps.steps:
+                try:
+                    steps.run(self, durations)
+                finally:
+                    if not self.dry_run:
+                        durations.save()
                 self._mark_stage_done(stage)
 
-            else:
-                # run stage function from first providing preset
-                for preset in self.package.presets:
-                    print(f"debmagic:  trying preset {preset}...")
-                    if preset_stage_function := preset.get_stage(stage):
-                        print("debmagic:   running stage from preset")
-                        preset_stage_function(self)
-                        self._mark_stage_done(stage)
-                        break  # stop preset processing
-
             if not self.is_stage_completed(stage):
                 raise RuntimeError(f"{stage!s} stage was never executed")
 
@@ -118,6 +327,130 @@ class BuildError(RuntimeError):
     pass
 
 
+@dataclass
+class CommandResult:
+    label: str
+    cmd: Sequence[str | Path] | str
+    #: None when the command was cancelled before it started
+    returncode: int | None = None
+    #: stdout and stderr of the command
+    output: str = ""
+    duration: float = 0.0
+    cancelled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    def print(self) -> None:
+        lines = [f"[{self.label}] {line}" for line in self.output.splitlines()]
+        if self.cancelled:
+            lines.append(f"debmagic: [{self.label}] cancelled")
+        elif not self.ok:
+            lines.append(f"debmagic: [{self.label}] failed with exit code {self.returncode}")
+        # one write, so outputs of concurrent commands don't interleave
+        if lines:
+            with _output_lock:
+                print("\n".join(lines))
+
+
+_output_lock = threading.Lock()
+
+
+class CommandBatch:
+    """
+    commands running concurrently through `Build.submit`.
+    with `fail_fast`, the first failure cancels the others.
+    leaving the `with` block waits for all of them and raises BuildError if one failed.
+    """
+
+    def __init__(self, build: Build, fail_fast: bool = True, echo: bool = True):
+        self.build = build
+        self.fail_fast = fail_fast
+        self.echo = echo
+        self.results: list[CommandResult] = []
+        self._cancel = threading.Event()
+        self._submitted: list[tuple[str, Sequence[str | Path] | str, Future[CommandResult]]] = []
+        self._labels: Counter[str] = Counter()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.cancel()
+            self._collect()
+            return
+        self.wait()
+
+    def submit(self, cmd: Sequence[str | Path] | str, label: str | None = None, **kwargs) -> Future[CommandResult]:
+        """
+        `label` defaults to the program name, numbered if it's used more than once
+        """
+        label = label or _command_name(cmd)
+        self._labels[label] += 1
+        if self._labels[label] > 1:
+            label = f"{label}#{self._labels[label]}"
+        future = self.build.submit(cmd, label=label, cancel=self._cancel, echo=self.echo, **kwargs)
+        future.add_done_callback(self._done)
+        self._submitted.append((label, cmd, future))
+        return future
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        for _, _, future in self._submitted:
+            future.cancel()
+
+    def wait(self, check: bool = True) -> list[CommandResult]:
+        """
+        wait for all commands, raises BuildError if one failed and `check` is set
+        """
+        self._collect()
+        if not check:
+            return self.results
+        failed = [result for result in self.results if not result.ok and not result.cancelled]
+        if failed:
+            raise BuildError(
+                ", ".join(
+                    f"[{result.label}] {_command_str(result.cmd)} failed with exit code {result.returncode}"
+                    for result in failed
+                )
+            )
+        return self.results
+
+    def _collect(self) -> None:
+        results: list[CommandResult] = []
+        error: BaseException | None = None
+        for label, cmd, future in self._submitted:
+            if future.cancelled():
+                results.append(CommandResult(label, cmd, cancelled=True))
+                continue
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                # e.g. the program doesn't exist, reraised after all finished
+                error = error or exc
+                results.append(CommandResult(label, cmd, returncode=-1))
+        self.results = results
+        if error is not None:
+            raise error
+
+    def _done(self, future: Future[CommandResult]) -> None:
+        if not self.fail_fast or future.cancelled():
+            return
+        if future.exception() is not None or not future.result().ok:
+            self.cancel()
+
+
+def _command_name(cmd: Sequence[str | Path] | str) -> str:
+    args = shlex.split(cmd) if isinstance(cmd, str) else cmd
+    return Path(args[0]).name if args else "cmd"
+
+
+def _command_str(cmd: Sequence[str | Path] | str) -> str:
+    return cmd if isinstance(cmd, str) else shlex.join(str(arg) for arg in cmd)
+
+
 class InternalPreset(Preset):
     """
     these stages here are always executed before
@@ -129,3 +462,15 @@ class InternalPreset(Preset):
         for install_dir in build.install_dirs.values():
             if install_dir.is_dir():
                 shutil.rmtree(install_dir)
+
+        directories = [build.staging_dir, build.state_dir]
+        if build.full_clean:
+            directories.append(build.stamp_dir)
+        for directory in directories:
+            if directory.is_dir():
+                shutil.rmtree(directory)
+        build.invalidate_file_index()
+
+    def install(self, build: Build) -> None:
+        # the install trees are about to be (re)populated
+        build.invalidate_file_index()
@@ -0,0 +1,24 @@
+"""
+persistent cache location, shared between builds of all packages.
+"""
+
+import os
+from pathlib import Path
+
+
+def cache_dir(*parts: str) -> Path:
+    """
+    return (and create) a directory in debmagic's persistent cache.
+
+    the cache is at `$DEBMAGIC_CACHE_DIR`, or `$XDG_CACHE_HOME/debmagic`, or `~/.cache/debmagic`.
+    """
+    if base := os.environ.get("DEBMAGIC_CACHE_DIR"):
+        base_dir = Path(base)
+    elif xdg_cache := os.environ.get("XDG_CACHE_HOME"):
+        base_dir = Path(xdg_cache) / "debmagic"
+    else:
+        base_dir = Path.home() / ".cache" / "debmagic"
+
+    path = base_dir.joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,183 @@
+"""
+classification of all files in the package install trees,
+so the package stage helpers don't each walk the trees and sniff the files again.
+"""
+
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from enum import StrEnum
+from pathlib import Path
+from typing import Iterable, Iterator, Self
+
+from debmagic.common.elf import ElfFile
+
+# bytes read from each file to classify it
+_MAGIC_SIZE = 256
+
+
+class FileKind(StrEnum):
+    elf = "elf"
+    static_lib = "static-lib"
+    """ ar archive """
+    script = "script"
+    """ starts with `#!` """
+    gzip = "gzip"
+    data = "data"
+    symlink = "symlink"
+
+
+@dataclass(frozen=True)
+class FileInfo:
+    root: Path
+    #: relative to root
+    path: str
+    kind: FileKind
+    size: int
+    #: permission bits
+    mode: int
+    #: (device, inode), to recognize hardlinks
+    inode: tuple[int, int]
+    nlink: int
+    #: ELF object type (`ET_*`)
+    elf_type: int | None = None
+    build_id: str | None = None
+    has_debug_info: bool = False
+    has_symtab: bool = False
+    #: for scripts: the `#!` line without `#!`
+    interpreter: str | None = None
+
+    @property
+    def full_path(self) -> Path:
+        return self.root / self.path
+
+    @property
+    def name(self) -> str:
+        return self.path.rpartition("/")[2]
+
+    @property
+    def is_manpage(self) -> bool:
+        return self.path.startswith("usr/share/man/") and self.kind != FileKind.symlink
+
+
+class FileIndex:
+    """
+    files and symlinks of some directory trees, each walked once.
+    `DEBIAN/` directories are not included.
+    """
+
+    def __init__(self, trees: dict[Path, list[FileInfo]]):
+        self._trees = trees
+
+    @classmethod
+    def scan(cls, roots: Iterable[Path], workers: int | None = None) -> Self:
+        trees = {root: _scan_tree(root) for root in roots if root.is_dir()}
+
+        # ELF section tables are parsed concurrently, the rest only needed the magic bytes
+        elf_files = [info for files in trees.values() for info in files if info.kind == FileKind.elf]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            elf_infos = dict(zip(elf_files, pool.map(_read_elf, elf_files), strict=True))
+        for root, files in trees.items():
+            trees[root] = [elf_infos.get(info, info) for info in files]
+        return cls(trees)
+
+    @property
+    def roots(self) -> list[Path]:
+        return list(self._trees)
+
+    def files(self, root: Path) -> list[FileInfo]:
+        """
+        all entries below root, sorted by path. empty if root wasn't scanned.
+        """
+        return self._trees.get(root, [])
+
+    def of_kind(self, *kinds: FileKind, root: Path | None = None) -> Iterator[FileInfo]:
+        trees = [root] if root is not None else self._trees
+        for tree in trees:
+            for info in self.files(tree):
+                if info.kind in kinds:
+                    yield info
+
+    def __iter__(self) -> Iterator[FileInfo]:
+        for files in self._trees.values():
+            yield from files
+
+
+def classify(head: bytes) -> FileKind:
+    """
+    the kind of a regular file, by its first bytes
+
+    >>> classify(b"#!/bin/sh\\n")
+    <FileKind.script: 'script'>
+    >>> classify(b"\\x7fELF\\x02\\x01")
+    <FileKind.elf: 'elf'>
+    """
+    if head.startswith(b"\x7fELF"):
+        return FileKind.elf
+    if head.startswith(b"!<arch>\n"):
+        return FileKind.static_lib
+    if head.startswith(b"#!"):
+        return FileKind.script
+    if head.startswith(b"\x1f\x8b"):
+        return FileKind.gzip
+    return FileKind.data
+
+
+def _scan_tree(root: Path) -> list[FileInfo]:
+    files: list[FileInfo] = []
+
+    def walk(directory: str, rel_dir: str) -> None:
+        with os.scandir(directory) as scan:
+            entries = list(scan)
+        for entry in entries:
+            if not rel_dir and entry.name == "DEBIAN":
+                continue
+            rel_path = f"{rel_dir}{entry.name}"
+            st = entry.stat(follow_symlinks=False)
+            if stat.S_ISDIR(st.st_mode):
+                walk(entry.path, f"{rel_path}/")
+                continue
+
+            interpreter = None
+            if stat.S_ISLNK(st.st_mode):
+                kind = FileKind.symlink
+            elif stat.S_ISREG(st.st_mode):
+                with open(entry.path, "rb") as fd:
+                    head = fd.read(_MAGIC_SIZE)
+                kind = classify(head)
+                if kind == FileKind.script:
+                    interpreter = head[2:].partition(b"\n")[0].decode(errors="replace").strip()
+            else:
+                continue
+
+            files.append(
+                FileInfo(
+                    root=root,
+                    path=rel_path,
+                    kind=kind,
+                    size=st.st_size,
+                    mode=stat.S_IMODE(st.st_mode),
+                    inode=(st.st_dev, st.st_ino),
+                    nlink=st.st_nlink,
+                    interpreter=interpreter,
+                )
+            )
+
+    walk(str(root), "")
+    files.sort(key=lambda info: os.fsencode(info.path))
+    return files
+
+
+def _read_elf(info: FileInfo) -> FileInfo:
+    elf = ElfFile.read(info.full_path)
+    if elf is None:
+        # truncated or unsupported ELF
+        return replace(info, kind=FileKind.data)
+    return replace(
+        info,
+        elf_type=elf.type,
+        build_id=elf.build_id,
+        has_debug_info=elf.has_debug_info,
+        has_symtab=elf.has_symtab,
+    )
@@ -4,37 +4,110 @@ GNU Autotools module
 for the "configure-make" build work flow.
 
 preset tries to execute:
-- make clean
+- make clean (distclean for `rules clean`)
+- autoreconf, if there's a configure.ac but no configure
 - configure
 - make
 - make DESTDIR=... install
 
 functions included:
-- autoreconf(): for generating `configure` from `configure.ac`
-- clean(): to call `make clean` (or another target)
-- configure(): to call `./configure <args>`
+- autoreconf(): for generating `configure` from `configure.ac`, skipped if its inputs are unchanged
+- clean(): to call `make clean`, `make distclean` for a full clean (or another target)
+- configure(): to call `./configure <args>`, skipped if `config.status` is up to date
 - build(): calls `make -j<jobs>`
-- test(): calls `make test`
-- install(): calls `make DESTDIR=<dir> install`
+- test(): calls `make -j<jobs> check` (or `test`), collecting per-test results
+- install(): calls `make DESTDIR=<dir> install`, distributing the files into multiple binary packages
+
+the preset's commands are steps named `make-clean`, `autoreconf`, `configure`, `make`, `make-check`,
+`make-install` and `distribute` (into the binary packages),
+so rules files can add their own steps around them (see `Package.step`).
+
+configure can use a shared autoconf result cache (`configure(build, cache=True)`),
+persisted in debmagic's cache for each host architecture, toolchain and build flags.
+it is shared by all packages built with the same setup, so feature probes
+are only run once.
 """
 
+import contextlib
+import fcntl
+import os
+import re
 import shlex
+import shutil
+import sys
 from pathlib import Path
-from typing import Iterable
+from typing import Generator
 
 from debmagic.common.utils import run_cmd
 
 from .._build import Build, BuildError
+from .._build_stage import BuildStage
+from .._cache import cache_dir
 from .._preset import Preset as PresetBase
+from .._stamp import Stamp, fingerprint
+from .._steps import Step
+from .._test_report import CheckReport, collect_automake_results
+from . import install as install_module
+from . import make
+
+# these environment variables influence the configure result
+_CONFIGURE_ENV_VARS = ("CC", "CXX", "CPP", "CFLAGS", "CXXFLAGS", "CPPFLAGS", "LDFLAGS", "LIBS", "PKG_CONFIG_PATH")
 
 
 class Preset(PresetBase):
+    def steps(self, stage: BuildStage) -> list[Step] | None:
+        """
+        each command of the stage as a named step:
+        make-clean, autoreconf, configure, make, make-check, make-install and distribute
+        """
+        match stage:
+            case BuildStage.clean:
+                return [Step("make-clean", self.clean)]
+            case BuildStage.configure:
+                return [
+                    Step("autoreconf", self._autoreconf),
+                    Step("configure", self._configure, after=("autoreconf",)),
+                ]
+            case BuildStage.build:
+                return [Step("make", self.build)]
+            case BuildStage.test:
+                return [Step("make-check", self.test)]
+            case BuildStage.install:
+                return [
+                    Step("make-install", self._make_install),
+                    Step("distribute", self._distribute, after=("make-install",)),
+                ]
+        return None
+
+    def required_tools(self, build: Build) -> list[str]:
+        if not _is_autotools_project(build.source_dir):
+            return []
+        if _needs_autoreconf(build.source_dir):
+            return ["autoreconf", "make"]
+        return ["make"]
+
+    def preflight(self, build: Build) -> list[str]:
+        if not _is_autotools_project(build.source_dir):
+            return []
+        if install_module.destdir(build) != build.staging_dir:
+            return []
+        return install_module.check_install_files(build)
+
     def clean(self, build: Build) -> None:
         if not _has_makefile(build.source_dir):
             return
         clean(build)
 
     def configure(self, build: Build, args: list[str] | None = None) -> None:
+        self._autoreconf(build)
+        self._configure(build, args)
+
+    def _autoreconf(self, build: Build) -> None:
+        if not _needs_autoreconf(build.source_dir):
+            return
+        autoreconf(build)
+
+    def _configure(self, build: Build, args: list[str] | None = None) -> None:
         if not _has_configure(build.source_dir):
             return
         configure(build, args or [])
@@ -54,26 +127,135 @@ class Preset(PresetBase):
             return
         install(build)
 
+    def _make_install(self, build: Build) -> None:
+        if not _has_makefile(build.source_dir):
+            return
+        _make_install(build)
+
+    def _distribute(self, build: Build) -> None:
+        if not _has_makefile(build.source_dir):
+            return
+        _distribute(build)
+
+
+def autoreconf(build: Build, force: bool = False) -> None:
+    """
+    regenerate the build system with `autoreconf`.
 
-def autoreconf(build: Build) -> None:
+    skipped if configure.ac, Makefile.am, m4 files and the autotools versions
+    are the same as in the previous run, unless `force` is set.
+    the subprojects of AC_CONFIG_SUBDIRS are regenerated concurrently.
+    """
     if not (build.source_dir / "configure.ac").is_file():
         raise BuildError("no 'configure.ac' file found in build root for `autoreconf`")
 
-    build.cmd(["autoreconf", "--force", "--install", "--verbose"], cwd=build.source_dir)
+    stamp = Stamp(build.stamp_dir / "autotools-autoreconf.stamp")
+    digest = fingerprint(*_autotools_versions(build), files=_autoreconf_inputs(build.source_dir))
+    if not force and _has_configure(build.source_dir) and stamp.matches(digest):
+        print("debmagic: autoreconf inputs are unchanged, skipping autoreconf")
+        return
+
+    stamp.remove()
+    autoreconf_cmd = ["autoreconf", "--force", "--install", "--verbose"]
+    project_dirs = _autoconf_subprojects(build.source_dir)
+    if project_dirs is None or len(project_dirs) == 1:
+        build.cmd(autoreconf_cmd, cwd=build.source_dir)
+    else:
+        # each project is regenerated on its own, they don't depend on each other's output.
+        with build.batch() as batch:
+            for project_dir in project_dirs:
+                label = project_dir.relative_to(build.source_dir).as_posix()
+                batch.submit([*autoreconf_cmd, "--no-recursive"], cwd=project_dir, label=f"autoreconf {label}")
+
+    if not build.dry_run:
+        stamp.write(digest)
+
+
+def _autotools_versions(build: Build) -> list[str]:
+    versions: list[str] = []
+    for tool in ("autoconf", "automake", "libtoolize", "autopoint", "gtkdocize"):
+        if shutil.which(tool):
+            proc = run_cmd([tool, "--version"], capture_output=True, text=True, check=False, executor=build.executor)
+            versions.append(proc.stdout.partition("\n")[0])
+    return versions
+
+
+def _autoreconf_inputs(source_dir: Path) -> list[Path]:
+    """
+    all files autoreconf takes as inputs
+    """
+    inputs: list[Path] = []
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        # don't descend into debian packaging and vcs dirs
+        dirnames[:] = [name for name in dirnames if name not in _AUTORECONF_IGNORED_DIRS]
+
+        in_m4_dir = Path(dirpath).name == "m4"
+        for filename in filenames:
+            if (
+                filename in _AUTORECONF_INPUT_FILES
+                or filename.endswith(".am")
+                or (in_m4_dir and filename.endswith(".m4"))
+            ):
+                inputs.append(Path(dirpath, filename))
+    return inputs
+
+
+_AUTORECONF_IGNORED_DIRS = {".git", ".pc", ".svn", "debian", "autom4te.cache"}
+_AUTORECONF_INPUT_FILES = {"configure.ac", "configure.in", "acinclude.m4"}
+
+
+def _autoconf_subprojects(source_dir: Path) -> list[Path] | None:
+    """
+    the source dir and all (recursive) subprojects from `AC_CONFIG_SUBDIRS`.
+    returns None if a subproject dir can't be determined statically.
+    """
+    projects = [source_dir]
+    idx = 0
+    while idx < len(projects):
+        project = projects[idx]
+        idx += 1
+
+        configure_ac = project / "configure.ac"
+        if not configure_ac.is_file():
+            configure_ac = project / "configure.in"
+        if not configure_ac.is_file():
+            continue
+
+        for subdirs in re.findall(r"AC_CONFIG_SUBDIRS\(\s*\[?([^\])]*)", configure_ac.read_text(errors="replace")):
+            for subdir in subdirs.split():
+                if "$" in subdir:
+                    return None
+                subproject = project / subdir
+                if subproject.is_dir() and subproject not in projects:
+                    projects.append(subproject)
+
+    return projects
 
 
 def clean(build: Build, target: str | None = None) -> None:
+    """
+    call `make clean`, or `make distclean` for a `full_clean`.
+    `clean` keeps `config.status`, so configure can be skipped when nothing changed.
+    """
     if not _has_makefile(build.source_dir):
         raise BuildError("no 'makefile' file found in build root for cleaning")
 
     if not target:
-        target = _make_test_targets(("distclean", "realclean", "clean"), cwd=build.source_dir)
+        candidates = ("distclean", "realclean", "clean") if build.full_clean else ("clean",)
+        target = make.first_target(build, candidates)
 
     if target:
-        build.cmd(["make", target])
+        build.cmd(["make", target], cwd=build.source_dir)
 
 
-def configure(build: Build, args: list[str] | str | None = None):
+def configure(build: Build, args: list[str] | str | None = None, cache: bool = False, force: bool = False):
+    """
+    run ./configure with debian's default arguments and the given custom ones.
+
+    when `cache` is set, a shared autoconf result cache is used.
+    configure is not run again if `config.status` exists and its inputs did not change,
+    unless `force` is set.
+    """
     if not _has_configure(build.source_dir):
         raise BuildError("no 'configure' file in build root - perhaps run autotools.autoreconf()?")
 
@@ -112,12 +294,115 @@ def configure(build: Build, args: list[str] | str | None = None):
     if build.architecture_target != build.architecture_host:
         default_args.append(f"--host={build.architecture_target}")
 
-    build.cmd(
-        [*default_args, *custom_args],
-        cwd=build.source_dir,
+    configure_cmd = [*default_args, *custom_args]
+
+    # skip when the previous configure run had the same inputs
+    stamp = Stamp(build.stamp_dir / "autotools-configure.stamp")
+    digest = fingerprint(
+        *configure_cmd,
+        *(f"{var}={os.environ.get(var, '')}" for var in _CONFIGURE_ENV_VARS),
+        files=[build.source_dir / "configure"],
     )
+    if not force and (build.source_dir / "config.status").is_file() and stamp.matches(digest):
+        print("debmagic: config.status is up to date, skipping configure")
+        return
+
+    if cache:
+        private_cache = build.stamp_dir / "config.cache"
+        shared_cache = _shared_cache_file(build)
+        if not build.dry_run:
+            _copy_cache(shared_cache, private_cache)
+        configure_cmd.append(f"--cache-file={private_cache}")
+
+    stamp.remove()
+    build.cmd(configure_cmd, cwd=build.source_dir)
     # TODO: show some config.log if configure failed
 
+    if build.dry_run:
+        return
+
+    if cache:
+        _merge_cache(private_cache, shared_cache)
+
+    stamp.write(digest)
+
+
+def _shared_cache_file(build: Build) -> Path:
+    """
+    the autoconf result cache for this host architecture, toolchain and build flags
+    """
+    compiler = os.environ.get("CC") or "cc"
+    if build.architecture_target != build.architecture_host:
+        compiler = os.environ.get("CC") or f"{build.architecture_host}-gcc"
+
+    compiler_version = ""
+    if shutil.which(compiler):
+        compiler_version = run_cmd(
+            [compiler, "--version"], capture_output=True, text=True, check=False, executor=build.executor
+        ).stdout
+
+    key = fingerprint(
+        build.architecture_host,
+        compiler_version,
+        *(f"{var}={os.environ.get(var, '')}" for var in _CONFIGURE_ENV_VARS),
+    )
+    return cache_dir("autoconf", key[:16]) / "config.cache"
+
+
+def _copy_cache(shared_cache: Path, private_cache: Path) -> None:
+    """
+    copy the shared cache so configure can work on its own file.
+    """
+    private_cache.parent.mkdir(parents=True, exist_ok=True)
+    with _locked(shared_cache):
+        if shared_cache.is_file():
+            shutil.copyfile(shared_cache, private_cache)
+        else:
+            private_cache.unlink(missing_ok=True)
+
+
+def _merge_cache(private_cache: Path, shared_cache: Path) -> None:
+    """
+    merge the results of a configure run into the shared cache.
+    other builds may be merging at the same time, so it's done under a lock.
+    """
+    if not private_cache.is_file():
+        return
+
+    with _locked(shared_cache):
+        entries = _read_cache(shared_cache) if shared_cache.is_file() else {}
+        entries.update(_read_cache(private_cache))
+
+        tmp_path = shared_cache.with_name(f"{shared_cache.name}.tmp")
+        tmp_path.write_text("".join(entries[name] for name in sorted(entries)))
+        tmp_path.replace(shared_cache)
+
+
+def _read_cache(path: Path) -> dict[str, str]:
+    """
+    read autoconf cache lines like `ac_cv_header_stdio_h=${ac_cv_header_stdio_h=yes}`.
+    """
+    entries: dict[str, str] = {}
+    for line in path.read_text().splitlines(keepends=True):
+        match = re.match(r"^(?:test \$\{)?(\w+)[=+]", line)
+        if not match:
+            continue
+        name = match.group(1)
+        # the precious variables are specific to the package and its environment,
+        # configure refuses to run if they differ from the cached ones.
+        if name.startswith("ac_cv_env_"):
+            continue
+        entries[name] = line
+    return entries
+
+
+@contextlib.contextmanager
+def _locked(path: Path) -> Generator[None, None, None]:
+    """exclusive lock for a file, held by a separate lock file"""
+    with path.with_name(f"{path.name}.lock").open("w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
 
 def build(build: Build, args: list[str] = []) -> None:
     if not _has_makefile(build.source_dir):
@@ -132,37 +417,139 @@ def build(build: Build, args: list[str] = []) -> None:
 _build = build
 
 
-def test(build: Build, target: str | None = None) -> None:
+def test(
+    build: Build,
+    target: str | None = None,
+    retries: int = 0,
+    shard: tuple[int, int] | None = None,
+) -> None:
+    """
+    run the test suite with `make -j<jobs> check`.
+
+    for automake's parallel test harness (including TAP tests), the per-test results and durations
+    are collected into `<state_dir>/test-results/{junit.xml,results.json}`.
+    failed tests are retried individually with `make recheck` up to `retries` times.
+    `shard=(index, count)` only runs the tests belonging to that shard, the others are skipped.
+    """
     if not _has_makefile(build.source_dir):
         raise BuildError("no 'makefile' file in build root - perhaps run autotools.configure()?")
 
     if not target:
-        target = _make_test_targets(("test", "check"), cwd=build.source_dir)
+        target = make.first_target(build, ("test", "check"))
 
-    if target:
-        build.cmd(["make", target])
+    if not target:
+        return
+
+    log_drivers, conflicting = _common_log_drivers(_log_drivers(build.source_dir))
+    if conflicting:
+        # the overrides on the command line apply to all directories
+        print(
+            f"debmagic: {', '.join(sorted(conflicting))} differ between directories, "
+            "their tests are neither timed nor sharded"
+        )
+    if not log_drivers:
+        # serial test harness or custom test target, we can't see single tests
+        build.cmd(["make", f"-j{build.parallel}", target], cwd=build.source_dir)
+        return
+
+    # wrap automake's test drivers to measure each test and to select the shard
+    timer = f"{shlex.quote(sys.executable)} -m debmagic.common.test_timer"
+    driver_args = [f"{name}={timer} {driver}" for name, driver in log_drivers.items()]
+
+    env = os.environ.copy()
+    if shard is not None:
+        index, count = shard
+        env["DEBMAGIC_TEST_SHARD"] = f"{index}/{count}"
+
+    report = CheckReport()
+    proc = build.cmd(["make", f"-j{build.parallel}", *driver_args, target], cwd=build.source_dir, env=env, check=False)
+    if build.dry_run:
+        return
+    report.update(collect_automake_results(build.source_dir))
+
+    for attempt in range(retries):
+        if proc.returncode == 0 or not report.failed:
+            break
+
+        failed = {result.name for result in report.failed}
+        print(f"debmagic: retrying {len(failed)} failed tests, attempt {attempt + 1} of {retries}")
+        # recheck only runs the tests which failed
+        proc = build.cmd(
+            ["make", f"-j{build.parallel}", *driver_args, "recheck"], cwd=build.source_dir, env=env, check=False
+        )
+        report.update([result for result in collect_automake_results(build.source_dir) if result.name in failed])
+
+    results_dir = build.state_dir / "test-results"
+    report.write_junit(results_dir / "junit.xml", suite_name=build.package.source_package.name)
+    report.write_json(results_dir / "results.json")
+    print(f"debmagic: {report.summary()}, results in {results_dir}")
+
+    if report.failed:
+        raise BuildError(f"tests failed: {', '.join(sorted(result.name for result in report.failed))}")
+    if proc.returncode != 0:
+        raise BuildError(f"make {target} failed with exit code {proc.returncode}")
+
+
+def _log_drivers(source_dir: Path) -> dict[Path, dict[str, str]]:
+    """
+    the test drivers of automake's parallel test harness, like `LOG_DRIVER` and `TAP_LOG_DRIVER`,
+    of each directory with a generated makefile in the tree.
+    """
+    drivers: dict[Path, dict[str, str]] = {}
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames[:] = [name for name in dirnames if name not in {".git", ".pc", "debian"}]
+        if "Makefile" not in filenames or "Makefile.am" not in filenames:
+            continue
+        makefile = Path(dirpath, "Makefile").read_text(errors="replace")
+        if dir_drivers := {
+            match.group(1): match.group(2).strip() for match in re.finditer(r"^(\w*LOG_DRIVER) = (.+)$", makefile, re.M)
+        }:
+            drivers[Path(dirpath)] = dir_drivers
+    return drivers
+
+
+def _common_log_drivers(drivers: dict[Path, dict[str, str]]) -> tuple[dict[str, str], set[str]]:
+    """
+    the drivers defined the same in all directories, and the names of those that differ.
+    """
+    common: dict[str, str] = {}
+    conflicting: set[str] = set()
+    for dir_drivers in drivers.values():
+        for name, driver in dir_drivers.items():
+            if common.setdefault(name, driver) != driver:
+                conflicting.add(name)
+    return {name: driver for name, driver in common.items() if name not in conflicting}, conflicting
 
 
 def install(build: Build, target: str = "install") -> None:
-    # TODO: figure out installdir handling for multi package builds
-    destdir = build.install_dirs[build.package.source_package.name]
-    build.cmd(["make", f"DESTDIR={destdir}", target], cwd=build.source_dir)
+    """
+    install into the only binary package, or into the staging dir,
+    which is then distributed into the binary packages by their `debian/<package>.install` files.
+    """
+    _make_install(build, target)
+    _distribute(build)
+
+
+def _make_install(build: Build, target: str = "install") -> None:
+    build.cmd(["make", f"DESTDIR={install_module.destdir(build)}", target], cwd=build.source_dir)
+
+
+def _distribute(build: Build) -> None:
+    if install_module.destdir(build) == build.staging_dir:
+        install_module.distribute(build)
+
+
+def _is_autotools_project(path: Path) -> bool:
+    return _has_makefile(path) or _has_configure(path) or _needs_autoreconf(path)
+
+
+def _needs_autoreconf(path: Path) -> bool:
+    return (path / "configure.ac").is_file() and not _has_configure(path)
 
 
 def _has_makefile(path: Path) -> bool:
-    return any((path / makefile).is_file() for makefile in ("GNUmakefile", "makefile", "Makefile"))
+    return make.find_makefile(path) is not None
 
 
 def _has_configure(path: Path) -> bool:
     return (path / "configure").is_file()
-
-
-def _make_test_targets(candidates: Iterable[str], cwd: Path) -> str | None:
-    """
-    test for makefile target availabilty: https://www.gnu.org/software/make/manual/html_node/Running.html
-    """
-    for candidate in candidates:
-        attempt = run_cmd(f"make -q {candidate}", cwd=cwd, capture_output=True)
-        if attempt.returncode == 1:
-            return candidate
-    return None
@@ -0,0 +1,231 @@
+"""
+builddeb module
+
+native replacement for `dh_builddeb` / `dpkg-deb --build`.
+the `control.tar` and `data.tar` of each package are streamed from the install dirs
+directly into the `.deb` ar container, data.tar through a multithreaded compressor.
+all binary packages (and their `-dbgsym` packages) are built concurrently.
+
+the archives are reproducible: entries are sorted, owned by root
+and their timestamps are clamped to `SOURCE_DATE_EPOCH`.
+
+usage as dh override:
+
+```python
+from debmagic.v0 import builddeb, dh
+
+dhp = dh.Preset()
+pkg = package(preset=dhp)
+dhp.override(builddeb.dh_builddeb)
+```
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, BinaryIO, Callable
+
+from debian import deb822
+
+from .._build import Build, BuildError
+
+AR_MAGIC = b"!<arch>\n"
+
+#: data.tar payloads larger than this are compressed with zstd, if available
+ZSTD_THRESHOLD = 64 << 20
+
+# compressor command and file name suffix
+_COMPRESSORS = {
+    "xz": (["xz", "-6", "-c"], ".xz"),
+    "zstd": (["zstd", "-q", "-c"], ".zst"),
+    "gzip": (["gzip", "-9", "-n", "-c"], ".gz"),
+    "none": ([], ""),
+}
+
+
+def dh_builddeb(build: Build) -> None:
+    build_debs(build)
+
+
+def build_debs(build: Build, dest_dir: Path | None = None, compression: str | None = None) -> list[Path]:
+    """
+    build a .deb for each binary package that has a `DEBIAN/control`.
+    `dest_dir`: where to put the .debs, by default the parent of the source dir, like dh_builddeb.
+    `compression`: "xz", "zstd", "gzip" or "none" for data.tar, by default chosen by payload size.
+    """
+    if dest_dir is None:
+        dest_dir = build.source_dir.parent
+
+    package_dirs: list[Path] = []
+    for pkg_name, install_dir in build.install_dirs.items():
+        dbgsym_dir = build.install_base_dir / ".debhelper" / pkg_name / "dbgsym-root"
+        for package_dir in (install_dir, dbgsym_dir):
+            if (package_dir / "DEBIAN" / "control").is_file():
+                package_dirs.append(package_dir)
+
+    source_date_epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    mtime = int(source_date_epoch) if source_date_epoch else int(time.time())
+
+    with ThreadPoolExecutor(max_workers=build.parallel) as pool:
+        return list(
+            pool.map(
+                lambda package_dir: build_deb(build, package_dir, dest_dir, mtime, compression),
+                package_dirs,
+            )
+        )
+
+
+def build_deb(
+    build: Build,
+    package_dir: Path,
+    dest_dir: Path,
+    mtime: int,
+    compression: str | None = None,
+) -> Path:
+    """
+    assemble one .deb from a package tree with a `DEBIAN` directory.
+    file timestamps newer than `mtime` are clamped to it.
+    """
+    control = deb822.Deb822((package_dir / "DEBIAN" / "control").read_text())
+    version = control["Version"].partition(":")[2] or control["Version"]
+    deb_file = dest_dir / f"{control['Package']}_{version}_{control['Architecture']}.deb"
+
+    data_entries = _tree_entries(package_dir, exclude_debian=True)
+    if compression is None:
+        payload_size = sum(entry.stat(follow_symlinks=False).st_size for _, entry in data_entries)
+        compression = "zstd" if payload_size > ZSTD_THRESHOLD and shutil.which("zstd") else "xz"
+    if compression not in _COMPRESSORS:
+        raise BuildError(f"unknown deb compression {compression!r}")
+    compress_cmd, suffix = _COMPRESSORS[compression]
+    if compression in ("xz", "zstd"):
+        compress_cmd = [*compress_cmd, f"-T{build.parallel}"]
+
+    print(f"debmagic: building {deb_file} from {package_dir} ({compression})")
+    if build.dry_run:
+        return deb_file
+
+    control_tar = io.BytesIO()
+    with tarfile.open(fileobj=control_tar, mode="w:xz", format=tarfile.GNU_FORMAT) as tar:
+        _add_entries(tar, package_dir / "DEBIAN", _tree_entries(package_dir / "DEBIAN"), mtime)
+
+    tmp_file = deb_file.with_name(f".{deb_file.name}.tmp")
+    with tmp_file.open("wb") as deb:
+        deb.write(AR_MAGIC)
+        _write_ar_member(deb, "debian-binary", b"2.0\n", mtime)
+        _write_ar_member(deb, "control.tar.xz", control_tar.getvalue(), mtime)
+        _write_ar_stream(
+            deb,
+            f"data.tar{suffix}",
+            mtime,
+            compress_cmd,
+            lambda stream: _write_tar(stream, package_dir, data_entries, mtime),
+        )
+    tmp_file.replace(deb_file)
+    return deb_file
+
+
+def _tree_entries(root: Path, exclude_debian: bool = False) -> list[tuple[str, os.DirEntry]]:
+    """
+    all entries below root as ("./relative/path", entry), in dpkg-deb's order:
+    depth-first, sorted by name within each directory, symlinks last.
+    """
+    entries: list[tuple[str, os.DirEntry]] = []
+
+    def walk(directory: Path, rel_dir: str) -> None:
+        with os.scandir(directory) as scan:
+            children = sorted(scan, key=lambda entry: os.fsencode(entry.name))
+        for entry in children:
+            if exclude_debian and rel_dir == "." and entry.name == "DEBIAN":
+                continue
+            rel_path = f"{rel_dir}/{entry.name}"
+            entries.append((rel_path, entry))
+            if entry.is_dir(follow_symlinks=False):
+                walk(Path(entry.path), rel_path)
+
+    walk(root, ".")
+    # symlinks go last so unpacking never follows a link created by the archive itself
+    return [item for item in entries if not item[1].is_symlink()] + [item for item in entries if item[1].is_symlink()]
+
+
+def _add_entries(tar: tarfile.TarFile, root: Path, entries: list[tuple[str, os.DirEntry]], mtime: int) -> None:
+    root_info = tar.gettarinfo(root, arcname="./")
+    _normalize(root_info, mtime)
+    tar.addfile(root_info)
+
+    for rel_path, entry in entries:
+        info = tar.gettarinfo(entry.path, arcname=rel_path)
+        _normalize(info, mtime)
+        if info.isreg():
+            with open(entry.path, "rb") as fd:
+                tar.addfile(info, fd)
+        else:
+            tar.addfile(info)
+
+
+def _normalize(info: tarfile.TarInfo, mtime: int) -> None:
+    info.uid = info.gid = 0
+    info.uname = info.gname = "root"
+    info.mtime = min(int(info.mtime), mtime)
+    if info.isdir() and not info.name.endswith("/"):
+        info.name += "/"
+
+
+def _write_tar(stream: IO[bytes], root: Path, entries: list[tuple[str, os.DirEntry]], mtime: int) -> None:
+    with tarfile.open(fileobj=stream, mode="w|", format=tarfile.GNU_FORMAT) as tar:
+        _add_entries(tar, root, entries, mtime)
+
+
+def _ar_header(name: str, size: int, mtime: int) -> bytes:
+    header = f"{name:<16}{mtime:<12}{0:<6}{0:<6}{'100644':<8}{size:<10}`\n".encode()
+    assert len(header) == 60
+    return header
+
+
+def _write_ar_member(deb: BinaryIO, name: str, data: bytes, mtime: int) -> None:
+    deb.write(_ar_header(name, len(data), mtime))
+    deb.write(data)
+    if len(data) % 2:
+        deb.write(b"\n")
+
+
+def _write_ar_stream(
+    deb: BinaryIO,
+    name: str,
+    mtime: int,
+    compress_cmd: list[str],
+    write_data: Callable[[IO[bytes]], None],
+) -> None:
+    """
+    write an ar member whose size isn't known in advance:
+    the compressor writes directly into the .deb, then the header's size is patched.
+    """
+    header_offset = deb.tell()
+    deb.write(_ar_header(name, 0, mtime))
+    data_offset = deb.tell()
+
+    if compress_cmd:
+        deb.flush()
+        proc = subprocess.Popen(compress_cmd, stdin=subprocess.PIPE, stdout=deb)
+        assert proc.stdin is not None
+        try:
+            write_data(proc.stdin)
+        finally:
+            proc.stdin.close()
+            ret = proc.wait()
+        if ret != 0:
+            raise BuildError(f"{compress_cmd[0]} failed with exit code {ret}")
+        deb.seek(0, os.SEEK_END)
+    else:
+        write_data(deb)
+
+    size = deb.tell() - data_offset
+    if size % 2:
+        deb.write(b"\n")
+    deb.seek(header_offset)
+    deb.write(_ar_header(name, size, mtime))
+    deb.seek(0, os.SEEK_END)
@@ -0,0 +1,155 @@
+"""
+Rust Cargo module
+
+preset tries to execute:
+- cargo build --release --target <DEB_HOST_RUST_TYPE>
+- cargo test
+- cargo install --root <dir>/usr
+
+functions included:
+- build(): calls `cargo build -j<jobs>`
+- test(): calls `cargo test -j<jobs> -- --test-threads=<jobs>`
+- install(): calls `cargo install --path . --root <destdir>/usr` for the only binary package,
+  or for the staging dir distributed by `install`
+
+the cargo target directory and cargo home (with its registry cache) are kept
+in debmagic's persistent cache, one per rust toolchain.
+so dependency crates are only compiled once and reused by later builds.
+
+when the source has a `vendor/` directory, or debian's packaged crates are available
+in `/usr/share/cargo/registry`, cargo is run offline against these sources.
+"""
+
+import functools
+import os
+from pathlib import Path
+
+from debmagic.common.executor import Executor
+from debmagic.common.utils import run_cmd
+
+from .._build import Build, BuildError
+from .._cache import cache_dir
+from .._preset import Preset as PresetBase
+from .._stamp import fingerprint
+from . import install as install_module
+
+DEBIAN_CARGO_REGISTRY = Path("/usr/share/cargo/registry")
+
+
+class Preset(PresetBase):
+    def required_tools(self, build: Build) -> list[str]:
+        if not _has_cargo_toml(build.source_dir):
+            return []
+        return ["cargo", "rustc"]
+
+    def preflight(self, build: Build) -> list[str]:
+        if not _has_cargo_toml(build.source_dir) or install_module.destdir(build) != build.staging_dir:
+            return []
+        return install_module.check_install_files(build)
+
+    def build(self, build: Build, args: list[str] | None = None) -> None:
+        if not _has_cargo_toml(build.source_dir):
+            return
+        _build(build, args or [])
+
+    def test(self, build: Build) -> None:
+        if not _has_cargo_toml(build.source_dir):
+            return
+        test(build)
+
+    def install(self, build: Build) -> None:
+        if not _has_cargo_toml(build.source_dir):
+            return
+        install(build)
+
+
+def build(build: Build, args: list[str] = []) -> None:
+    _cargo(build, "build", ["--release", *args])
+
+
+# otherwise the preset function argument name has to be adjusted
+# which is an invalid method override then
+_build = build
+
+
+def test(build: Build, args: list[str] | None = None) -> None:
+    env = build.package.build_env
+    if env["DEB_BUILD_RUST_TYPE"] != env["DEB_HOST_RUST_TYPE"]:
+        print("debmagic: cross-building, skipping cargo test")
+        return
+
+    _cargo(build, "test", ["--release", *(args or []), "--", f"--test-threads={build.parallel}"])
+
+
+def install(build: Build, destdir: Path | None = None, args: list[str] | None = None) -> None:
+    """
+    install into `destdir`, by default into the only binary package, or into the staging dir,
+    which is then distributed into the binary packages by their `debian/<package>.install` files.
+    """
+    target = destdir or install_module.destdir(build)
+    root = target / build.prefix.relative_to("/")
+
+    install_args = ["--path", str(build.source_dir), "--root", str(root), "--no-track", *(args or [])]
+    if (build.source_dir / "Cargo.lock").is_file():
+        install_args.append("--locked")
+
+    # cargo install builds in release mode too, with the shared target dir it reuses the build result.
+    _cargo(build, "install", install_args)
+    if destdir is None and target == build.staging_dir:
+        install_module.distribute(build)
+
+
+def _cargo(build: Build, operation: str, args: list[str]) -> None:
+    if not _has_cargo_toml(build.source_dir):
+        raise BuildError("no 'Cargo.toml' file in build root")
+
+    toolchain_dir = cache_dir("cargo", _toolchain_id(build.executor))
+
+    env = os.environ.copy()
+    env["CARGO_HOME"] = str(toolchain_dir / "home")
+    env["CARGO_TARGET_DIR"] = str(toolchain_dir / "target")
+
+    build.cmd(
+        [
+            "cargo",
+            operation,
+            f"--target={build.package.build_env['DEB_HOST_RUST_TYPE']}",
+            f"-j{build.parallel}",
+            *_source_args(build),
+            *args,
+        ],
+        cwd=build.source_dir,
+        env=env,
+    )
+
+
+def _source_args(build: Build) -> list[str]:
+    """use vendored or debian-packaged crates instead of crates.io"""
+    vendor_dir = build.source_dir / "vendor"
+    if vendor_dir.is_dir():
+        registry = vendor_dir
+    elif DEBIAN_CARGO_REGISTRY.is_dir():
+        registry = DEBIAN_CARGO_REGISTRY
+    else:
+        return []
+
+    return [
+        "--offline",
+        "--config",
+        'source.crates-io.replace-with="debmagic-vendored"',
+        "--config",
+        f'source.debmagic-vendored.directory="{registry}"',
+    ]
+
+
+@functools.cache
+def _toolchain_id(executor: Executor) -> str:
+    """identifies the rust compiler, to not mix build results of different toolchains"""
+    rustc_version = run_cmd(
+        ["rustc", "--version", "--verbose"], executor=executor, capture_output=True, text=True
+    ).stdout
+    return fingerprint(rustc_version)[:16]
+
+
+def _has_cargo_toml(path: Path) -> bool:
+    return (path / "Cargo.toml").is_file()
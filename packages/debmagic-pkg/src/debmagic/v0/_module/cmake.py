@@ -0,0 +1,180 @@
+"""
+CMake module
+
+configures out of tree with the ninja generator.
+
+preset tries to execute:
+- cmake -G Ninja
+- ninja
+- ctest
+- ninja install
+
+functions included:
+- clean(): removes the build directory, the preset only does so for a full clean (`rules clean`)
+- configure(): to call `cmake -S <src> -B <build_dir> -G Ninja <args>`
+- build(): calls `ninja -j<jobs>`
+- test(): calls `ctest -j<jobs>`
+- install(): calls `ninja install` with `DESTDIR=<dir>`
+
+the build directory is kept between runs, so ninja only rebuilds what changed.
+configure is skipped if it was already done with the same arguments,
+ninja re-runs cmake by itself when any CMakeLists.txt changed.
+"""
+
+import shlex
+import shutil
+from pathlib import Path
+
+from .._build import Build, BuildError
+from .._preset import Preset as PresetBase
+from .._stamp import Stamp, fingerprint
+from . import install as install_module
+from . import ninja
+
+
+class Preset(PresetBase):
+    def required_tools(self, build: Build) -> list[str]:
+        if not _has_cmakelists(build.source_dir):
+            return []
+        return ["cmake", "ninja"]
+
+    def preflight(self, build: Build) -> list[str]:
+        if not _has_cmakelists(build.source_dir) or install_module.destdir(build) != build.staging_dir:
+            return []
+        return install_module.check_install_files(build)
+
+    def clean(self, build: Build) -> None:
+        # the clean stage starting each build keeps the build directory for incremental rebuilds
+        if not _has_cmakelists(build.source_dir) or not build.full_clean:
+            return
+        clean(build)
+
+    def configure(self, build: Build, args: list[str] | None = None) -> None:
+        if not _has_cmakelists(build.source_dir):
+            return
+        configure(build, args or [])
+
+    def build(self, build: Build, args: list[str] | None = None) -> None:
+        if not _has_cmakelists(build.source_dir):
+            return
+        _build(build, args or [])
+
+    def test(self, build: Build) -> None:
+        if not _has_cmakelists(build.source_dir):
+            return
+        test(build)
+
+    def install(self, build: Build) -> None:
+        if not _has_cmakelists(build.source_dir):
+            return
+        install(build)
+
+
+def clean(build: Build, build_dir: Path | None = None) -> None:
+    build_dir = build_dir or build.build_dir
+    if build_dir.is_dir():
+        print(f"debmagic: removing cmake build directory {build_dir}")
+        if not build.dry_run:
+            shutil.rmtree(build_dir)
+
+
+def configure(build: Build, args: list[str] | str | None = None, build_dir: Path | None = None) -> None:
+    if not _has_cmakelists(build.source_dir):
+        raise BuildError("no 'CMakeLists.txt' file in build root")
+
+    build_dir = build_dir or build.build_dir
+
+    match args:
+        case None:
+            custom_args = []
+        case str():
+            custom_args = shlex.split(args)
+        case list():
+            custom_args = args
+
+    # as debhelper's cmake buildsystem does
+    default_args = [
+        "cmake",
+        "-S",
+        str(build.source_dir),
+        "-B",
+        str(build_dir),
+        "-G",
+        "Ninja",
+        f"-DCMAKE_INSTALL_PREFIX={build.prefix}",
+        "-DCMAKE_BUILD_TYPE=None",
+        "-DCMAKE_INSTALL_SYSCONFDIR=/etc",
+        "-DCMAKE_INSTALL_LOCALSTATEDIR=/var",
+        "-DCMAKE_INSTALL_RUNSTATEDIR=/run",
+        "-DCMAKE_EXPORT_NO_PACKAGE_REGISTRY=ON",
+        "-DCMAKE_FIND_USE_PACKAGE_REGISTRY=OFF",
+        "-DCMAKE_FIND_PACKAGE_NO_PACKAGE_REGISTRY=ON",
+        "-DFETCHCONTENT_FULLY_DISCONNECTED=ON",
+        "-DCMAKE_SKIP_INSTALL_ALL_DEPENDENCY=ON",
+        "-DCMAKE_VERBOSE_MAKEFILE=ON",
+    ]
+
+    if multiarch := build.package.build_env["DEB_HOST_MULTIARCH"]:
+        default_args.append(f"-DCMAKE_INSTALL_LIBDIR=lib/{multiarch}")
+
+    # cross-building
+    if build.architecture_target != build.architecture_host:
+        host = build.architecture_host
+        default_args += [
+            f"-DCMAKE_SYSTEM_NAME={_cmake_system_name(build)}",
+            f"-DCMAKE_SYSTEM_PROCESSOR={build.package.build_env['DEB_HOST_GNU_CPU']}",
+            f"-DCMAKE_C_COMPILER={host}-gcc",
+            f"-DCMAKE_CXX_COMPILER={host}-g++",
+            f"-DPKG_CONFIG_EXECUTABLE=/usr/bin/{host}-pkg-config",
+        ]
+
+    cmd = [*default_args, *custom_args]
+
+    # ninja re-runs cmake itself if the CMakeLists.txt files change,
+    # so we only have to configure again if our arguments changed.
+    stamp = Stamp(build_dir / ".debmagic-configure")
+    digest = fingerprint(*cmd)
+    if ninja.has_build_file(build_dir) and stamp.matches(digest):
+        print(f"debmagic: cmake build directory {build_dir} is already configured")
+        return
+
+    build.cmd(cmd, cwd=build.source_dir)
+    if not build.dry_run:
+        stamp.write(digest)
+
+
+def build(build: Build, args: list[str] = [], build_dir: Path | None = None) -> None:
+    ninja.build(build, build_dir, targets=args)
+
+
+# otherwise the preset function argument name has to be adjusted
+# which is an invalid method override then
+_build = build
+
+
+def test(build: Build, args: list[str] | None = None, build_dir: Path | None = None) -> None:
+    build_dir = build_dir or build.build_dir
+    build.cmd(
+        ["ctest", "--test-dir", build_dir, f"-j{build.parallel}", "--output-on-failure", *(args or [])],
+        cwd=build.source_dir,
+    )
+
+
+def install(build: Build, build_dir: Path | None = None, destdir: Path | None = None) -> None:
+    ninja.install(build, build_dir, destdir)
+
+
+def _has_cmakelists(path: Path) -> bool:
+    return (path / "CMakeLists.txt").is_file()
+
+
+def _cmake_system_name(build: Build) -> str:
+    match build.package.build_env["DEB_HOST_ARCH_OS"]:
+        case "linux":
+            return "Linux"
+        case "kfreebsd":
+            return "kFreeBSD"
+        case "hurd":
+            return "GNU"
+        case other:
+            return other
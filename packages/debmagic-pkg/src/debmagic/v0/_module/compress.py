@@ -0,0 +1,210 @@
+"""
+compress module
+
+native replacement for `dh_compress`.
+selects the same documentation, manpages, info pages and changelogs as debhelper,
+compresses them concurrently in a thread pool and fixes up symlinks and hardlinks.
+the gzip output is deterministic, like `gzip -9n`.
+
+usage as dh override:
+
+```python
+from debmagic.v0 import compress, dh
+
+dhp = dh.Preset()
+pkg = package(preset=dhp)
+dhp.override(compress.dh_compress)
+```
+"""
+
+import fnmatch
+import os
+import stat
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from .._build import Build
+from .._file_index import FileInfo, FileKind
+
+# dh_compress: usr/share/doc files are only compressed if they are larger than 4k,
+# or if they are changelogs or news.
+DOC_SIZE_THRESHOLD = 4096
+
+_NO_COMPRESS_MAN_INFO = ["*.gz", "*.gif", "*.png", "*.jpg", "*.jpeg"]
+
+# case-insensitive patterns for usr/share/doc files that are never compressed
+_NO_COMPRESS_DOC_ICASE = [
+    "*.htm*",
+    "*.xhtml",
+    "*.gif",
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gz",
+    "*.taz",
+    "*.tgz",
+    "*.z",
+    "*.bz2",
+    "*-gz",
+    "*-z",
+    "*_z",
+    "*.epub",
+    "*.jar",
+    "*.zip",
+    "*.odg",
+    "*.odp",
+    "*.odt",
+    ".htaccess",
+    "*.css",
+    "*.xz",
+    "*.lz",
+    "*.lzma",
+    "*.haddock",
+    "*.hs",
+    "*.woff",
+    "*.woff2",
+    "*.svg",
+    "*.svgz",
+    "*.js",
+]
+
+# case-sensitive patterns for usr/share/doc files that are never compressed
+_NO_COMPRESS_DOC = ["index.sgml", "objects.inv", "*.map", "*.devhelp2", "search_index.json", "copyright"]
+
+
+def dh_compress(build: Build) -> None:
+    compress(build)
+
+
+def compress(build: Build, exclude: Iterable[str] = ()) -> None:
+    """
+    compress documentation in all package install dirs.
+    `exclude`: skip files whose path contains one of these strings, like `dh_compress -X`.
+    """
+    exclude = list(exclude)
+
+    index = build.file_index()
+    packages: list[tuple[Path, list[FileInfo], list[Path]]] = []
+    for install_dir in build.install_dirs.values():
+        entries = index.files(install_dir)
+        selected = [
+            info
+            for info in entries
+            if info.kind != FileKind.symlink and _should_compress(info) and not _excluded(info.full_path, exclude)
+        ]
+        symlinks = [info.full_path for info in entries if info.kind == FileKind.symlink]
+        packages.append((install_dir, selected, symlinks))
+
+    # hardlinked files are compressed once and linked again afterwards
+    to_compress: list[Path] = []
+    relinks: list[tuple[Path, Path]] = []
+    for _, selected, _ in packages:
+        seen_inodes: dict[tuple[int, int], Path] = {}
+        for info in selected:
+            if info.nlink > 1 and info.inode in seen_inodes:
+                relinks.append((seen_inodes[info.inode], info.full_path))
+            else:
+                seen_inodes[info.inode] = info.full_path
+                to_compress.append(info.full_path)
+
+    print(f"debmagic: compressing {len(to_compress)} files")
+    if build.dry_run or not to_compress:
+        return
+
+    # zlib releases the GIL while compressing.
+    # a forked process pool could deadlock on locks held by the build's other threads.
+    with ThreadPoolExecutor(max_workers=build.parallel) as pool:
+        # results have to be consumed to get the exceptions
+        for _ in pool.map(gzip_file, to_compress):
+            pass
+
+    for original, link in relinks:
+        link.unlink()
+        os.link(original.with_name(f"{original.name}.gz"), link.with_name(f"{link.name}.gz"))
+
+    for install_dir, _, symlinks in packages:
+        _fix_symlinks(install_dir, symlinks)
+    build.invalidate_file_index()
+
+
+def gzip_file(path: Path) -> None:
+    """
+    replace path with path.gz, compressed like `gzip -9n`:
+    deterministic header without name and timestamp, executable bits are removed.
+    """
+    st = path.stat()
+    data = path.read_bytes()
+
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS, 9)
+    gz_path = path.with_name(f"{path.name}.gz")
+    with gz_path.open("wb") as fd:
+        # magic, deflate, no flags, mtime 0, max compression, unix
+        fd.write(b"\x1f\x8b\x08\x00" + struct.pack("<I", 0) + b"\x02\x03")
+        fd.write(compressor.compress(data))
+        fd.write(compressor.flush())
+        fd.write(struct.pack("<II", zlib.crc32(data), len(data) & 0xFFFFFFFF))
+
+    os.chmod(gz_path, stat.S_IMODE(st.st_mode) & ~0o111)
+    os.utime(gz_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    path.unlink()
+
+
+def _should_compress(info: FileInfo) -> bool:
+    """
+    debhelper's rules for which files are compressed
+    """
+    rel_path = info.path
+    name = info.name
+
+    if rel_path.startswith(("usr/share/info/", "usr/share/man/")):
+        return not _matches(name.lower(), _NO_COMPRESS_MAN_INFO)
+
+    if rel_path.startswith("usr/share/fonts/X11/"):
+        return name.endswith(".pcf")
+
+    if rel_path.startswith("usr/share/doc/"):
+        # sphinx sources are never compressed
+        if "/_sources/" in rel_path:
+            return False
+        if not (info.size > DOC_SIZE_THRESHOLD or name.startswith(("changelog", "NEWS"))):
+            return False
+        if name != "changelog.html" and _matches(name.lower(), _NO_COMPRESS_DOC_ICASE):
+            return False
+        return not _matches(name, _NO_COMPRESS_DOC)
+
+    return False
+
+
+def _matches(name: str, patterns: list[str]) -> bool:
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def _excluded(file: Path, exclude: list[str]) -> bool:
+    return any(pattern in str(file) for pattern in exclude)
+
+
+def _fix_symlinks(root: Path, symlinks: list[Path]) -> None:
+    """
+    symlinks pointing to files that were compressed now point to the .gz file and get a .gz suffix too.
+    repeat until nothing changes, for symlinks pointing to symlinks.
+    absolute targets are looked up in the package `root`, where they point to once installed.
+    """
+    remaining = set(symlinks)
+    changed = True
+    while changed:
+        changed = False
+        for link in sorted(remaining):
+            target = os.readlink(link)
+            target_path = root / target.lstrip("/") if os.path.isabs(target) else link.parent / target
+            if os.path.lexists(target_path) or not os.path.lexists(f"{target_path}.gz"):
+                continue
+
+            gz_link = link.with_name(f"{link.name}.gz")
+            gz_link.unlink(missing_ok=True)
+            link.unlink()
+            gz_link.symlink_to(f"{target}.gz")
+            remaining.discard(link)
+            changed = True
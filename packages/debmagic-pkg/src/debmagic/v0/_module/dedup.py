@@ -0,0 +1,156 @@
+"""
+dedup module
+
+replaces byte-identical files within a binary package by symlinks to one copy,
+and reports files duplicated across binary packages as candidates for a `-common` package.
+files are only hashed if another file of the same size and mode exists, concurrently.
+
+the symlinks follow `dh_link`'s policy: relative within a top-level directory, absolute across them.
+conffiles (`etc/`), copyright files, shared libraries and executables (ELF files, scripts and
+files with an executable bit) are never replaced: programs may look at their own path,
+and the dynamic loader and ldconfig treat symlinked libraries differently.
+
+best run before compression, so only one copy of the duplicates is compressed:
+
+```python
+from debmagic.v0 import dedup, dh
+
+dhp = dh.Preset()
+pkg = package(preset=dhp)
+
+@dhp.override
+def dh_link(build):
+    build.cmd(["dh_link"], cwd=build.source_dir)
+    dedup.dedup(build)
+```
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from debmagic.common.hashing import hash_files
+
+from .._build import Build
+from .._file_index import FileKind
+
+# paths that have to stay regular files
+_KEEP = [
+    re.compile(r"^etc/"),
+    re.compile(r"^usr/share/doc/[^/]+/copyright$"),
+    re.compile(r"\.so(\.[^/]*)?$"),
+]
+
+# file kinds that have to stay regular files
+_KEEP_KINDS = {FileKind.symlink, FileKind.elf, FileKind.script}
+
+
+@dataclass
+class Duplicate:
+    """
+    identical files in several binary packages
+    """
+
+    size: int
+    #: (package name, path) of each copy
+    files: list[tuple[str, str]]
+
+
+def dedup(build: Build, min_size: int = 1, link: bool = True) -> list[Duplicate]:
+    """
+    replace duplicates within each package by symlinks (unless `link` is False)
+    and return the files duplicated across packages.
+    `min_size`: smaller files are ignored.
+    """
+    # (size, mode) -> [(package name, path)], one path per inode
+    candidates: dict[tuple[int, int], list[tuple[str, str]]] = {}
+    for pkg_name, install_dir in build.install_dirs.items():
+        for path, size, mode in _package_files(build, install_dir, min_size):
+            candidates.setdefault((size, mode), []).append((pkg_name, path))
+
+    files = [file for group in candidates.values() if len(group) > 1 for file in group]
+    digests = hash_files(
+        (build.install_dirs[pkg_name] / path for pkg_name, path in files),
+        algorithm="sha256",
+        workers=build.parallel,
+    )
+
+    # (digest, size) -> package name -> paths
+    identical: dict[tuple[str, int], dict[str, list[str]]] = {}
+    for (size, _), group in candidates.items():
+        if len(group) < 2:
+            continue
+        for pkg_name, path in group:
+            digest = digests[build.install_dirs[pkg_name] / path]
+            identical.setdefault((digest, size), {}).setdefault(pkg_name, []).append(path)
+
+    linked = 0
+    saved = 0
+    duplicates: list[Duplicate] = []
+    for (_, size), packages in identical.items():
+        for pkg_name, paths in packages.items():
+            paths.sort(key=lambda path: (path.count("/"), path))
+            if not link:
+                continue
+            for path in paths[1:]:
+                _replace_by_link(build, build.install_dirs[pkg_name], path, paths[0])
+                linked += 1
+                saved += size
+            del paths[1:]
+
+        if len(packages) > 1:
+            duplicates.append(
+                Duplicate(size, [(pkg_name, path) for pkg_name, paths in packages.items() for path in paths])
+            )
+
+    if linked:
+        build.invalidate_file_index()
+    print(f"debmagic: replaced {linked} duplicate files by symlinks, saving {saved} bytes")
+    for duplicate in sorted(duplicates, key=lambda duplicate: -duplicate.size * len(duplicate.files)):
+        copies = ", ".join(f"{pkg_name}:/{path}" for pkg_name, path in duplicate.files)
+        print(f"debmagic: identical in multiple packages ({duplicate.size} bytes): {copies}")
+    if duplicates:
+        print("debmagic: consider moving these files to a -common package")
+    return duplicates
+
+
+def link_target(link: str, target: str) -> str:
+    """
+    the symlink value for `link` pointing to `target` (both relative to the package root), like dh_link:
+    relative within a top-level directory, absolute across them.
+
+    >>> link_target("usr/share/foo/b/x", "usr/share/foo/a/x")
+    '../a/x'
+    >>> link_target("opt/foo/x", "usr/share/foo/x")
+    '/usr/share/foo/x'
+    """
+    if link.split("/", 1)[0] != target.split("/", 1)[0]:
+        return f"/{target}"
+    return os.path.relpath(target, os.path.dirname(link))
+
+
+def _package_files(build: Build, install_dir: Path, min_size: int) -> list[tuple[str, int, int]]:
+    """
+    (path, size, mode) of the regular files that can be replaced by symlinks.
+    of hardlinked files only the first one is included.
+    """
+    files: list[tuple[str, int, int]] = []
+    inodes: set[tuple[int, int]] = set()
+    for info in build.file_index().files(install_dir):
+        if info.kind in _KEEP_KINDS or info.mode & 0o111 or info.size < max(min_size, 1) or info.inode in inodes:
+            continue
+        if any(pattern.search(info.path) for pattern in _KEEP):
+            continue
+        inodes.add(info.inode)
+        files.append((info.path, info.size, info.mode))
+    return files
+
+
+def _replace_by_link(build: Build, install_dir: Path, path: str, target: str) -> None:
+    value = link_target(path, target)
+    if build.dry_run:
+        print(f"debmagic: would link {install_dir / path} -> {value}")
+        return
+    (install_dir / path).unlink()
+    (install_dir / path).symlink_to(value)
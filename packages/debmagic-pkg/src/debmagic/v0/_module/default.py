@@ -27,6 +27,9 @@ class Preset(BasePreset):
         super().__init__()
         self._dh_preset = DHPreset()
 
+    def required_tools(self, build: Build) -> list[str]:
+        return self._dh_preset.required_tools(build)
+
     def clean(self, build: Build) -> None:
         self._dh_preset.clean(build)
 
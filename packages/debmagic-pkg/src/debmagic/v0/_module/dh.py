@@ -12,6 +12,9 @@ pkg = package(preset=dhp)
 
 pkg.pack()
 
+# run helpers acting on single binary packages concurrently for each package:
+dhp = dh.Preset("--with=python3", parallel_packages=True)
+
 # if needed, define optional overrides before the .pack() line:
 @dhp.override
 def dh_auto_install(build: Build):
@@ -22,18 +25,46 @@ def dh_auto_install(build: Build):
 ## internals
 this preset splits up the dh sequences (dh build, dh binary) into the debmagic stages.
 so in theory, using this preset is the same as using dh.
+
+with `parallel_packages=True`, the helpers in `PER_PACKAGE_HELPERS` are called
+with `-p<package>` for each binary package in a bounded worker pool.
+each step finishes for all packages before the next one starts,
+and each package's output goes to `debian/.debmagic/dh-logs/<package>.log`.
+
+each helper of a stage is a step named like the helper (see `Package.step`),
+so rules files can add their own steps before, after or alongside them:
+
+```python
+@pkg.step("build", after=["dh_auto_build"])
+def docs(build: Build):
+    build.cmd("make -C doc html")
+```
+
+like dh itself, helpers promising to be no-ops (`# PROMISE: DH NOOP WITHOUT ...` in the helper script)
+are not run for packages without the files they act on.
 """
 
+import difflib
+import functools
+import os
+import re
 import shlex
+import shutil
+from collections import Counter
 from enum import StrEnum
 from pathlib import Path
 from typing import Callable
 
+from debmagic.common.executor import Executor
 from debmagic.common.utils import list_strip_head, prefix_idx, run_cmd
 
-from .._build import Build
+from .._build import Build, BuildError, _command_str
+from .._build_stage import BuildStage
 from .._package import Package
+from .._preflight import check_build_step
 from .._preset import Preset as PresetBase
+from .._steps import Step
+from . import install as install_module
 
 
 class DHSequenceID(StrEnum):
@@ -51,9 +82,40 @@ class DHSequenceID(StrEnum):
 
 type DHOverride = Callable[[Build], None]
 
+#: dh helpers that only act on the package they are called for,
+#: so they can run concurrently for all binary packages
+PER_PACKAGE_HELPERS = frozenset(
+    {
+        "dh_builddeb",
+        "dh_compress",
+        "dh_dwz",
+        "dh_fixperms",
+        "dh_gencontrol",
+        "dh_installchangelogs",
+        "dh_installdeb",
+        "dh_installdocs",
+        "dh_installexamples",
+        "dh_installinfo",
+        "dh_installman",
+        "dh_link",
+        "dh_makeshlibs",
+        "dh_md5sums",
+        "dh_shlibdeps",
+        "dh_strip",
+        "dh_strip_nondeterminism",
+    }
+)
+
+# options selecting packages, dropped or conflicting when calling a helper for one package
+_ALL_PACKAGES_ARGS = ("-a", "--arch", "-i", "--indep")
+_PACKAGE_SELECTION_PREFIXES = ("-p", "--package", "-N", "--no-package")
+
+_PROMISE = re.compile(r"^# PROMISE: DH NOOP WITHOUT (.*)$", re.MULTILINE)
+_PROMISE_CONDITION = re.compile(r"^([a-z-]+)\(([^)]*)\)$")
+
 
 class Preset(PresetBase):
-    def __init__(self, dh_args: list[str] | str | None = None):
+    def __init__(self, dh_args: list[str] | str | None = None, parallel_packages: bool = False):
         self._dh_args: list[str]
         if dh_args is None:
             self._dh_args = []
@@ -64,6 +126,7 @@ class Preset(PresetBase):
 
         self._overrides: dict[str, DHOverride] = {}
         self._initialized = False
+        self._parallel_packages = parallel_packages
 
         # debmagic's stages, with matching commands from the dh sequence
         self._clean_seq: list[str] = []
@@ -76,9 +139,12 @@ class Preset(PresetBase):
         # all seen sequence cmd ids (the dh command script itself)
         self._seq_ids: set[str] = set()
 
+        # entries of debian/, by the directory's mtime
+        self._debian_listing: tuple[int, list[str]] | None = None
+
     def initialize(self, src_pkg: Package) -> None:
         # get all steps the dh sequence would do
-        self._populate_stages(self._dh_args, base_dir=src_pkg.base_dir)
+        self._populate_stages(self._dh_args, base_dir=src_pkg.base_dir, executor=src_pkg.executor)
         self._initialized = True
 
     def clean(self, build: Build):
@@ -99,31 +165,168 @@ class Preset(PresetBase):
     def package(self, build: Build):
         self._run_dh_seq_cmds(build, self._package_seq)
 
+    def steps(self, stage: BuildStage) -> list[Step] | None:
+        """
+        each command of the stage's dh sequence as a step named like the helper, in sequence order
+        """
+        seq_cmds = {
+            BuildStage.clean: self._clean_seq,
+            BuildStage.configure: self._configure_seq,
+            BuildStage.build: self._build_seq,
+            BuildStage.test: self._test_seq,
+            BuildStage.install: self._install_seq,
+            BuildStage.package: self._package_seq,
+        }.get(stage)
+        if not seq_cmds:
+            return None
+
+        steps: list[Step] = []
+        helper_count: Counter[str] = Counter()
+        # the helpers with nothing to do are reported once for the stage, by its last helper
+        skipped: list[str] = []
+        for idx, seq_cmd in enumerate(seq_cmds):
+            helper = shlex.split(seq_cmd)[0]
+            helper_count[helper] += 1
+            # helpers called more than once are numbered
+            name = helper if helper_count[helper] == 1 else f"{helper}#{helper_count[helper]}"
+            steps.append(
+                Step(
+                    name,
+                    functools.partial(
+                        self._run_dh_seq_cmds, seq_cmds=[seq_cmd], skipped=skipped, report=idx == len(seq_cmds) - 1
+                    ),
+                    after=(steps[-1].name,) if steps else (),
+                )
+            )
+        return steps
+
     def override(self, func: DHOverride) -> DHOverride:
         """
         decorator to override a dh sequence command
         """
         name = func.__code__.co_name  # ty:ignore[unresolved-attribute]
         if name not in self._seq_ids:
-            raise ValueError(f"dh sequence doesn't contain your override {name!r}")
+            raise ValueError(self._unknown_override(name))
         self._overrides[name] = func
         return func
 
-    def _run_dh_seq_cmds(self, build: Build, seq_cmds: list[str]) -> None:
-        """one line of dh output"""
+    def required_tools(self, build: Build) -> list[str]:
+        """
+        dh and the helpers of its sequences which aren't overridden
+        """
+        tools = ["dh"]
+        for seq_id in sorted(self._seq_ids):
+            # dh's internal commands and rules file targets aren't on PATH
+            if seq_id not in self._overrides and seq_id != "create-stamp" and "/" not in seq_id:
+                tools.append(seq_id)
+        return tools
+
+    def preflight(self, build: Build) -> list[str]:
+        if not self._initialized:
+            return ["dh.Preset().initialize() was never called"]
+
+        problems: list[str] = []
+        for name, func in self._overrides.items():
+            if name not in self._seq_ids:
+                problems.append(self._unknown_override(name))
+            elif problem := check_build_step(func, f"dh override {name!r}", build):
+                problems.append(problem)
+        # the install files are only read by debmagic when it replaces dh_install
+        if self._overrides.get("dh_install") is install_module.dh_install:
+            problems.extend(install_module.check_install_files(build))
+        return problems
+
+    def _unknown_override(self, name: str) -> str:
+        close = difflib.get_close_matches(name, self._seq_ids, n=1)
+        hint = f", did you mean {close[0]!r}?" if close else ""
+        return f"dh sequence doesn't contain your override {name!r}{hint}"
+
+    def _run_dh_seq_cmds(
+        self, build: Build, seq_cmds: list[str], skipped: list[str] | None = None, report: bool = True
+    ) -> None:
+        """
+        one line of dh output.
+        helpers with nothing to do are collected in `skipped`, and printed if `report` is set.
+        """
         if not self._initialized:
             raise Exception("dh.Preset().initialize() was never called")
 
+        debian_files = self._debian_files(build)
+
+        skipped = [] if skipped is None else skipped
         for seq_cmd in seq_cmds:
             cmd = shlex.split(seq_cmd)
             seq_id = cmd[0]
 
             if override_fun := self._overrides.get(seq_id):
                 override_fun(build)
+                continue
+
+            # package files without package name (debian/install) belong to the first package of
+            # debian/control, even when it isn't built this time
+            main_name = build.main_package.name
+            pkg_names = [
+                pkg.name
+                for pkg in build.binary_packages
+                if not _is_noop(build, cmd, pkg.name, pkg.name == main_name, debian_files)
+            ]
+            if not pkg_names:
+                skipped.append(seq_id)
+                continue
+
+            if self._parallel_packages and _runs_per_package(cmd) and len(build.binary_packages) > 1:
+                self._run_per_package(build, cmd, pkg_names)
             else:
                 build.cmd(cmd, cwd=build.source_dir)
+            # the helper may have changed the install trees
+            build.invalidate_file_index()
+
+        if report and skipped:
+            print(f"debmagic: skipped {len(skipped)} dh helpers with nothing to do: {' '.join(skipped)}")
+            skipped.clear()
 
-    def _populate_stages(self, dh_args: list[str], base_dir: Path) -> None:
+    def _debian_files(self, build: Build) -> list[str]:
+        """
+        the entries of debian/, for package files like debian/<package>.info.
+        only listed again when a file was added or removed since.
+        """
+        debian_dir = build.source_dir / "debian"
+        try:
+            mtime = debian_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if self._debian_listing is None or self._debian_listing[0] != mtime:
+            self._debian_listing = (mtime, os.listdir(debian_dir))
+        return self._debian_listing[1]
+
+    def _run_per_package(self, build: Build, cmd: list[str], pkg_names: list[str]) -> None:
+        """
+        call the helper for each of the binary packages concurrently, with per-package output logs.
+        """
+        args = [arg for arg in cmd if arg not in _ALL_PACKAGES_ARGS]
+        log_dir = build.state_dir / "dh-logs"
+
+        # every package's helper runs to the end, to report all failures at once
+        batch = build.batch(fail_fast=False, echo=False)
+        for pkg_name in pkg_names:
+            batch.submit([*args, f"-p{pkg_name}"], cwd=build.source_dir, label=pkg_name)
+        batch.wait(check=False)
+
+        if build.dry_run:
+            return
+
+        log_dir.mkdir(parents=True, exist_ok=True)
+        failed: list[str] = []
+        for result in batch.results:
+            with (log_dir / f"{result.label}.log").open("a") as log:
+                log.write(f"$ {_command_str(result.cmd)}\n{result.output}")
+            if not result.ok:
+                failed.append(result.label)
+        if failed:
+            logs = "\n".join(f"  {log_dir / pkg_name}.log" for pkg_name in failed)
+            raise BuildError(f"{cmd[0]} failed for {', '.join(failed)}, see:\n{logs}")
+
+    def _populate_stages(self, dh_args: list[str], base_dir: Path, executor: Executor) -> None:
         """
         split up the dh sequences into debmagic's stages.
         this involves guessing, since dh only has "build" (=configure, build, test)
@@ -132,10 +335,10 @@ class Preset(PresetBase):
         if you have a better idea how to map dh sequences to debmagic's stages, please tell us.
         """
         ## clean, which is 1:1 fortunately
-        self._clean_seq = self._get_dh_seq(base_dir, dh_args, DHSequenceID.clean)
+        self._clean_seq = self._get_dh_seq(base_dir, dh_args, DHSequenceID.clean, executor)
 
         ## untangle "build" to configure & build & test
-        build_seq_raw = self._get_dh_seq(base_dir, dh_args, DHSequenceID.build)
+        build_seq_raw = self._get_dh_seq(base_dir, dh_args, DHSequenceID.build, executor)
         if build_seq_raw[-1] != "create-stamp debian/debhelper-build-stamp":
             raise RuntimeError("build stamp creation line missing from dh build sequence")
         build_seq = build_seq_raw[:-1]  # remove that stamp line
@@ -154,9 +357,9 @@ class Preset(PresetBase):
         self._test_seq = build_seq[auto_test_idx:]
 
         ## untangle "binary" to install & package
-        install_seq = self._get_dh_seq(base_dir, dh_args, DHSequenceID.install)
+        install_seq = self._get_dh_seq(base_dir, dh_args, DHSequenceID.install, executor)
         self._install_seq = list_strip_head(install_seq, build_seq_raw)
-        binary_seq = self._get_dh_seq(base_dir, dh_args, DHSequenceID.binary)
+        binary_seq = self._get_dh_seq(base_dir, dh_args, DHSequenceID.binary, executor)
         self._package_seq = list_strip_head(binary_seq, install_seq)
 
         # register all sequence items for validity checks
@@ -173,8 +376,84 @@ class Preset(PresetBase):
                 cmd_id = cmd[0]
                 self._seq_ids.add(cmd_id)
 
-    def _get_dh_seq(self, base_dir: Path, dh_args: list[str], seq: DHSequenceID) -> list[str]:
+    def _get_dh_seq(self, base_dir: Path, dh_args: list[str], seq: DHSequenceID, executor: Executor) -> list[str]:
         cmd = ["dh", str(seq), "--no-act", *dh_args]
-        proc = run_cmd(cmd, cwd=base_dir, capture_output=True, text=True)
+        proc = run_cmd(cmd, cwd=base_dir, capture_output=True, text=True, executor=executor)
         lines = proc.stdout.splitlines()
         return [line.strip() for line in lines]
+
+
+def _runs_per_package(cmd: list[str]) -> bool:
+    """
+    >>> _runs_per_package(["dh_strip", "-a", "-O--buildsystem=cmake"])
+    True
+    >>> _runs_per_package(["dh_strip", "-plibfoo1"])
+    False
+    """
+    if cmd[0] not in PER_PACKAGE_HELPERS:
+        return False
+    return not any(arg.startswith(_PACKAGE_SELECTION_PREFIXES) for arg in cmd[1:])
+
+
+@functools.cache
+def helper_promise(helper: str) -> list[str] | None:
+    """
+    the conditions of a helper's `PROMISE: DH NOOP WITHOUT` hint, None if it makes no promise.
+    """
+    path = shutil.which(helper)
+    if path is None:
+        return None
+    try:
+        with open(path, errors="replace") as fd:
+            match = _PROMISE.search(fd.read())
+    except OSError:
+        return None
+    return match.group(1).split() if match else None
+
+
+def _is_noop(build: Build, cmd: list[str], pkg_name: str, main_package: bool, debian_files: list[str]) -> bool:
+    """
+    whether the helper promises to do nothing for this package, like dh's `can_skip`
+    """
+    conditions = helper_promise(cmd[0])
+    if conditions is None:
+        return False
+
+    for condition in conditions:
+        match = _PROMISE_CONDITION.match(condition)
+        if match is None:
+            return False
+        kind, arg = match.groups()
+        match kind:
+            case "pkgfile" | "pkgfile-logged":
+                if _has_pkgfile(debian_files, pkg_name, arg, main_package):
+                    return False
+            case "tmp":
+                if (build.install_dirs[pkg_name] / arg).exists():
+                    return False
+            case "cli-options":
+                # only dh's own package selection and "-O" options are no reason to run
+                if any(opt not in _ALL_PACKAGES_ARGS and not opt.startswith("-O") for opt in cmd[1:]):
+                    return False
+            case _:
+                # like buildsystem(...), which we can't evaluate
+                return False
+    return True
+
+
+def _has_pkgfile(debian_files: list[str], pkg_name: str, name: str, main_package: bool) -> bool:
+    """
+    debian/<package>.<name>, with optional .<arch> or .<os> suffix.
+    the main (first) package also uses debian/<name>.
+
+    >>> _has_pkgfile(["foo.info", "control"], "foo", "info", False)
+    True
+    >>> _has_pkgfile(["cron.daily"], "foo", "cron.daily", True)
+    True
+    >>> _has_pkgfile(["foo-doc.info"], "foo", "info", True)
+    False
+    """
+    prefixes = [f"{pkg_name}.{name}"]
+    if main_package:
+        prefixes.append(name)
+    return any(file == prefix or file.startswith(f"{prefix}.") for file in debian_files for prefix in prefixes)
@@ -0,0 +1,384 @@
+"""
+install module
+
+native replacement for `dh_install`.
+multi-package builds install upstream's files into the staging dir (`debian/tmp`),
+which is then walked once and indexed.
+the patterns of each `debian/<package>.install` are matched against that index,
+and the matches are hardlinked (or moved) into the package install dirs.
+files no package claimed are reported, except those listed in `debian/not-installed`.
+
+usage as dh override:
+
+```python
+from debmagic.v0 import dh, install
+
+dhp = dh.Preset()
+pkg = package(preset=dhp)
+dhp.override(install.dh_install)
+```
+"""
+
+import bisect
+import difflib
+import glob
+import os
+import re
+import shutil
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Self
+
+from debmagic.common.utils import run_cmd
+
+from .._build import Build, BuildError
+
+_GLOB_CHARS = re.compile(r"[*?\[{]")
+_VARIABLE = re.compile(r"\$\{([A-Za-z0-9_:]+)\}")
+# debhelper's variables for characters which can't be written directly
+_CHAR_VARIABLES = {"Space": " ", "Tab": "\t", "Newline": "\n", "Dollar": "$"}
+
+
+def destdir(build: Build) -> Path:
+    """
+    where build systems should install to:
+    the package's install dir if the source has only one binary package, the staging dir otherwise.
+    packages not built this time (e.g. `binary-arch`) count as well, their files are just not distributed.
+    """
+    if len(build.package.source_package.binary_packages) == 1:
+        return build.install_base_dir / build.main_package.name
+    return build.staging_dir
+
+
+def dh_install(build: Build) -> None:
+    distribute(build)
+
+
+def distribute(build: Build, move: bool = False, fail_missing: bool = False) -> list[str]:
+    """
+    distribute the staging dir into the binary packages by their `debian/<package>.install` files.
+    `move`: rename files instead of hardlinking them, emptying the staging dir.
+    `fail_missing`: raise an error if files in the staging dir were not installed in any package.
+    returns the unclaimed paths.
+    """
+    index = TreeIndex.scan(build.staging_dir)
+
+    claims: list[_Claim] = []
+    errors: list[str] = []
+    for pkg_name, install_dir in build.install_dirs.items():
+        for patterns, dest in _read_install_file(build, pkg_name):
+            for pattern in patterns:
+                matches = index.match(pattern)
+                if matches:
+                    for match in matches:
+                        target = Path(dest, Path(match).name) if dest else Path(match)
+                        claims.append(_Claim(pkg_name, build.staging_dir / match, install_dir / target, match))
+                    continue
+
+                # files from the source tree, like `debian/foo.conf etc/`
+                source_matches = sorted(glob.glob(pattern, root_dir=build.source_dir))
+                if not source_matches:
+                    errors.append(f"{pkg_name}: {pattern!r} matches nothing in {build.staging_dir} or the source tree")
+                for match in source_matches:
+                    target = Path(dest or Path(match).parent, Path(match).name)
+                    claims.append(_Claim(pkg_name, build.source_dir / match, install_dir / target, None))
+
+    if errors:
+        raise BuildError("missing files for dh_install:\n" + "\n".join(errors))
+
+    print(f"debmagic: installing {len(claims)} paths from {build.staging_dir} into the packages")
+    if not build.dry_run:
+        # paths claimed by several packages can't be moved
+        claim_counts = Counter(claim.staging_path for claim in claims)
+        linked_inodes: set[tuple[int, int]] = set()
+        for claim in claims:
+            move_claim = move and claim.staging_path is not None and claim_counts[claim.staging_path] == 1
+            _install_tree(claim.source, claim.target, move_claim, linked_inodes)
+        build.invalidate_file_index()
+
+    claimed = [claim.staging_path for claim in claims if claim.staging_path is not None]
+    unclaimed = index.unclaimed(claimed, _not_installed(build))
+    if unclaimed:
+        print(f"debmagic: {len(unclaimed)} files in {build.staging_dir} are not installed in any package:")
+        for path in unclaimed:
+            print(f"debmagic:   {path}")
+        if fail_missing:
+            raise BuildError(f"{len(unclaimed)} files were not installed in any package")
+    return unclaimed
+
+
+@dataclass
+class _Claim:
+    package: str
+    source: Path
+    target: Path
+    #: path relative to the staging dir, None for files from the source tree
+    staging_path: str | None
+
+
+@dataclass
+class TreeIndex:
+    """
+    all paths below a directory, sorted, to match install patterns without walking the tree again.
+    """
+
+    paths: list[str] = field(default_factory=list)
+    dirs: set[str] = field(default_factory=set)
+
+    @classmethod
+    def scan(cls, root: Path) -> Self:
+        index = cls()
+        for dirpath, dirnames, filenames in os.walk(root):
+            rel_dir = os.path.relpath(dirpath, root)
+            prefix = "" if rel_dir == "." else f"{rel_dir}/"
+            for name in dirnames:
+                path = prefix + name
+                index.paths.append(path)
+                # symlinks to directories are entries, not subtrees
+                if not os.path.islink(os.path.join(dirpath, name)):
+                    index.dirs.add(path)
+            index.paths.extend(prefix + name for name in filenames)
+        index.paths.sort()
+        return index
+
+    def _below(self, directory: str) -> list[str]:
+        """all paths below the directory ("" for the root)"""
+        if not directory:
+            return self.paths
+        start = bisect.bisect_left(self.paths, f"{directory}/")
+        end = bisect.bisect_left(self.paths, f"{directory}0")  # "0" sorts right after "/"
+        return self.paths[start:end]
+
+    def match(self, pattern: str) -> list[str]:
+        """
+        paths matching the glob pattern. `*`, `?` and `[...]` don't match `/`, `{a,b}` alternatives are expanded.
+        """
+        matches: list[str] = []
+        for expanded in _expand_braces(pattern.strip("/")):
+            if not _GLOB_CHARS.search(expanded):
+                if expanded in self.dirs or self._contains(expanded):
+                    matches.append(expanded)
+                continue
+
+            literal_dir = _GLOB_CHARS.split(expanded, maxsplit=1)[0].rpartition("/")[0]
+            regex = _glob_regex(expanded)
+            matches.extend(path for path in self._below(literal_dir) if regex.fullmatch(path))
+        return list(dict.fromkeys(matches))
+
+    def _contains(self, path: str) -> bool:
+        idx = bisect.bisect_left(self.paths, path)
+        return idx < len(self.paths) and self.paths[idx] == path
+
+    def unclaimed(self, claimed: list[str], ignore_patterns: list[str]) -> list[str]:
+        """
+        files and symlinks not below a claimed or ignored path.
+        """
+        covered = set(claimed)
+        for pattern in ignore_patterns:
+            covered.update(self.match(pattern))
+
+        unclaimed: list[str] = []
+        for path in self.paths:
+            if path in self.dirs:
+                continue
+            parts = path.split("/")
+            if not any("/".join(parts[:idx]) in covered for idx in range(1, len(parts) + 1)):
+                unclaimed.append(path)
+        return unclaimed
+
+
+def _expand_braces(pattern: str) -> list[str]:
+    """
+    >>> _expand_braces("usr/lib/{libfoo,libbar}.so.*")
+    ['usr/lib/libfoo.so.*', 'usr/lib/libbar.so.*']
+    """
+    match = re.search(r"\{([^{}]*)\}", pattern)
+    if not match:
+        return [pattern]
+    expanded: list[str] = []
+    for alternative in match.group(1).split(","):
+        expanded.extend(_expand_braces(pattern[: match.start()] + alternative + pattern[match.end() :]))
+    return expanded
+
+
+def _glob_regex(pattern: str) -> re.Pattern[str]:
+    """
+    >>> bool(_glob_regex("usr/lib/*.so").fullmatch("usr/lib/sub/x.so"))
+    False
+    """
+    regex = ""
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[" and (end := pattern.find("]", idx + 2)) != -1:
+            content = pattern[idx + 1 : end]
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            regex += f"[{content}]"
+            idx = end
+        else:
+            regex += re.escape(char)
+        idx += 1
+    return re.compile(regex)
+
+
+def _pkgfile(build: Build, pkg_name: str, name: str) -> Path | None:
+    """
+    debian/<package>.<name>, or debian/<name> for the main package
+    """
+    debian_dir = build.source_dir / "debian"
+    candidates = [debian_dir / f"{pkg_name}.{name}"]
+    if pkg_name == build.main_package.name:
+        candidates.append(debian_dir / name)
+    return next((path for path in candidates if path.is_file()), None)
+
+
+def _read_install_file(build: Build, pkg_name: str) -> list[tuple[list[str], str | None]]:
+    """
+    the (patterns, destination dir) lines of a package's install file
+    """
+    install_file = _pkgfile(build, pkg_name, "install")
+    if install_file is None:
+        return []
+
+    if os.access(install_file, os.X_OK):
+        # dh-exec and similar: the output of the executable is the actual content.
+        # run even in dry-runs, the plan needs the files it lists.
+        content = run_cmd(
+            [install_file], capture_output=True, text=True, cwd=build.source_dir, executor=build.executor
+        ).stdout
+    else:
+        content = install_file.read_text()
+
+    entries: list[tuple[list[str], str | None]] = []
+    for raw_line in content.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+        words = [_substitute(build, word) for word in line.split()]
+        if len(words) == 1:
+            entries.append((words, None))
+        else:
+            entries.append((words[:-1], words[-1].strip("/")))
+    return entries
+
+
+def check_install_files(build: Build) -> list[str]:
+    """
+    problems of the `debian/*.install` files found without installing anything:
+    files of unknown binary packages, unknown variables and unbalanced brackets in patterns.
+    executable install files are not run.
+    only meaningful when the files are used by `distribute`, not by debhelper's `dh_install`.
+    """
+    debian_dir = build.source_dir / "debian"
+    if not debian_dir.is_dir():
+        return []
+
+    known = [pkg.name for pkg in build.package.source_package.binary_packages]
+    problems: list[str] = []
+    for install_file in sorted(debian_dir.glob("*install")):
+        name = install_file.name
+        if name == "install":
+            pkg_name = build.main_package.name
+        elif name.endswith(".install"):
+            pkg_name = name.removesuffix(".install")
+            if pkg_name not in known:
+                close = difflib.get_close_matches(pkg_name, known, n=1)
+                hint = f", did you mean debian/{close[0]}.install?" if close else ""
+                problems.append(f"debian/{name} belongs to no binary package{hint}")
+                continue
+        else:
+            continue
+
+        # packages not built this time, or generating their content
+        if pkg_name not in build.install_dirs or os.access(install_file, os.X_OK):
+            continue
+
+        for line_no, raw_line in enumerate(install_file.read_text().splitlines(), start=1):
+            line = raw_line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                words = [_substitute(build, word) for word in line.split()]
+            except BuildError as exc:
+                problems.append(f"debian/{name}:{line_no}: {exc}")
+                continue
+            for pattern in words if len(words) == 1 else words[:-1]:
+                if pattern.count("{") != pattern.count("}") or re.search(r"\[(?![^\]]+\])", pattern):
+                    problems.append(f"debian/{name}:{line_no}: unbalanced brackets in pattern {pattern!r}")
+            if len(words) > 1 and _GLOB_CHARS.search(words[-1]):
+                problems.append(f"debian/{name}:{line_no}: destination {words[-1]!r} can't be a pattern")
+    return problems
+
+
+def _substitute(build: Build, word: str) -> str:
+    """
+    replace the variables in a word of a package file, like debhelper does:
+    `${DEB_HOST_MULTIARCH}` and the other build variables, `${env:NAME}` (empty if unset)
+    and `${Space}`, `${Tab}`, `${Newline}` and `${Dollar}`.
+    """
+
+    def replace(match: re.Match[str]) -> str:
+        name = match.group(1)
+        if name in _CHAR_VARIABLES:
+            return _CHAR_VARIABLES[name]
+        if name.startswith("env:"):
+            return os.environ.get(name.removeprefix("env:"), "")
+        if name in build.package.build_env:
+            return build.package.build_env[name]
+        raise BuildError(f"unknown variable ${{{name}}} in install file")
+
+    return _VARIABLE.sub(replace, word)
+
+
+def _not_installed(build: Build) -> list[str]:
+    not_installed = build.source_dir / "debian" / "not-installed"
+    if not not_installed.is_file():
+        return []
+    patterns: list[str] = []
+    for raw_line in not_installed.read_text().splitlines():
+        line = raw_line.strip()
+        if line and not line.startswith("#"):
+            patterns.extend(_substitute(build, word) for word in line.split())
+    return patterns
+
+
+def _install_tree(source: Path, target: Path, move: bool, linked_inodes: set[tuple[int, int]]) -> None:
+    """
+    install a file, symlink or directory tree.
+    files are hardlinked, or copied if they were already linked into another package or are on another device.
+    """
+    if source.is_dir() and not source.is_symlink():
+        target.mkdir(parents=True, exist_ok=True)
+        shutil.copystat(source, target)
+        for entry in os.scandir(source):
+            _install_tree(Path(entry.path), target / entry.name, move, linked_inodes)
+        return
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.is_symlink() or target.exists():
+        target.unlink()
+
+    if move:
+        source.rename(target)
+        return
+
+    if source.is_symlink():
+        target.symlink_to(os.readlink(source))
+        return
+
+    st = source.stat()
+    inode = (st.st_dev, st.st_ino)
+    if inode not in linked_inodes:
+        try:
+            os.link(source, target)
+            linked_inodes.add(inode)
+            return
+        except OSError:
+            pass
+    shutil.copy2(source, target)
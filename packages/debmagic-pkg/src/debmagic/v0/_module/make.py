@@ -0,0 +1,148 @@
+"""
+Make module
+
+shared functions for makefile based build systems.
+
+functions included:
+- database(): the targets and variables of a makefile, read by one `make -pRrq` call
+- first_target(): the first of some candidate targets the makefile has
+
+the database is cached until the makefile changes,
+so asking for targets repeatedly doesn't spawn make again.
+"""
+
+import re
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Self
+
+from debmagic.common.executor import Executor
+from debmagic.common.utils import run_cmd
+
+from .._build import Build
+
+MAKEFILE_NAMES = ("GNUmakefile", "makefile", "Makefile")
+
+
+@dataclass
+class MakeDatabase:
+    """
+    the parsed data base of a makefile, as printed by `make --print-data-base`.
+    """
+
+    #: all explicit targets
+    targets: set[str] = field(default_factory=set)
+    #: targets declared as .PHONY
+    phony: set[str] = field(default_factory=set)
+    #: the target make builds without arguments
+    default_goal: str | None = None
+    #: variable definitions, recursively expanded ones are stored unexpanded
+    variables: dict[str, str] = field(default_factory=dict)
+
+    def has_target(self, target: str) -> bool:
+        return target in self.targets
+
+    @classmethod
+    def parse(cls, data: str) -> Self:
+        db = cls()
+        section: str | None = None
+        not_a_target = False
+        in_define = False
+
+        for line in data.splitlines():
+            # multi-line variable definitions
+            if in_define:
+                in_define = line != "endef"
+                continue
+            if line.startswith("define "):
+                in_define = True
+                continue
+
+            if line.startswith("# "):
+                match line:
+                    case "# Variables":
+                        section = "variables"
+                    case "# Files":
+                        section = "files"
+                    case "# Not a target:":
+                        not_a_target = True
+                    case _ if line.startswith(("# variable set hash-table", "# files hash-table")):
+                        section = None
+                    case "# Implicit Rules" | "# Pattern-specific Variable Values" | "# Directories":
+                        section = None
+                continue
+
+            if not line or line.startswith(("\t", "#")):
+                continue
+
+            if section == "variables":
+                if match := re.match(r"^([^\s:#=]+)\s*(:{0,3}=|\+=|\?=|!=)\s?(.*)$", line):
+                    name, _, value = match.groups()
+                    db.variables[name] = value
+
+            elif section == "files":
+                if match := re.match(r"^([^\s:#=][^:=]*?)::?(?!=)(.*)$", line):
+                    target, prerequisites = match.groups()
+                    if not_a_target:
+                        not_a_target = False
+                        continue
+                    if target == ".PHONY":
+                        db.phony.update(prerequisites.split())
+                    elif not re.match(r"^\.[A-Z_]+$", target):  # no special targets like .SUFFIXES
+                        db.targets.add(target)
+
+        db.default_goal = db.variables.get(".DEFAULT_GOAL") or None
+        return db
+
+
+# per executor: a recorded or replayed build must not see the data base of another.
+# dropped with the executor, and only the data base of each makefile's current mtime is kept.
+_database_cache: weakref.WeakKeyDictionary[Executor, dict[Path, tuple[int, MakeDatabase]]] = weakref.WeakKeyDictionary()
+
+
+def database(build: Build, cwd: Path | None = None) -> MakeDatabase:
+    """
+    read the make data base of the makefile in cwd (default: source dir).
+    """
+    cwd = cwd or build.source_dir
+    makefile = find_makefile(cwd)
+    if makefile is None:
+        return MakeDatabase()
+
+    mtime = makefile.stat().st_mtime_ns
+    databases = _database_cache.setdefault(build.executor, {})
+    if (cached := databases.get(makefile)) and cached[0] == mtime:
+        return cached[1]
+
+    # print the data base without running anything, without builtin rules and variables.
+    # the .DEFAULT goal is never built, so make doesn't check the default goal's prerequisites.
+    proc = run_cmd(
+        ["make", "-pRrq", ".DEFAULT"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=False,
+        executor=build.executor,
+    )
+    db = MakeDatabase.parse(proc.stdout)
+    databases[makefile] = (mtime, db)
+    return db
+
+
+def first_target(build: Build, candidates: Iterable[str], cwd: Path | None = None) -> str | None:
+    """
+    return the first candidate target the makefile provides.
+    """
+    db = database(build, cwd)
+    for candidate in candidates:
+        if db.has_target(candidate):
+            return candidate
+    return None
+
+
+def find_makefile(path: Path) -> Path | None:
+    for makefile in MAKEFILE_NAMES:
+        if (path / makefile).is_file():
+            return path / makefile
+    return None
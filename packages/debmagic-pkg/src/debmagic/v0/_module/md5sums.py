@@ -0,0 +1,104 @@
+"""
+md5sums module
+
+native replacement for `dh_md5sums`.
+walks each package install dir once and hashes all files concurrently.
+the resulting `DEBIAN/md5sums` is identical to what dh_md5sums generates.
+
+usage as dh override:
+
+```python
+from debmagic.v0 import dh, md5sums
+
+dhp = dh.Preset()
+pkg = package(preset=dhp)
+dhp.override(md5sums.dh_md5sums)
+```
+"""
+
+import os
+from pathlib import Path
+
+from debmagic.common.hashing import hash_files
+
+from .._build import Build
+from .._file_index import FileKind
+
+
+def dh_md5sums(build: Build) -> None:
+    generate(build)
+
+
+def generate(build: Build, include_conffiles: bool = False) -> None:
+    """
+    write `DEBIAN/md5sums` for each binary package (and its debug symbol package).
+    """
+    package_files: dict[Path, list[str]] = {}
+    for pkg_name, install_dir in build.install_dirs.items():
+        # dh_strip's debug symbol package tree
+        dbgsym_dir = build.install_base_dir / ".debhelper" / pkg_name / "dbgsym-root"
+        for package_dir in (install_dir, dbgsym_dir):
+            if package_dir.is_dir():
+                package_files[package_dir] = _package_files(build, package_dir, include_conffiles)
+
+    digests = hash_files(
+        (package_dir / file for package_dir, files in package_files.items() for file in files),
+        workers=build.parallel,
+    )
+
+    for package_dir, files in package_files.items():
+        md5sums_file = package_dir / "DEBIAN" / "md5sums"
+        print(f"debmagic: writing {md5sums_file} with {len(files)} entries")
+        if build.dry_run:
+            continue
+
+        if not files:
+            # like dh_md5sums, don't create an empty file
+            md5sums_file.unlink(missing_ok=True)
+            continue
+
+        md5sums_file.parent.mkdir(parents=True, exist_ok=True)
+        with md5sums_file.open("wb") as fd:
+            for file in files:
+                fd.write(md5sum_line(digests[package_dir / file], file))
+        md5sums_file.chmod(0o644)
+
+
+def md5sum_line(digest: str, file: str) -> bytes:
+    """
+    format like `md5sum` does, escaping special file names.
+    """
+    name = os.fsencode(file)
+    if b"\\" in name or b"\n" in name or b"\r" in name:
+        name = name.replace(b"\\", b"\\\\").replace(b"\n", b"\\n").replace(b"\r", b"\\r")
+        return b"\\" + digest.encode() + b"  " + name + b"\n"
+    return digest.encode() + b"  " + name + b"\n"
+
+
+def _package_files(build: Build, package_dir: Path, include_conffiles: bool) -> list[str]:
+    """
+    all regular files of the package, relative to its root, sorted like `LC_ALL=C sort`.
+    """
+    excluded: set[str] = set()
+    if not include_conffiles:
+        excluded = _conffiles(package_dir)
+
+    # package metadata (DEBIAN/) is not part of the md5sums, and not in the index
+    return [
+        info.path
+        for info in build.file_index().files(package_dir)
+        if info.kind != FileKind.symlink and info.path not in excluded
+    ]
+
+
+def _conffiles(package_dir: Path) -> set[str]:
+    conffiles_file = package_dir / "DEBIAN" / "conffiles"
+    if not conffiles_file.is_file():
+        return set()
+
+    conffiles: set[str] = set()
+    for line in conffiles_file.read_text().splitlines():
+        # entries with flags like "remove-on-upgrade /etc/foo" are not shipped
+        if line.startswith("/"):
+            conffiles.add(line.strip().removeprefix("/"))
+    return conffiles
@@ -0,0 +1,164 @@
+"""
+Meson module
+
+configures out of tree, meson always uses the ninja backend on linux.
+
+preset tries to execute:
+- meson setup
+- ninja
+- meson test
+- ninja install
+
+functions included:
+- clean(): removes the build directory, the preset only does so for a full clean (`rules clean`)
+- configure(): to call `meson setup <args> <build_dir>`
+- build(): calls `ninja -j<jobs>`
+- test(): calls `meson test --num-processes <jobs>`
+- install(): calls `ninja install` with `DESTDIR=<dir>`
+
+the build directory is kept between runs, so ninja only rebuilds what changed.
+an existing build directory is reconfigured only if the setup arguments changed,
+ninja re-runs meson by itself when any meson.build changed.
+"""
+
+import shlex
+import shutil
+from pathlib import Path
+
+from .._build import Build, BuildError
+from .._preset import Preset as PresetBase
+from .._stamp import Stamp, fingerprint
+from . import install as install_module
+from . import ninja
+
+
+class Preset(PresetBase):
+    def required_tools(self, build: Build) -> list[str]:
+        if not _has_meson_build(build.source_dir):
+            return []
+        return ["meson", "ninja"]
+
+    def preflight(self, build: Build) -> list[str]:
+        if not _has_meson_build(build.source_dir) or install_module.destdir(build) != build.staging_dir:
+            return []
+        return install_module.check_install_files(build)
+
+    def clean(self, build: Build) -> None:
+        # the clean stage starting each build keeps the build directory for incremental rebuilds
+        if not _has_meson_build(build.source_dir) or not build.full_clean:
+            return
+        clean(build)
+
+    def configure(self, build: Build, args: list[str] | None = None) -> None:
+        if not _has_meson_build(build.source_dir):
+            return
+        configure(build, args or [])
+
+    def build(self, build: Build, args: list[str] | None = None) -> None:
+        if not _has_meson_build(build.source_dir):
+            return
+        _build(build, args or [])
+
+    def test(self, build: Build) -> None:
+        if not _has_meson_build(build.source_dir):
+            return
+        test(build)
+
+    def install(self, build: Build) -> None:
+        if not _has_meson_build(build.source_dir):
+            return
+        install(build)
+
+
+def clean(build: Build, build_dir: Path | None = None) -> None:
+    build_dir = build_dir or build.build_dir
+    if build_dir.is_dir():
+        print(f"debmagic: removing meson build directory {build_dir}")
+        if not build.dry_run:
+            shutil.rmtree(build_dir)
+
+
+def configure(build: Build, args: list[str] | str | None = None, build_dir: Path | None = None) -> None:
+    if not _has_meson_build(build.source_dir):
+        raise BuildError("no 'meson.build' file in build root")
+
+    build_dir = build_dir or build.build_dir
+
+    match args:
+        case None:
+            custom_args = []
+        case str():
+            custom_args = shlex.split(args)
+        case list():
+            custom_args = args
+
+    # as debhelper's meson buildsystem does
+    default_args = [
+        "--wrap-mode=nodownload",
+        "--buildtype=plain",
+        f"--prefix={build.prefix}",
+        "--sysconfdir=/etc",
+        "--localstatedir=/var",
+        "--backend=ninja",
+    ]
+
+    if multiarch := build.package.build_env["DEB_HOST_MULTIARCH"]:
+        default_args.append(f"--libdir=lib/{multiarch}")
+
+    # meson would silently build for the build architecture without a cross file
+    if build.architecture_target != build.architecture_host and not any(
+        arg.startswith("--cross-file") for arg in custom_args
+    ):
+        raise BuildError(
+            f"cross-building for {build.architecture_host} needs a meson cross file, pass `--cross-file=<file>`"
+        )
+
+    setup_args = [*default_args, *custom_args]
+
+    stamp = Stamp(build_dir / ".debmagic-configure")
+    digest = fingerprint(*setup_args)
+    if ninja.has_build_file(build_dir):
+        if stamp.matches(digest):
+            print(f"debmagic: meson build directory {build_dir} is already configured")
+            return
+        # keep the build directory and its objects, just apply the new options
+        setup_args.append("--reconfigure")
+
+    build.cmd(["meson", "setup", *setup_args, build_dir], cwd=build.source_dir)
+    if not build.dry_run:
+        stamp.write(digest)
+
+
+def build(build: Build, args: list[str] = [], build_dir: Path | None = None) -> None:
+    ninja.build(build, build_dir, targets=args)
+
+
+# otherwise the preset function argument name has to be adjusted
+# which is an invalid method override then
+_build = build
+
+
+def test(build: Build, args: list[str] | None = None, build_dir: Path | None = None) -> None:
+    build_dir = build_dir or build.build_dir
+    build.cmd(
+        [
+            "meson",
+            "test",
+            "-C",
+            build_dir,
+            "--no-rebuild",
+            "--print-errorlogs",
+            "--num-processes",
+            str(build.parallel),
+            *(args or []),
+        ],
+        cwd=build.source_dir,
+    )
+
+
+def install(build: Build, build_dir: Path | None = None, destdir: Path | None = None) -> None:
+    ninja.install(build, build_dir, destdir)
+
+
+def _has_meson_build(path: Path) -> bool:
+    return (path / "meson.build").is_file()
@@ -0,0 +1,43 @@
+"""
+Ninja module
+
+shared functions for build systems generating ninja files (cmake, meson).
+
+functions included:
+- build(): calls `ninja -C <build_dir> -j<jobs>`
+- install(): calls `ninja -C <build_dir> install` with `DESTDIR` set to the only binary package,
+  or to the staging dir distributed by `install`
+"""
+
+import os
+from pathlib import Path
+
+from .._build import Build, BuildError
+from . import install as install_module
+
+
+def build(build: Build, build_dir: Path | None = None, targets: list[str] | None = None) -> None:
+    build_dir = build_dir or build.build_dir
+    if not has_build_file(build_dir):
+        raise BuildError(f"no 'build.ninja' in {build_dir} - was the build configured?")
+
+    build.cmd(["ninja", "-C", build_dir, f"-j{build.parallel}", *(targets or [])], cwd=build.source_dir)
+
+
+def install(build: Build, build_dir: Path | None = None, destdir: Path | None = None) -> None:
+    """
+    install into `destdir`, by default into the only binary package, or into the staging dir,
+    which is then distributed into the binary packages by their `debian/<package>.install` files.
+    """
+    build_dir = build_dir or build.build_dir
+    target = destdir or install_module.destdir(build)
+
+    env = os.environ.copy()
+    env["DESTDIR"] = str(target)
+    build.cmd(["ninja", "-C", build_dir, "install"], cwd=build.source_dir, env=env)
+    if destdir is None and target == build.staging_dir:
+        install_module.distribute(build)
+
+
+def has_build_file(build_dir: Path) -> bool:
+    return (build_dir / "build.ninja").is_file()
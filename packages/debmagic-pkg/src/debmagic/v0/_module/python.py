@@ -0,0 +1,347 @@
+"""
+Python module
+
+builds PEP 517 wheels and installs them for every supported python3 interpreter.
+
+preset tries to execute, for each interpreter concurrently:
+- python3.X -m build --wheel
+- python3.X -m pytest
+- install the wheel into the debian dist-packages scheme
+
+functions included:
+- clean(): removes the per-interpreter build directories
+- interpreters(build): the supported python3.X interpreters, from `py3versions --supported`
+- build(): builds the wheels and stages them for tests, byte-compiling with `-j<jobs>`
+- test(): runs pytest against each staged build
+- install(): installs the wheels into the only binary package, or the staging dir distributed by `install`
+
+the per-interpreter work lives in `.pybuild/cpython3_<version>/`.
+if the first built wheel is pure python (`py3-none-any`), it is reused for all interpreters
+instead of building the same wheel again.
+otherwise the wheels for the remaining interpreters are built in parallel,
+each from its own copy of the source tree in `.pybuild/cpython3_<version>/src`,
+since build backends write `build/` and `*.egg-info` into the tree they build.
+
+with `Preset(isolation=True)`, wheels are built in a virtual environment containing
+the `build-system.requires` of `pyproject.toml`.
+this environment is cached per interpreter and requirements, so it is only created once.
+"""
+
+import fcntl
+import functools
+import os
+import shutil
+import sys
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from debmagic.common.executor import Executor
+from debmagic.common.utils import run_cmd
+
+from .._build import Build, BuildError
+from .._cache import cache_dir
+from .._preset import Preset as PresetBase
+from .._stamp import fingerprint
+from . import install as install_module
+
+# not copied for the builds of the other interpreters
+_SOURCE_COPY_IGNORE = {".git", ".pc", ".pybuild", "debian"}
+
+# installs a wheel into the debian python scheme (/usr/lib/python3/dist-packages).
+# executed by the target interpreter, so its sysconfig is used.
+# the wheels of all interpreters share that dir: the pure modules and scripts of the first one
+# are overwritten by the same files, its extension modules are kept since their names differ,
+# and the RECORD files are merged.
+_INSTALL_WHEEL_SCRIPT = """
+import os
+import sys
+import sysconfig
+
+from installer import install
+from installer.destinations import SchemeDictionaryDestination
+from installer.sources import WheelFile
+
+wheel, destdir = sys.argv[1:3]
+scheme = "deb_system" if "deb_system" in sysconfig.get_scheme_names() else sysconfig.get_default_scheme()
+paths = sysconfig.get_paths(scheme, vars={"base": "/usr", "platbase": "/usr"})
+destination = SchemeDictionaryDestination(
+    {
+        "purelib": paths["purelib"],
+        "platlib": paths["platlib"],
+        "headers": paths["include"],
+        "scripts": paths["scripts"],
+        "data": paths["data"],
+    },
+    interpreter="/usr/bin/python3",
+    script_kind="posix",
+    destdir=destdir,
+    overwrite_existing=True,
+)
+with WheelFile.open(wheel) as source:
+    records = {
+        path: open(path).read().splitlines()
+        for lib in {paths["purelib"], paths["platlib"]}
+        if os.path.isfile(path := os.path.join(destdir + lib, source.dist_info_dir, "RECORD"))
+    }
+    install(source, destination, additional_metadata={})
+
+for record, previous in records.items():
+    lines = open(record).read().splitlines()
+    installed = {line.split(",", 1)[0] for line in lines}
+    lines += [line for line in previous if line.split(",", 1)[0] not in installed]
+    with open(record, "w") as fd:
+        fd.write("".join(f"{line}\\n" for line in lines))
+print(paths["purelib"])
+"""
+
+
+class Preset(PresetBase):
+    def __init__(self, isolation: bool = False):
+        super().__init__()
+        self._isolation = isolation
+
+    def required_tools(self, build: Build) -> list[str]:
+        if not _has_python_project(build.source_dir):
+            return []
+        return interpreters(build)
+
+    def preflight(self, build: Build) -> list[str]:
+        if not _has_python_project(build.source_dir) or install_module.destdir(build) != build.staging_dir:
+            return []
+        return install_module.check_install_files(build)
+
+    def clean(self, build: Build) -> None:
+        if not _has_python_project(build.source_dir):
+            return
+        clean(build)
+
+    def build(self, build: Build) -> None:
+        if not _has_python_project(build.source_dir):
+            return
+        _build(build, isolation=self._isolation)
+
+    def test(self, build: Build) -> None:
+        if not _has_python_project(build.source_dir):
+            return
+        test(build)
+
+    def install(self, build: Build) -> None:
+        if not _has_python_project(build.source_dir):
+            return
+        install(build)
+
+
+def interpreters(build: Build) -> list[str]:
+    """
+    the python3 interpreters the package has to be built for
+    """
+    return _supported_interpreters(build.executor)
+
+
+@functools.cache
+def _supported_interpreters(executor: Executor) -> list[str]:
+    if shutil.which("py3versions") is None:
+        return ["python3"]
+
+    proc = run_cmd(["py3versions", "--supported"], capture_output=True, text=True, executor=executor)
+    return proc.stdout.split()
+
+
+def clean(build: Build) -> None:
+    work_dir = build.source_dir / ".pybuild"
+    if work_dir.is_dir():
+        print(f"debmagic: removing python build directory {work_dir}")
+        if not build.dry_run:
+            shutil.rmtree(work_dir)
+
+
+def build(build: Build, isolation: bool = False) -> None:
+    if not _has_python_project(build.source_dir):
+        raise BuildError("no 'pyproject.toml' or 'setup.py' file in build root")
+
+    first, *others = interpreters(build)
+
+    _build_wheel(build, first, isolation)
+    first_wheel = _wheel_path(build, first)
+    if not build.dry_run and first_wheel.name.endswith("-none-any.whl"):
+        # pure python: the wheel is the same for every interpreter
+        for interpreter in others:
+            dist_dir = _work_dir(build, interpreter) / "dist"
+            _clear_dir(dist_dir)
+            shutil.copy2(first_wheel, dist_dir)
+    else:
+
+        def build_copy(interpreter: str) -> None:
+            _build_wheel(build, interpreter, isolation, _source_copy(build, interpreter))
+
+        _for_each_interpreter(build, build_copy, others)
+
+    # install into a staging dir so tests run against the built result
+    def stage(interpreter: str) -> None:
+        stage_dir = _work_dir(build, interpreter) / "stage"
+        _clear_dir(stage_dir)
+        purelib = _install_wheel(build, interpreter, stage_dir)
+        build.cmd(
+            [interpreter, "-m", "compileall", "-q", f"-j{build.parallel}", stage_dir / purelib.relative_to("/")],
+        )
+
+    _for_each_interpreter(build, stage)
+
+
+# otherwise the preset function argument name has to be adjusted
+# which is an invalid method override then
+_build = build
+
+
+def test(build: Build, args: list[str] | None = None) -> None:
+    if not any((build.source_dir / test_dir).is_dir() for test_dir in ("tests", "test")):
+        print("debmagic: no python tests found, skipping")
+        return
+
+    def run_tests(interpreter: str) -> None:
+        stage_dir = _work_dir(build, interpreter) / "stage"
+        env = os.environ.copy()
+        # test the staged build, not the source tree in the working directory
+        env["PYTHONSAFEPATH"] = "1"
+        env["PYTHONPATH"] = os.pathsep.join(str(path) for path in stage_dir.glob("usr/lib/python3*/*-packages"))
+        proc = build.cmd(
+            [interpreter, "-m", "pytest", "--import-mode=importlib", "-p", "no:cacheprovider", *(args or [])],
+            cwd=build.source_dir,
+            env=env,
+            check=False,
+        )
+        # pytest: 5 = no tests were collected
+        if proc.returncode not in (0, 5):
+            raise BuildError(f"python tests failed for {interpreter}")
+
+    _for_each_interpreter(build, run_tests)
+
+
+def install(build: Build, destdir: Path | None = None) -> None:
+    """
+    install the wheels into `destdir`, by default into the only binary package, or into the staging dir,
+    which is then distributed into the binary packages by their `debian/<package>.install` files.
+    """
+    target = destdir or install_module.destdir(build)
+
+    # the wheels can't be installed concurrently since they share the dist-packages dir
+    for interpreter in interpreters(build):
+        _install_wheel(build, interpreter, target)
+
+    if destdir is None and target == build.staging_dir:
+        install_module.distribute(build)
+
+
+def _build_wheel(build: Build, interpreter: str, isolation: bool, source_dir: Path | None = None) -> None:
+    source_dir = source_dir or build.source_dir
+    dist_dir = _work_dir(build, interpreter) / "dist"
+    _clear_dir(dist_dir)
+
+    builder = _isolated_env(build, interpreter) if isolation else interpreter
+    build.cmd(
+        [builder, "-m", "build", "--wheel", "--no-isolation", "--outdir", dist_dir, source_dir],
+        cwd=source_dir,
+    )
+
+
+def _source_copy(build: Build, interpreter: str) -> Path:
+    """
+    a fresh copy of the source tree for building the interpreter's wheel
+    """
+    copy_dir = _work_dir(build, interpreter) / "src"
+    if build.dry_run:
+        return copy_dir
+
+    def ignore(directory: str, names: list[str]) -> set[str]:
+        return _SOURCE_COPY_IGNORE.intersection(names) if Path(directory) == build.source_dir else set()
+
+    if copy_dir.is_dir():
+        shutil.rmtree(copy_dir)
+    shutil.copytree(build.source_dir, copy_dir, symlinks=True, ignore=ignore)
+    return copy_dir
+
+
+def _install_wheel(build: Build, interpreter: str, destdir: Path) -> Path:
+    """install the interpreter's wheel to destdir, returns the (unprefixed) dist-packages dir"""
+    proc = build.cmd(
+        [interpreter, "-c", _INSTALL_WHEEL_SCRIPT, _wheel_path(build, interpreter), destdir],
+        capture_output=True,
+        text=True,
+    )
+    if build.dry_run:
+        return Path("/usr/lib/python3/dist-packages")
+    return Path(proc.stdout.strip().splitlines()[-1])
+
+
+def _isolated_env(build: Build, interpreter: str) -> Path:
+    """
+    return the python of a cached virtual environment with the project's build requirements
+    """
+    pyproject = build.source_dir / "pyproject.toml"
+    requires: list[str] = ["setuptools>=40.8.0"]
+    if pyproject.is_file():
+        with pyproject.open("rb") as fd:
+            requires = tomllib.load(fd).get("build-system", {}).get("requires", requires)
+
+    interpreter_version = run_cmd(
+        [interpreter, "-c", "import sys; print(sys.version)"],
+        capture_output=True,
+        text=True,
+        executor=build.executor,
+    ).stdout
+    env_dir = cache_dir("python", "isolation", fingerprint(interpreter_version, *sorted(requires))[:16])
+    env_python = env_dir / "bin" / "python"
+
+    # other builds may create the same environment at the same time
+    with (env_dir.parent / f"{env_dir.name}.lock").open("w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not (env_dir / ".complete").is_file():
+            build.cmd([interpreter, "-m", "venv", "--clear", env_dir])
+            build.cmd([env_python, "-m", "pip", "install", "--disable-pip-version-check", "build", *requires])
+            if not build.dry_run:
+                (env_dir / ".complete").touch()
+
+    return env_python
+
+
+def _for_each_interpreter(
+    build: Build, func: Callable[[str], None], selected_interpreters: list[str] | None = None
+) -> None:
+    if selected_interpreters is None:
+        selected_interpreters = interpreters(build)
+    if not selected_interpreters:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(build.parallel, len(selected_interpreters))) as pool:
+        # result() re-raises the exceptions of the workers
+        for future in [pool.submit(func, interpreter) for interpreter in selected_interpreters]:
+            future.result()
+
+
+def _work_dir(build: Build, interpreter: str) -> Path:
+    version = interpreter.removeprefix("python")
+    if not version or version == "3":
+        version = f"3.{sys.version_info.minor}"
+    return build.source_dir / ".pybuild" / f"cpython3_{version}"
+
+
+def _wheel_path(build: Build, interpreter: str) -> Path:
+    dist_dir = _work_dir(build, interpreter) / "dist"
+    wheels = sorted(dist_dir.glob("*.whl"))
+    if not wheels:
+        if build.dry_run:
+            return dist_dir / "dry-run.whl"
+        raise BuildError(f"no wheel was built for {interpreter} in {dist_dir}")
+    return wheels[0]
+
+
+def _clear_dir(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+
+
+def _has_python_project(path: Path) -> bool:
+    return (path / "pyproject.toml").is_file() or (path / "setup.py").is_file()
@@ -0,0 +1,398 @@
+"""
+shlibdeps module
+
+native replacement for `dh_shlibdeps`.
+reads the dynamic sections of all ELF objects in the install dirs in parallel
+and resolves the libraries they need through an index of dpkg's database
+(`/var/lib/dpkg/info/*.{list,shlibs,symbols}`).
+libraries are looked up in the object's RUNPATH/RPATH, the dirs of `/etc/ld.so.conf`
+and the default library dirs, like dpkg-shlibdeps does.
+the index is cached between builds and rebuilt when dpkg's database changes.
+
+the result is written as `shlibs:Depends` to `debian/<package>.substvars`.
+
+usage as dh override:
+
+```python
+from debmagic.v0 import dh, shlibdeps
+
+dhp = dh.Preset()
+pkg = package(preset=dhp)
+dhp.override(shlibdeps.dh_shlibdeps)
+```
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from debian.debian_support import Version
+from debmagic.common.elf import ET_DYN, ET_EXEC, STB_WEAK, ElfFile
+from debmagic.common.symbols_file import LibrarySymbols, read_symbols_file
+
+from .._build import Build, BuildError
+from .._cache import cache_dir
+from .._file_index import FileKind
+
+DPKG_DIR = Path("/var/lib/dpkg")
+
+# bump when the index format changes
+_INDEX_VERSION = 1
+
+_SIMPLE_DEPENDENCY = re.compile(r"^(\S+)(?: \(>= ([^)]+)\))?$")
+
+
+@dataclass
+class _ObjectInfo:
+    """
+    what we need to know about one ELF object
+    """
+
+    path: Path
+    soname: str | None
+    needed: list[str]
+    #: (name, version) of undefined symbols, weak ones excluded
+    undefined: list[tuple[str, str | None]]
+    #: symbol version -> soname providing it
+    version_requirements: dict[str, str]
+    #: DT_RUNPATH or DT_RPATH dirs, `$ORIGIN` not expanded yet
+    library_path: list[str]
+
+
+@dataclass
+class DpkgIndex:
+    """
+    which installed package provides which library, and how to depend on it
+    """
+
+    #: soname -> [(library path, dpkg package name)]
+    libraries: dict[str, list[tuple[str, str]]]
+    #: dpkg package name -> {soname: symbols file}
+    symbols: dict[str, dict[str, str]]
+    #: dpkg package name -> {"<library> <version>": dependency}
+    shlibs: dict[str, dict[str, str]]
+
+
+def dh_shlibdeps(build: Build) -> None:
+    shlibdeps(build)
+
+
+def shlibdeps(build: Build) -> None:
+    """
+    write `shlibs:Depends` for each binary package
+    """
+    objects: dict[str, list[_ObjectInfo]] = {}
+    index = build.file_index()
+    paths = {
+        pkg_name: [
+            info.full_path
+            for info in index.of_kind(FileKind.elf, root=install_dir)
+            if info.elf_type in (ET_EXEC, ET_DYN) and not info.path.startswith("usr/lib/debug/")
+        ]
+        for pkg_name, install_dir in build.install_dirs.items()
+    }
+    all_paths = [path for pkg_paths in paths.values() for path in pkg_paths]
+
+    # threads like the file index's ELF parsing, forking from the threaded build could deadlock
+    with ThreadPoolExecutor(max_workers=build.parallel) as pool:
+        infos = dict(zip(all_paths, pool.map(_read_object, all_paths), strict=True))
+    for pkg_name, pkg_paths in paths.items():
+        objects[pkg_name] = [info for path in pkg_paths if (info := infos[path]) is not None]
+
+    # libraries shipped by the packages of this build
+    local_sonames: dict[str, str] = {}
+    for pkg_name, pkg_objects in objects.items():
+        for info in pkg_objects:
+            if info.soname:
+                local_sonames.setdefault(info.soname, pkg_name)
+
+    resolver = _Resolver(dpkg_index(), _library_dirs(build.architecture_host))
+
+    errors: list[str] = []
+    for pkg_name, pkg_objects in objects.items():
+        install_dir = build.install_dirs[pkg_name]
+        dependencies: list[str] = []
+        for info in pkg_objects:
+            origin = "/" + info.path.parent.relative_to(install_dir).as_posix()
+            search_dirs = expand_origin(info.library_path, origin)
+            for soname in info.needed:
+                if provider := local_sonames.get(soname):
+                    if provider != pkg_name:
+                        dependencies.append(f"{provider} (= ${{binary:Version}})")
+                    continue
+                try:
+                    dependencies.append(resolver.dependency(soname, info, search_dirs))
+                except LookupError as exc:
+                    errors.append(f"{info.path}: {exc}")
+
+        merged = merge_dependencies(dependencies)
+        _write_substvar(build, pkg_name, "shlibs:Depends", ", ".join(merged))
+
+    if errors:
+        raise BuildError("shlibdeps failed:\n" + "\n".join(errors))
+
+
+def merge_dependencies(dependencies: list[str]) -> list[str]:
+    """
+    deduplicate dependencies, keeping the highest minimum version of each package.
+
+    >>> merge_dependencies(["libc6 (>= 2.34)", "libc6 (>= 2.4)", "libfoo1", "a | b", "a | b"])
+    ['a | b', 'libc6 (>= 2.34)', 'libfoo1']
+    """
+    versions: dict[str, str | None] = {}
+    others: set[str] = set()
+    for dependency in dependencies:
+        match = _SIMPLE_DEPENDENCY.match(dependency)
+        if not match:
+            others.add(dependency)
+            continue
+        name, version = match.groups()
+        previous = versions.get(name)
+        if name not in versions or (version and (previous is None or Version(version) > Version(previous))):
+            versions[name] = version
+
+    merged = [f"{name} (>= {version})" if version else name for name, version in versions.items()]
+    return sorted([*merged, *others])
+
+
+def dpkg_index(dpkg_dir: Path = DPKG_DIR) -> DpkgIndex:
+    """
+    load the library index of dpkg's database, rebuilding the cached index if the database changed.
+    """
+    info_dir = dpkg_dir / "info"
+    key = [_INDEX_VERSION, str(dpkg_dir)]
+    for path in (info_dir, dpkg_dir / "status"):
+        try:
+            key.append(path.stat().st_mtime_ns)
+        except FileNotFoundError:
+            key.append(None)
+
+    cache_file = cache_dir("shlibdeps") / "dpkg-index.json"
+    try:
+        cached = json.loads(cache_file.read_text())
+        if cached["key"] == key:
+            return DpkgIndex(
+                libraries={
+                    soname: [tuple(entry) for entry in entries] for soname, entries in cached["libraries"].items()
+                },
+                symbols=cached["symbols"],
+                shlibs=cached["shlibs"],
+            )
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    print(f"debmagic: indexing libraries in {info_dir}")
+    index = _build_index(info_dir)
+
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    tmp_file.write_text(
+        json.dumps({"key": key, "libraries": index.libraries, "symbols": index.symbols, "shlibs": index.shlibs})
+    )
+    tmp_file.replace(cache_file)
+    return index
+
+
+def _build_index(info_dir: Path) -> DpkgIndex:
+    index = DpkgIndex(libraries={}, symbols={}, shlibs={})
+    if not info_dir.is_dir():
+        return index
+
+    for entry in os.scandir(info_dir):
+        dpkg_name, _, kind = entry.name.rpartition(".")
+        match kind:
+            case "list":
+                with open(entry.path, errors="replace") as fd:
+                    for line in fd:
+                        path = line.rstrip("\n")
+                        name = path.rpartition("/")[2]
+                        if "/lib" in path and ".so" in name:
+                            index.libraries.setdefault(name, []).append((path, dpkg_name))
+            case "symbols":
+                index.symbols[dpkg_name] = {
+                    library.soname: entry.path for library in read_symbols_file(Path(entry.path), only_headers=True)
+                }
+            case "shlibs":
+                index.shlibs[dpkg_name] = _parse_shlibs(Path(entry.path))
+
+    return index
+
+
+def _parse_shlibs(path: Path) -> dict[str, str]:
+    """
+    read a `deb-shlibs(5)` file into {"<library> <version>": dependency}
+    """
+    shlibs: dict[str, str] = {}
+    for line in path.read_text(errors="replace").splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        fields = line.split(maxsplit=2)
+        # type-prefixed entries are for udebs
+        if fields[0].endswith(":") or len(fields) < 3:
+            continue
+        shlibs.setdefault(f"{fields[0]} {fields[1]}", fields[2])
+    return shlibs
+
+
+def _shlibs_key(soname: str) -> str | None:
+    """
+    >>> _shlibs_key("libacl.so.1")
+    'libacl 1'
+    >>> _shlibs_key("libfoo-2.0.so")
+    'libfoo 2.0'
+    """
+    if match := re.match(r"^(.*)\.so\.(.*)$", soname):
+        return f"{match.group(1)} {match.group(2)}"
+    if match := re.match(r"^(.*)-(\d.*)\.so$", soname):
+        return f"{match.group(1)} {match.group(2)}"
+    return None
+
+
+def expand_origin(library_path: list[str], origin: str) -> list[str]:
+    """
+    the library dirs of a RUNPATH/RPATH for an object installed in the `origin` dir
+
+    >>> expand_origin(["$ORIGIN/../lib", "${ORIGIN}", "/opt/foo/lib/"], "/usr/bin")
+    ['/usr/lib', '/usr/bin', '/opt/foo/lib']
+    """
+    dirs: list[str] = []
+    for entry in library_path:
+        directory = entry.replace("${ORIGIN}", origin).replace("$ORIGIN", origin)
+        # relative dirs are relative to the working directory at runtime, they can't be resolved
+        if directory.startswith("/"):
+            dirs.append(os.path.normpath(directory))
+    return dirs
+
+
+def _library_dirs(triplet: str, ld_so_conf: Path = Path("/etc/ld.so.conf")) -> list[str]:
+    return [
+        *ld_so_conf_dirs(ld_so_conf),
+        f"/lib/{triplet}",
+        f"/usr/lib/{triplet}",
+        "/lib",
+        "/usr/lib",
+        "/lib64",
+        "/usr/lib64",
+    ]
+
+
+def ld_so_conf_dirs(path: Path, seen: set[Path] | None = None) -> list[str]:
+    """
+    the library dirs configured in `ld.so.conf`, following its `include` globs
+    """
+    seen = seen if seen is not None else set()
+    if path in seen or not path.is_file():
+        return []
+    seen.add(path)
+
+    dirs: list[str] = []
+    for raw_line in path.read_text(errors="replace").splitlines():
+        line = raw_line.partition("#")[0].strip()
+        if not line or line.startswith("hwcap "):
+            continue
+        if line.startswith("include "):
+            for pattern in line.split()[1:]:
+                pattern_path = Path(pattern) if pattern.startswith("/") else path.parent / pattern
+                for included in sorted(pattern_path.parent.glob(pattern_path.name)):
+                    dirs.extend(ld_so_conf_dirs(included, seen))
+            continue
+        # entries can be separated by spaces, tabs, colons or commas
+        dirs.extend(os.path.normpath(directory) for directory in re.split(r"[\s:,]+", line) if directory)
+    return list(dict.fromkeys(dirs))
+
+
+class _Resolver:
+    def __init__(self, index: DpkgIndex, library_dirs: list[str]):
+        self._index = index
+        self._library_dirs = library_dirs
+        self._symbols_files: dict[str, list[LibrarySymbols]] = {}
+
+    def dependency(self, soname: str, info: _ObjectInfo, search_dirs: list[str] | None = None) -> str:
+        """
+        the dependency on the installed package providing the library,
+        looked up in the object's `search_dirs` first
+        """
+        dpkg_name = self._package(soname, search_dirs or [])
+        if dpkg_name is None:
+            raise LookupError(f"no installed package provides {soname}")
+
+        if symbols_file := self._index.symbols.get(dpkg_name, {}).get(soname):
+            library = self._symbols(symbols_file, soname)
+            if library is not None:
+                return library.dependency(*self._minver(library, soname, info))
+
+        key = _shlibs_key(soname)
+        if key and (dependency := self._index.shlibs.get(dpkg_name, {}).get(key)):
+            return dependency
+
+        raise LookupError(f"no dependency information found for {soname} (provided by {dpkg_name})")
+
+    def _package(self, soname: str, search_dirs: list[str]) -> str | None:
+        candidates = self._index.libraries.get(soname, [])
+        for library_dir in [*search_dirs, *self._library_dirs]:
+            for path, dpkg_name in candidates:
+                if path.rpartition("/")[0] == library_dir:
+                    return dpkg_name
+        return None
+
+    def _symbols(self, symbols_file: str, soname: str) -> LibrarySymbols | None:
+        if symbols_file not in self._symbols_files:
+            self._symbols_files[symbols_file] = read_symbols_file(Path(symbols_file))
+        return next((lib for lib in self._symbols_files[symbols_file] if lib.soname == soname), None)
+
+    def _minver(self, library: LibrarySymbols, soname: str, info: _ObjectInfo) -> tuple[str | None, int]:
+        """
+        the highest minimum version of the library's symbols the object uses.
+        """
+        minver: str | None = None
+        dep_id = 0
+        for name, version in info.undefined:
+            if version:
+                if info.version_requirements.get(version) != soname:
+                    continue
+                entry = library.symbols.get(f"{name}@{version}")
+            else:
+                entry = library.symbols.get(f"{name}@Base")
+            if entry is None:
+                continue
+            if minver is None or Version(entry.minver) > Version(minver):
+                minver = entry.minver
+                dep_id = entry.dep_id
+        return minver, dep_id
+
+
+def _read_object(path: Path) -> _ObjectInfo | None:
+    elf = ElfFile.read(path)
+    if elf is None or elf.type not in (ET_EXEC, ET_DYN):
+        return None
+    needed = elf.needed
+    if not needed and elf.soname is None:
+        return None
+    return _ObjectInfo(
+        path=path,
+        soname=elf.soname,
+        needed=needed,
+        undefined=[
+            (symbol.name, symbol.version)
+            for symbol in elf.dynamic_symbols()
+            if not symbol.defined and symbol.binding != STB_WEAK
+        ],
+        version_requirements=elf.version_requirements(),
+        library_path=elf.library_path,
+    )
+
+
+def _write_substvar(build: Build, pkg_name: str, name: str, value: str) -> None:
+    substvars_file = build.install_base_dir / f"{pkg_name}.substvars"
+    print(f"debmagic: {substvars_file}: {name}={value}")
+    if build.dry_run:
+        return
+
+    lines: list[str] = []
+    if substvars_file.is_file():
+        lines = [line for line in substvars_file.read_text().splitlines() if not line.startswith(f"{name}=")]
+    if value:
+        lines.append(f"{name}={value}")
+    substvars_file.write_text("".join(f"{line}\n" for line in lines))
@@ -0,0 +1,254 @@
+"""
+strip module
+
+native replacement for `dh_strip`.
+finds ELF objects in all package install dirs and processes them concurrently:
+debug symbols are extracted into the `-dbgsym` package tree
+(`debian/.debhelper/<package>/dbgsym-root`), then the files are stripped
+and linked to their debug file.
+
+a build-id index (`debian/.debmagic/build-ids.json`) maps each build-id to its
+package, binary and debug file, e.g. to feed a local debuginfod.
+
+honors `DEB_BUILD_OPTIONS=nostrip` and `noautodbgsym`.
+
+usage as dh override:
+
+```python
+from debmagic.v0 import dh, strip
+
+dhp = dh.Preset()
+pkg = package(preset=dhp)
+dhp.override(strip.dh_strip)
+```
+"""
+
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from debmagic.common.elf import ET_DYN, ET_EXEC
+
+from .._build import Build
+from .._file_index import FileKind
+
+_SHARED_LIB_NAME = re.compile(r"\.so(\.|$)|\.cmxs$")
+_STATIC_LIB_NAME = re.compile(r"^lib.*\.a$")
+
+_STRIP_ARGS = ["--remove-section=.comment", "--remove-section=.note"]
+_STRIP_STATIC_ARGS = [
+    "--strip-debug",
+    *_STRIP_ARGS,
+    "--enable-deterministic-archives",
+    "-R",
+    ".gnu.lto_*",
+    "-R",
+    ".gnu.debuglto_*",
+    "-N",
+    "__gnu_lto_slim",
+    "-N",
+    "__gnu_lto_v1",
+]
+
+
+@dataclass
+class _StripJob:
+    package: str
+    install_dir: Path
+    path: Path
+    #: "shared", "executable" or "static"
+    kind: str
+    build_id: str | None = None
+    has_debug: bool = False
+
+    @property
+    def rel_path(self) -> str:
+        return "/" + self.path.relative_to(self.install_dir).as_posix()
+
+
+def dh_strip(build: Build) -> None:
+    strip(build)
+
+
+def strip(build: Build, dbgsym: bool = True, dwz: bool = False, compress_debug: bool = True) -> None:
+    """
+    strip all ELF objects of all binary packages.
+    `dbgsym`: extract debug symbols into the -dbgsym package tree.
+    `dwz`: deduplicate DWARF of each package's objects with `dwz` first.
+    `compress_debug`: compress the extracted debug sections.
+    """
+    build_options = os.environ.get("DEB_BUILD_OPTIONS", "").split()
+    if "nostrip" in build_options:
+        print("debmagic: not stripping, nostrip is in DEB_BUILD_OPTIONS")
+        return
+    if "noautodbgsym" in build_options:
+        dbgsym = False
+
+    jobs: list[_StripJob] = []
+    seen_inodes: set[tuple[int, int]] = set()
+    for pkg_name, install_dir in build.install_dirs.items():
+        # debug packages themselves are never stripped
+        if pkg_name.endswith(("-dbg", "-dbgsym")) or not install_dir.is_dir():
+            continue
+        jobs.extend(_find_objects(build, pkg_name, install_dir, seen_inodes))
+
+    print(f"debmagic: stripping {len(jobs)} files")
+    if not jobs:
+        return
+
+    tools = _Tools(build)
+
+    with ThreadPoolExecutor(max_workers=build.parallel) as pool:
+        if dwz:
+            # dwz works on all objects of a package at once
+            per_package: dict[str, list[_StripJob]] = {}
+            for job in jobs:
+                if job.kind != "static" and job.has_debug:
+                    per_package.setdefault(job.package, []).append(job)
+            list(pool.map(lambda pkg_jobs: _dwz(build, pkg_jobs), per_package.values()))
+
+        list(pool.map(lambda job: _strip_object(build, tools, job, dbgsym, compress_debug), jobs))
+    build.invalidate_file_index()
+
+    if dbgsym:
+        _write_dbgsym_metadata(build, jobs)
+
+
+def dbgsym_dir(build: Build, pkg_name: str) -> Path:
+    """
+    staging tree of the automatic debug symbol package, like dh_strip's
+    """
+    return build.install_base_dir / ".debhelper" / pkg_name / "dbgsym-root"
+
+
+def debug_file_path(build_id: str) -> Path:
+    """
+    location of the debug file in the debug symbol package, relative to its root
+    """
+    return Path("usr/lib/debug/.build-id", build_id[:2], f"{build_id[2:]}.debug")
+
+
+class _Tools:
+    """
+    binutils to use, prefixed with the host triplet when cross-building
+    """
+
+    def __init__(self, build: Build):
+        prefix = ""
+        if build.architecture_host != build.architecture_target:
+            prefix = f"{build.architecture_host}-"
+        self.objcopy = f"{prefix}objcopy"
+        self.strip = f"{prefix}strip"
+
+
+def _find_objects(build: Build, pkg_name: str, install_dir: Path, seen_inodes: set[tuple[int, int]]) -> list[_StripJob]:
+    jobs: list[_StripJob] = []
+    for info in build.file_index().files(install_dir):
+        # separate debug files are already stripped to their debug info
+        if info.path.startswith("usr/lib/debug/"):
+            continue
+
+        # hardlinked files are stripped once, strip keeps the links.
+        # concurrent jobs on the same inode would overwrite each other.
+        if info.nlink > 1:
+            if info.inode in seen_inodes:
+                continue
+            seen_inodes.add(info.inode)
+
+        if info.kind == FileKind.static_lib:
+            if _STATIC_LIB_NAME.match(info.name) and not info.name.endswith("_g.a"):
+                jobs.append(_StripJob(pkg_name, install_dir, info.full_path, "static"))
+            continue
+
+        if info.kind != FileKind.elf or info.elf_type not in (ET_EXEC, ET_DYN):
+            continue
+
+        if info.elf_type == ET_DYN and _SHARED_LIB_NAME.search(info.name):
+            kind = "shared"
+        elif info.mode & 0o111:
+            kind = "executable"
+        else:
+            continue
+
+        if not info.has_debug_info and not info.has_symtab:
+            # already stripped
+            continue
+
+        jobs.append(
+            _StripJob(
+                pkg_name, install_dir, info.full_path, kind, build_id=info.build_id, has_debug=info.has_debug_info
+            )
+        )
+    return jobs
+
+
+def _dwz(build: Build, jobs: list[_StripJob]) -> None:
+    # dwz fails when it can't improve anything, which is fine.
+    build.cmd(["dwz", "--", *(job.path for job in jobs)], check=False)
+
+
+def _strip_object(build: Build, tools: _Tools, job: _StripJob, dbgsym: bool, compress_debug: bool) -> None:
+    if job.kind == "static":
+        build.cmd([tools.strip, *_STRIP_STATIC_ARGS, job.path])
+        return
+
+    debug_file: Path | None = None
+    if dbgsym and job.has_debug and job.build_id:
+        debug_file = dbgsym_dir(build, job.package) / debug_file_path(job.build_id)
+        if not build.dry_run:
+            debug_file.parent.mkdir(parents=True, exist_ok=True)
+        compress_args = ["--compress-debug-sections"] if compress_debug else []
+        build.cmd([tools.objcopy, "--only-keep-debug", *compress_args, job.path, debug_file])
+        if not build.dry_run:
+            debug_file.chmod(0o644)
+
+    strip_args = [*_STRIP_ARGS, "--strip-unneeded"] if job.kind == "shared" else _STRIP_ARGS
+    build.cmd([tools.strip, *strip_args, job.path])
+
+    if debug_file:
+        build.cmd([tools.objcopy, "--add-gnu-debuglink", debug_file, job.path])
+
+
+def _write_dbgsym_metadata(build: Build, jobs: list[_StripJob]) -> None:
+    """
+    write the build-ids of each debug symbol package for dh_gencontrol,
+    and the build-id index of the whole build.
+    """
+    index: dict[str, dict[str, str]] = {}
+    build_ids: dict[str, list[str]] = {}
+    for job in jobs:
+        if not (job.has_debug and job.build_id):
+            continue
+        build_ids.setdefault(job.package, []).append(job.build_id)
+        index[job.build_id] = {
+            "package": job.package,
+            "file": job.rel_path,
+            "debug_package": f"{job.package}-dbgsym",
+            "debug_file": "/" + debug_file_path(job.build_id).as_posix(),
+        }
+
+    index_file = build.state_dir / "build-ids.json"
+    print(f"debmagic: writing build-id index {index_file} with {len(index)} entries")
+    if build.dry_run:
+        return
+
+    for pkg_name, ids in build_ids.items():
+        package_dir = build.install_base_dir / ".debhelper" / pkg_name
+        (package_dir / "dbgsym-build-ids").write_text(" ".join(sorted(set(ids))))
+
+        # the debug package's documentation is the one of its package
+        doc_link = dbgsym_dir(build, pkg_name) / "usr/share/doc" / f"{pkg_name}-dbgsym"
+        if doc_link.is_symlink() or doc_link.exists():
+            if doc_link.is_dir() and not doc_link.is_symlink():
+                shutil.rmtree(doc_link)
+            else:
+                doc_link.unlink()
+        doc_link.parent.mkdir(parents=True, exist_ok=True)
+        doc_link.symlink_to(pkg_name)
+
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    index_file.write_text(json.dumps(dict(sorted(index.items())), indent=2) + "\n")
@@ -0,0 +1,427 @@
+"""
+symbols module
+
+native replacement for `dh_makeshlibs` and the `dpkg-gensymbols` run it does.
+the dynamic symbol tables of all shared libraries of all binary packages are read
+concurrently and compared with `debian/<package>.symbols`, honoring the
+`c++`, `optional`, `symver`, `regex` and `arch` tags, `#include` and `#PACKAGE#`.
+new and lost symbols are reported as unified diff, like dpkg-gensymbols does.
+
+`DPKG_GENSYMBOLS_CHECK_LEVEL` selects what fails the build, with dpkg-gensymbols' levels:
+0: nothing, 1: lost symbols (default), 2: also new symbols, 3: also lost libraries,
+4: also new libraries.
+
+usage as dh override:
+
+```python
+from debmagic.v0 import dh, symbols
+
+dhp = dh.Preset()
+pkg = package(preset=dhp)
+dhp.override(symbols.dh_makeshlibs)
+```
+"""
+
+import difflib
+import functools
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from debmagic.common.elf import ET_DYN, STB_GLOBAL, STB_GNU_UNIQUE, STB_WEAK, ElfFile
+from debmagic.common.executor import Executor
+from debmagic.common.symbols_file import LibrarySymbols, SymbolEntry, read_symbols_file
+from debmagic.common.utils import run_cmd
+
+from .._build import Build, BuildError
+
+# symbols the toolchain adds to every library, from dpkg's Dpkg::Shlibs::Symbol
+_BLACKLIST = {
+    "__bss_end__",
+    "__bss_end",
+    "_bss_end__",
+    "__bss_start",
+    "__bss_start__",
+    "__data_start",
+    "__do_global_ctors_aux",
+    "__do_global_dtors_aux",
+    "__end__",
+    "__exidx_end",
+    "__exidx_start",
+    "_DYNAMIC",
+    "_edata",
+    "_end",
+    "_fbss",
+    "_fdata",
+    "_fini",
+    "_ftext",
+    "_GLOBAL_OFFSET_TABLE_",
+    "__gmon_start__",
+    "__gnu_local_gp",
+    "_gp",
+    "_init",
+    "_PROCEDURE_LINKAGE_TABLE_",
+    "_SDA2_BASE_",
+    "_SDA_BASE_",
+}
+
+_PATTERN_TAGS = ("symver", "regex", "c++")
+
+
+@dataclass
+class ExportedSymbol:
+    #: "name@version", "Base" for unversioned symbols
+    name: str
+    #: demangled "name@version" of C++ symbols
+    demangled: str | None = None
+
+
+@dataclass
+class LibraryExports:
+    path: Path
+    soname: str
+    symbols: list[ExportedSymbol] = field(default_factory=list)
+
+
+@dataclass
+class SymbolsResult:
+    """
+    the comparison of one package's libraries with its symbols file
+    """
+
+    package: str
+    libraries: list[LibrarySymbols]
+    new_symbols: int = 0
+    lost_symbols: int = 0
+    new_libraries: list[str] = field(default_factory=list)
+    lost_libraries: list[str] = field(default_factory=list)
+    diff: str = ""
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.new_symbols or self.lost_symbols or self.new_libraries or self.lost_libraries)
+
+
+def dh_makeshlibs(build: Build) -> None:
+    """
+    write `DEBIAN/symbols`, `DEBIAN/shlibs` and the ldconfig trigger of all library packages
+    """
+    results = gensymbols(build)
+    for result in results:
+        install_dir = build.install_dirs[result.package]
+        _write_shlibs(build, result.package, install_dir, result.libraries)
+
+
+def gensymbols(build: Build, check_level: int | None = None) -> list[SymbolsResult]:
+    """
+    generate `DEBIAN/symbols` for each package shipping shared libraries,
+    and check them against the packages's symbols file.
+    """
+    if check_level is None:
+        check_level = int(os.environ.get("DPKG_GENSYMBOLS_CHECK_LEVEL", "1"))
+
+    library_dirs = public_library_dirs(build.package.build_env["DEB_HOST_MULTIARCH"])
+    candidates = {
+        pkg_name: _find_libraries(install_dir, library_dirs)
+        for pkg_name, install_dir in build.install_dirs.items()
+        if install_dir.is_dir()
+    }
+    all_paths = [path for paths in candidates.values() for path in paths]
+    # threads like the file index's ELF parsing, forking from the threaded build could deadlock
+    with ThreadPoolExecutor(max_workers=build.parallel) as pool:
+        exports = dict(
+            zip(all_paths, pool.map(functools.partial(read_exports, executor=build.executor), all_paths), strict=True)
+        )
+
+    version = build.package.version.version
+    host_arch = build.package.build_env["DEB_HOST_ARCH"]
+
+    results: list[SymbolsResult] = []
+    failed = False
+    for pkg_name, paths in candidates.items():
+        libraries = [library for path in paths if (library := exports[path]) is not None]
+        template_file = symbols_template(build, pkg_name, host_arch)
+        if not libraries and template_file is None:
+            continue
+
+        templates = read_symbols_file(template_file, package=pkg_name) if template_file else []
+        result = compare(pkg_name, libraries, templates, version, host_arch)
+        if template_file:
+            result.diff = "".join(
+                difflib.unified_diff(
+                    render(templates, host_arch).splitlines(keepends=True),
+                    render(result.libraries, host_arch, with_missing=True).splitlines(keepends=True),
+                    fromfile=f"{template_file.relative_to(build.source_dir)} ({pkg_name}_{version}_{host_arch})",
+                    tofile=f"debian/{pkg_name}/DEBIAN/symbols",
+                )
+            )
+        results.append(result)
+
+        if result.changed:
+            print(
+                f"debmagic: {pkg_name}: {result.new_symbols} new and {result.lost_symbols} lost symbols, "
+                f"new libraries: {result.new_libraries or 'none'}, lost libraries: {result.lost_libraries or 'none'}"
+            )
+            if result.diff:
+                print(result.diff, end="")
+
+        if check_failed(result, check_level):
+            failed = True
+
+        _write_symbols(build, pkg_name, result.libraries, host_arch)
+
+    if failed:
+        raise BuildError("symbols files don't match the libraries, see the diff above")
+    return results
+
+
+def check_failed(result: SymbolsResult, check_level: int) -> bool:
+    """
+    whether the differences fail the build at dpkg-gensymbols' check level
+    """
+    return bool(
+        (check_level >= 1 and result.lost_symbols)
+        or (check_level >= 2 and result.new_symbols)
+        or (check_level >= 3 and result.lost_libraries)
+        or (check_level >= 4 and result.new_libraries)
+    )
+
+
+def symbols_template(build: Build, pkg_name: str, host_arch: str) -> Path | None:
+    """
+    the maintainer's symbols file for this package, like debhelper looks it up
+    """
+    debian_dir = build.source_dir / "debian"
+    names = [f"{pkg_name}.symbols.{host_arch}", f"{pkg_name}.symbols"]
+    if pkg_name == build.main_package.name:
+        names.extend([f"symbols.{host_arch}", "symbols"])
+    return next((debian_dir / name for name in names if (debian_dir / name).is_file()), None)
+
+
+def read_exports(path: Path, executor: Executor | None = None) -> LibraryExports | None:
+    """
+    the exported dynamic symbols of a shared library, None if it isn't one.
+    C++ symbols are demangled by `c++filt`, run by the executor.
+    """
+    elf = ElfFile.read(path)
+    if elf is None or elf.type != ET_DYN or (soname := elf.soname) is None:
+        return None
+
+    library = LibraryExports(path=path, soname=soname)
+    for symbol in elf.dynamic_symbols():
+        if not symbol.defined or symbol.binding not in (STB_GLOBAL, STB_WEAK, STB_GNU_UNIQUE):
+            continue
+        library.symbols.append(ExportedSymbol(name=f"{symbol.name}@{symbol.version or 'Base'}"))
+
+    _demangle(library.symbols, executor)
+    return library
+
+
+def _demangle(symbols: list[ExportedSymbol], executor: Executor | None) -> None:
+    """
+    demangle all C++ symbols of a library with one c++filt call
+    """
+    mangled = [symbol for symbol in symbols if symbol.name.startswith("_Z")]
+    if not mangled:
+        return
+    proc = run_cmd(
+        ["c++filt"],
+        input="".join(f"{symbol.name.rpartition('@')[0]}\n" for symbol in mangled),
+        capture_output=True,
+        text=True,
+        executor=executor,
+    )
+    for symbol, demangled in zip(mangled, proc.stdout.splitlines(), strict=True):
+        symbol.demangled = f"{demangled}@{symbol.name.rpartition('@')[2]}"
+
+
+def compare(
+    pkg_name: str,
+    libraries: list[LibraryExports],
+    templates: list[LibrarySymbols],
+    version: str,
+    host_arch: str,
+) -> SymbolsResult:
+    """
+    merge the exported symbols into the symbols file entries.
+    missing symbols stay in the result, tagged "missing".
+    """
+    by_soname = {template.soname: template for template in templates}
+    result = SymbolsResult(package=pkg_name, libraries=[])
+
+    for library in libraries:
+        template = by_soname.pop(library.soname, None)
+        if template is None:
+            result.new_libraries.append(library.soname)
+            template = LibrarySymbols(soname=library.soname, dependencies=[f"{pkg_name} #MINVER#"])
+
+        entries = {name: entry for name, entry in template.symbols.items() if _applies(entry, host_arch)}
+        plain = {name: entry for name, entry in entries.items() if not _is_pattern(entry)}
+        cpp = {entry.name: entry for entry in entries.values() if "c++" in entry.tags}
+        patterns = [entry for entry in entries.values() if _is_pattern(entry) and "c++" not in entry.tags]
+        matched: set[int] = set()
+
+        merged = LibrarySymbols(soname=library.soname, dependencies=template.dependencies, fields=template.fields)
+        for symbol in library.symbols:
+            if symbol.name.partition("@")[0] in _BLACKLIST:
+                continue
+
+            entry = plain.get(symbol.name)
+            if entry is None and symbol.demangled:
+                entry = cpp.get(symbol.demangled)
+            if entry is not None:
+                matched.add(id(entry))
+                merged.symbols.setdefault(entry.name, entry)
+                continue
+
+            if pattern := next((pattern for pattern in patterns if _pattern_matches(pattern, symbol.name)), None):
+                matched.add(id(pattern))
+                merged.symbols.setdefault(pattern.name, pattern)
+                continue
+
+            result.new_symbols += 1
+            merged.symbols[symbol.name] = SymbolEntry(name=symbol.name, minver=version)
+
+        for entry in entries.values():
+            if id(entry) in matched or "optional" in entry.tags:
+                continue
+            result.lost_symbols += 1
+            merged.symbols[entry.name] = SymbolEntry(
+                name=entry.name,
+                minver=entry.minver,
+                tags={**entry.tags, "missing": version},
+                dep_id=entry.dep_id,
+            )
+
+        result.libraries.append(merged)
+
+    result.lost_libraries = sorted(by_soname)
+    return result
+
+
+def render(libraries: list[LibrarySymbols], host_arch: str, with_missing: bool = False) -> str:
+    """
+    format as symbols file, like dpkg-gensymbols does.
+    `with_missing`: write missing symbols as `#MISSING: <version>#` comments instead of dropping them.
+    """
+    lines: list[str] = []
+    for library in sorted(libraries, key=lambda library: library.soname):
+        lines.append(f"{library.soname} {library.dependencies[0]}")
+        lines.extend(f"| {dependency}" for dependency in library.dependencies[1:])
+        lines.extend(f"* {name}: {value}" for name, value in library.fields.items())
+        for entry in sorted(library.symbols.values(), key=lambda entry: entry.name):
+            if not _applies(entry, host_arch):
+                continue
+            prefix = " "
+            if missing_version := entry.tags.get("missing"):
+                if not with_missing:
+                    continue
+                prefix = f"#MISSING: {missing_version}# "
+            lines.append(f"{prefix}{_format_entry(entry)}")
+    return "".join(f"{line}\n" for line in lines)
+
+
+def _format_entry(entry: SymbolEntry) -> str:
+    tags = [f"{name}={value}" if value else name for name, value in entry.tags.items() if name != "missing"]
+    name = entry.name
+    if "c++" in entry.tags or " " in name:
+        name = f'"{name}"'
+    if tags:
+        name = f"({'|'.join(tags)}){name}"
+    line = f"{name} {entry.minver}"
+    if entry.dep_id:
+        line += f" {entry.dep_id}"
+    return line
+
+
+def _is_pattern(entry: SymbolEntry) -> bool:
+    return any(tag in entry.tags for tag in _PATTERN_TAGS)
+
+
+def _pattern_matches(pattern: SymbolEntry, symbol_name: str) -> bool:
+    if "symver" in pattern.tags:
+        return symbol_name.partition("@")[2] == pattern.name
+    if "regex" in pattern.tags:
+        return re.search(pattern.name, symbol_name) is not None
+    return False
+
+
+def _applies(entry: SymbolEntry, host_arch: str) -> bool:
+    """
+    evaluate the `arch=` tag: a list of architectures, or of negated `!architectures`
+    """
+    arches = entry.tags.get("arch")
+    if not arches:
+        return True
+    arch_list = arches.split()
+    if all(arch.startswith("!") for arch in arch_list):
+        return f"!{host_arch}" not in arch_list
+    return host_arch in arch_list
+
+
+def public_library_dirs(multiarch: str) -> list[str]:
+    """
+    the library directories searched by the dynamic linker.
+    like dpkg-gensymbols and dh_makeshlibs, only libraries directly in them are considered public.
+    """
+    dirs = ["lib", "usr/lib", "lib32", "usr/lib32", "lib64", "usr/lib64"]
+    if multiarch:
+        dirs[:0] = [f"lib/{multiarch}", f"usr/lib/{multiarch}"]
+    return dirs
+
+
+def _find_libraries(install_dir: Path, library_dirs: list[str]) -> list[Path]:
+    paths: list[Path] = []
+    for library_dir in library_dirs:
+        try:
+            entries = list(os.scandir(install_dir / library_dir))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if ".so" in entry.name and entry.is_file(follow_symlinks=False):
+                paths.append(Path(entry.path))
+    return sorted(paths)
+
+
+def _write_symbols(build: Build, pkg_name: str, libraries: list[LibrarySymbols], host_arch: str) -> None:
+    symbols_file = build.install_dirs[pkg_name] / "DEBIAN" / "symbols"
+    print(f"debmagic: writing {symbols_file}")
+    if build.dry_run:
+        return
+
+    content = render(libraries, host_arch)
+    if not content:
+        symbols_file.unlink(missing_ok=True)
+        return
+    symbols_file.parent.mkdir(parents=True, exist_ok=True)
+    symbols_file.write_text(content)
+    symbols_file.chmod(0o644)
+
+
+def _write_shlibs(build: Build, pkg_name: str, install_dir: Path, libraries: list[LibrarySymbols]) -> None:
+    """
+    the shlibs file without version constraint, which is debhelper's default,
+    and the ldconfig trigger for libraries in the public library path.
+    """
+    entries: list[str] = []
+    for library in libraries:
+        if match := re.match(r"^(.*)\.so\.(.*)$", library.soname) or re.match(r"^(.*)-(\d.*)\.so$", library.soname):
+            entries.append(f"{match.group(1)} {match.group(2)} {pkg_name}")
+
+    shlibs_file = install_dir / "DEBIAN" / "shlibs"
+    triggers_file = install_dir / "DEBIAN" / "triggers"
+    print(f"debmagic: writing {shlibs_file} with {len(entries)} entries")
+    if build.dry_run or not entries:
+        return
+
+    shlibs_file.parent.mkdir(parents=True, exist_ok=True)
+    shlibs_file.write_text("".join(f"{entry}\n" for entry in sorted(entries)))
+    shlibs_file.chmod(0o644)
+
+    trigger = "activate-noawait ldconfig"
+    triggers = triggers_file.read_text().splitlines() if triggers_file.is_file() else []
+    if trigger not in triggers:
+        triggers_file.write_text("".join(f"{line}\n" for line in [*triggers, trigger]))
+        triggers_file.chmod(0o644)
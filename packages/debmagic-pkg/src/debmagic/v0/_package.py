@@ -1,15 +1,19 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
 import inspect
+import json
 import multiprocessing
 import os
+import sys
 import typing
 from dataclasses import dataclass, field
 from pathlib import Path
 from types import FunctionType
-from typing import Callable, ParamSpec, TypeVar
+from typing import Callable, ParamSpec, Sequence, TypeVar
 
+from debmagic.common.executor import Executor, LocalExecutor, RecordingExecutor
 from debmagic.common.models.package_version import PackageVersion
 from debmagic.common.package import SourcePackage
 from debmagic.common.utils import Namespace, disable_output_buffer
@@ -20,8 +24,10 @@ from ._build_stage import BuildStage
 from ._build_step import BuildStep
 from ._dpkg import build_env
 from ._package_filter import PackageFilter
+from ._plan import plan
 from ._preset import Preset, PresetsT, as_presets
 from ._rules_file import RulesFile, find_rules_file
+from ._steps import Step
 from ._types import CustomFuncArg, CustomFuncArgsT
 
 
@@ -56,6 +62,17 @@ def _parse_args(custom_functions: dict[str, CustomFunction] | None = None):
     sp.add_parser("binary-arch", parents=[common_cli])
     sp.add_parser("binary-indep", parents=[common_cli])
 
+    # what a build would do, as JSON
+    plan_cli = sp.add_parser("plan")
+    plan_cli.add_argument(
+        "--target",
+        type=BuildStage,
+        choices=list(BuildStage),
+        default=BuildStage.package,
+        help="last stage to plan",
+    )
+    plan_cli.add_argument("--output", type=Path, help="write the plan to this file instead of stdout")
+
     # goal: have fine-grain control to trigger (and resume!) those gentoo has:
     # pkg_pretend
     # pkg_nofetch
@@ -102,7 +119,10 @@ class Package:
     build_env: Namespace
     version: PackageVersion
     stage_functions: dict[BuildStage, BuildStep] = field(default_factory=dict)
+    stage_steps: dict[BuildStage, list[Step]] = field(default_factory=dict)
     custom_functions: dict[str, CustomFunction] = field(default_factory=dict)
+    #: runs the commands of presets setting up the package, like `dh --no-act`, and those of its builds
+    executor: Executor = field(default_factory=LocalExecutor)
 
     def __post_init__(self):
         for preset in self.presets:
@@ -125,6 +145,38 @@ class Package:
         self.stage_functions[stage] = func
         return func
 
+    def step(
+        self,
+        stage: BuildStage | str,
+        name: str | None = None,
+        after: Sequence[str] = (),
+        before: Sequence[str] = (),
+        inputs: Sequence[str] = (),
+        outputs: Sequence[str] = (),
+    ) -> Callable[[BuildStep], BuildStep]:
+        """
+        decorator to register a named step of a stage, run alongside the stage function
+        or the preset's steps, and scheduled by its dependencies on the other steps.
+        `inputs` and `outputs` are globs relative to the source dir: a step with inputs is skipped
+        while they are unchanged since its last run and all outputs exist.
+
+        usage in debian/rules.py:
+
+        pkg = package(preset=dh.Preset())
+        @pkg.step("build", after=["dh_auto_build"], inputs=["doc/*.rst"], outputs=["doc/_build/html"])
+        def html_docs(build: Build):
+            build.cmd("sphinx-build doc doc/_build/html")
+        """
+
+        def register(func: BuildStep) -> BuildStep:
+            step_name = name or typing.cast(FunctionType, func).__code__.co_name
+            self.stage_steps.setdefault(BuildStage(stage), []).append(
+                Step(step_name, func, tuple(after), tuple(before), tuple(inputs), tuple(outputs))
+            )
+            return func
+
+        return register
+
     def custom_function(self, func: Callable[P, R]) -> Callable[P, R]:
         """
         decorator to register a function to be callable in pack().
@@ -168,7 +220,8 @@ class Package:
             architecture_host=self.build_env.DEB_HOST_GNU_TYPE,
             parallel=multiprocessing.cpu_count(),  # TODO
             prefix=Path("/usr"),  # TODO
-            dry_run=args.dry_run,
+            dry_run=getattr(args, "dry_run", False),
+            executor=self.executor,
         )
 
         match args.operation:
@@ -177,6 +230,7 @@ class Package:
                 cli.exit(0)
             case "clean":
                 # undo whatever "build" and "binary" did
+                build.full_clean = True
                 build.run(BuildStage.clean)
             case "build":
                 # configure and compile
@@ -200,6 +254,16 @@ class Package:
                 # non-architecture specific binary package(s)
                 build.filter_packages(PackageFilter.architecture_independent)
                 build.run(BuildStage.package)
+            case "plan":
+                # the build's own output would garble the plan
+                with contextlib.redirect_stdout(sys.stderr):
+                    build_plan = plan(build, args.target)
+                plan_json = json.dumps(build_plan, indent=2)
+                if args.output:
+                    args.output.write_text(f"{plan_json}\n")
+                else:
+                    # `package()` diverted sys.stdout to stderr for the whole plan invocation
+                    print(plan_json, file=sys.__stdout__, flush=True)
             case None:
                 cli.print_help()
                 cli.exit()
@@ -229,6 +293,14 @@ def package(
 
     disable_output_buffer()
 
+    # `rules.py plan` only prints the plan's JSON to stdout,
+    # the output of the commands run to set up the package and plan the build goes to stderr.
+    # the package's commands are recorded to list them as probes of the plan.
+    planning = sys.argv[1:2] == ["plan"]
+    if planning:
+        sys.stdout = sys.stderr
+    executor = RecordingExecutor(probe_executor=LocalExecutor()) if planning else LocalExecutor()
+
     # get our function caller's file directory
     rules_file = find_rules_file()
 
@@ -251,5 +323,6 @@ def package(
         presets=presets,
         build_env=Namespace(**env),
         version=version,
+        executor=executor,
     )
     return pkg
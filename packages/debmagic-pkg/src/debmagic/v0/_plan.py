@@ -0,0 +1,108 @@
+"""
+the build plan: what a build up to a stage would run, without running it.
+
+the stages are resolved like `Build.run` does, and each step runs in dry-run mode
+with a recording executor, collecting the commands it would issue.
+read-only probes the presets need to decide, like `make -pq` or `dh --no-act`, are still run.
+
+costs are the durations of the steps in the last build of the package, if there was one.
+"""
+
+from __future__ import annotations
+
+import os
+import typing
+
+from debmagic.common.executor import CommandCall, RecordingExecutor
+
+from ._build_stage import BuildStage
+from ._steps import StepDurations
+
+if typing.TYPE_CHECKING:
+    from ._build import Build
+
+PLAN_VERSION = 1
+
+
+def plan(build: Build, target_stage: BuildStage) -> dict:
+    durations = StepDurations.load(build.package.source_package.name)
+    if isinstance(build.executor, RecordingExecutor) and build.executor.probe_executor is not None:
+        # `rules.py plan`: the probes of setting up the package, like `dh --no-act`, are already recorded
+        recorder = build.executor
+    else:
+        recorder = RecordingExecutor(probe_executor=build.executor)
+    previous = (build.executor, build.dry_run)
+    build.executor, build.dry_run = recorder, True
+    try:
+        stages: list[dict] = []
+        for stage in BuildStage:
+            if build.is_stage_completed(stage):
+                stages.append({"stage": str(stage), "completed": True})
+            else:
+                stages.append(_plan_stage(build, stage, recorder, durations))
+            if stage == target_stage:
+                break
+    finally:
+        build.executor, build.dry_run = previous
+
+    known = [stage["estimated_seconds"] for stage in stages if stage.get("estimated_seconds") is not None]
+    return {
+        "version": PLAN_VERSION,
+        "source": build.package.source_package.name,
+        "target": str(target_stage),
+        "packages": [pkg.name for pkg in build.binary_packages],
+        "parallel": build.parallel,
+        "stages": stages,
+        "probes": [_command(call) for call in recorder.probes],
+        "estimated_seconds": round(sum(known), 3) if known else None,
+        "cost_complete": all(step["cost"] is not None for stage in stages for step in stage.get("steps", [])),
+    }
+
+
+def _plan_stage(build: Build, stage: BuildStage, recorder: RecordingExecutor, durations: StepDurations) -> dict:
+    graph, provider = build.stage_steps(stage)
+    if not graph.steps:
+        raise RuntimeError(f"{stage!s} stage would never be executed")
+
+    dependencies = graph.dependencies()
+    steps: list[dict] = []
+    costs: dict[str, float] = {}
+    for name in graph.order():
+        step = graph.steps[name]
+        up_to_date = graph.is_up_to_date(build, step)
+        first_call = len(recorder.calls)
+        if not up_to_date:
+            step.func(build)
+        cost = 0.0 if up_to_date else durations.get(stage, name)
+        if cost is not None:
+            costs[name] = cost
+        steps.append(
+            {
+                "name": name,
+                "after": sorted(dependencies[name]),
+                "up_to_date": up_to_date,
+                "commands": [_command(call) for call in recorder.calls[first_call:]],
+                "cost": cost,
+            }
+        )
+
+    return {
+        "stage": str(stage),
+        "provider": provider,
+        "steps": steps,
+        # independent steps run concurrently, so the stage takes as long as its longest chain
+        "estimated_seconds": round(graph.critical_path(costs), 3) if costs else None,
+    }
+
+
+def _command(call: CommandCall) -> dict:
+    env: dict[str, str | None] = {}
+    if call.env is not None:
+        env = {name: value for name, value in call.env.items() if os.environ.get(name) != value}
+        env.update({name: None for name in os.environ if name not in call.env})
+    return {
+        "argv": call.argv,
+        "shell": bool(call.options.get("shell")),
+        "cwd": str(call.cwd) if call.cwd is not None else None,
+        "env": env,
+    }
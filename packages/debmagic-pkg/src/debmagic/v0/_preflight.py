@@ -0,0 +1,146 @@
+"""
+fast checks before a build runs, so mistakes in debian/rules.py and the packaging files
+fail right away instead of after the expensive stages.
+
+nothing is built: the rules file's functions, the presets and the files in debian/ are inspected,
+and the tools the presets need are looked up on PATH.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import inspect
+import io
+import re
+import shutil
+import time
+import typing
+from collections.abc import Callable
+
+from ._build import BuildError
+from ._build_stage import BuildStage
+
+if typing.TYPE_CHECKING:
+    from ._build import Build
+    from ._preset import Preset
+
+# debian policy 5.6.7
+_PACKAGE_NAME = re.compile(r"^[a-z0-9][a-z0-9+.-]+$")
+# directories in debian/ debhelper uses itself
+_RESERVED_INSTALL_DIRS = ("tmp", ".debhelper", ".debmagic")
+
+
+def preflight(build: Build, target_stage: BuildStage | None = None) -> None:
+    """
+    check everything the stages up to `target_stage` need, before running any of them.
+    raises BuildError listing all problems found.
+    """
+    stages = [stage for stage in _stages_until(target_stage) if not build.is_stage_completed(stage)]
+    if not stages:
+        return
+
+    start = time.monotonic()
+    problems: list[str] = []
+    presets: list[Preset] = []
+    for stage in stages:
+        problems.extend(_check_stage(build, stage, presets))
+    for preset in presets:
+        problems.extend(preset.preflight(build))
+    problems.extend(_check_tools(build, presets))
+    problems.extend(_check_install_dirs(build))
+    problems.extend(_check_custom_functions(build))
+
+    if problems:
+        raise BuildError("preflight check failed:\n" + "\n".join(f"  {problem}" for problem in problems))
+    print(f"debmagic: preflight checks passed in {time.monotonic() - start:.2f}s")
+
+
+def check_build_step(func: Callable, what: str, build: Build) -> str | None:
+    """
+    the problem if `func` can't be called with the build as its only argument
+    """
+    try:
+        inspect.signature(func).bind(build)
+    except TypeError as exc:
+        return f"{what} can't be called with the build: {exc}"
+    except ValueError:
+        # no signature available, e.g. for builtins
+        pass
+    return None
+
+
+def _stages_until(target_stage: BuildStage | None) -> list[BuildStage]:
+    stages: list[BuildStage] = []
+    for stage in BuildStage:
+        stages.append(stage)
+        if stage == target_stage:
+            break
+    return stages
+
+
+def _check_stage(build: Build, stage: BuildStage, presets: list[Preset]) -> list[str]:
+    """
+    the stage's steps resolve, and their functions accept the build.
+    the preset providing the stage is added to `presets`.
+    """
+    if stage not in build.package.stage_functions:
+        provider = next((preset for preset in build.package.presets if preset.get_stage(stage)), None)
+        if provider is not None and provider not in presets:
+            presets.append(provider)
+
+    try:
+        # the step resolution's progress output belongs to the actual run
+        with contextlib.redirect_stdout(io.StringIO()):
+            graph, _ = build.stage_steps(stage)
+        graph.order()
+    except ValueError as exc:
+        return [f"{stage} stage: {exc}"]
+    if not graph.steps:
+        return [f"{stage} stage is provided by neither the rules file nor a preset"]
+
+    problems: list[str] = []
+    for step in graph.steps.values():
+        if problem := check_build_step(step.func, f"{stage} step {step.name!r}", build):
+            problems.append(problem)
+    return problems
+
+
+def _check_tools(build: Build, presets: list[Preset]) -> list[str]:
+    required: dict[str, list[str]] = {}
+    for preset in presets:
+        for tool in preset.required_tools(build):
+            required.setdefault(tool, []).append(f"{type(preset).__module__}.{type(preset).__qualname__}")
+
+    return [
+        f"{tool!r} is not on PATH, but required by {', '.join(users)}"
+        for tool, users in required.items()
+        if shutil.which(tool) is None
+    ]
+
+
+def _check_install_dirs(build: Build) -> list[str]:
+    if not build.install_base_dir.is_dir():
+        return [f"install base dir {build.install_base_dir} doesn't exist"]
+
+    problems: list[str] = []
+    for pkg_name, install_dir in build.install_dirs.items():
+        if not _PACKAGE_NAME.match(pkg_name) or pkg_name in _RESERVED_INSTALL_DIRS:
+            problems.append(
+                f"binary package name {pkg_name!r} can't be used as install dir in {build.install_base_dir}"
+            )
+        elif install_dir.exists() and not install_dir.is_dir():
+            problems.append(f"install dir {install_dir} of {pkg_name} exists but is no directory")
+    return problems
+
+
+def _check_custom_functions(build: Build) -> list[str]:
+    problems: list[str] = []
+    for name, func in build.package.custom_functions.items():
+        for arg in func.args.values():
+            # argparse calls the annotation on the value, generics like `list[str]` or `int | None` don't work
+            if typing.get_origin(arg.type) is not None or not callable(arg.type):
+                problems.append(
+                    f"custom function {name!r}: annotation {arg.type!r} of argument {arg.name!r} "
+                    "can't convert command line values"
+                )
+    return problems
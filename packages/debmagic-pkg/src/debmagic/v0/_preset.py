@@ -10,6 +10,7 @@ if TYPE_CHECKING:
     from ._build import Build
     from ._build_step import BuildStep
     from ._package import Package
+    from ._steps import Step
 
 
 class Preset:
@@ -25,6 +26,26 @@ class Preset:
 
         return func
 
+    def steps(self, stage: BuildStage) -> list[Step] | None:
+        """
+        the stage's work as named steps, which rules files can add their own steps around.
+        None runs the stage function as a single step named like the stage.
+        """
+        return None
+
+    def required_tools(self, build: Build) -> list[str]:
+        """
+        the executables the preset's stages call, which have to be on PATH for the build.
+        """
+        return []
+
+    def preflight(self, build: Build) -> list[str]:
+        """
+        problems in the preset's configuration, found before any stage runs.
+        has to be fast: no commands are run, only the configuration and source tree are inspected.
+        """
+        return []
+
     def initialize(self, src_pkg: Package) -> None:
         """
         usually called when a Preset is set as preset to a SourcePackage.
@@ -0,0 +1,56 @@
+"""
+stamp files to remember the inputs of a previous step execution,
+so we can skip that step when nothing changed.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Iterable
+
+
+def fingerprint(*values: str, files: Iterable[Path] = ()) -> str:
+    """
+    hash the given values and the contents of the given files.
+    missing files are hashed as missing, so their creation changes the fingerprint.
+    """
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update(value.encode())
+        digest.update(b"\0")
+
+    for file in sorted(files):
+        digest.update(str(file).encode())
+        digest.update(b"\0")
+        try:
+            with file.open("rb") as fd:
+                while chunk := fd.read(1 << 20):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            digest.update(b"<missing>")
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+class Stamp:
+    """
+    a stamp file, storing the fingerprint of the last successful run.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def matches(self, digest: str) -> bool:
+        try:
+            return self.path.read_text().strip() == digest
+        except FileNotFoundError:
+            return False
+
+    def write(self, digest: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_path.write_text(f"{digest}\n")
+        tmp_path.replace(self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,227 @@
+"""
+named steps within a build stage, scheduled by their dependencies.
+
+independent steps run concurrently, and steps declaring their input files are skipped
+while those are unchanged and their outputs exist.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+import typing
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+
+from ._cache import cache_dir
+from ._stamp import Stamp, fingerprint
+
+if typing.TYPE_CHECKING:
+    from ._build import Build
+    from ._build_stage import BuildStage
+    from ._build_step import BuildStep
+
+
+@dataclass
+class Step:
+    name: str
+    func: BuildStep
+    #: names of the steps this one runs after
+    after: tuple[str, ...] = ()
+    #: names of the steps this one runs before
+    before: tuple[str, ...] = ()
+    #: globs of the files the step reads, relative to the source dir.
+    #: only steps with inputs are skipped when nothing changed.
+    inputs: tuple[str, ...] = ()
+    #: globs of the files the step creates, relative to the source dir.
+    #: the step is run again if one of them matches nothing.
+    outputs: tuple[str, ...] = ()
+
+
+class StepGraph:
+    """
+    the steps of one stage
+    """
+
+    def __init__(self, stage: BuildStage):
+        self.stage = stage
+        self.steps: dict[str, Step] = {}
+
+    def add(self, step: Step) -> None:
+        if step.name in self.steps:
+            raise ValueError(f"{self.stage} stage already has a step {step.name!r}")
+        self.steps[step.name] = step
+
+    def dependencies(self) -> dict[str, set[str]]:
+        """
+        the steps each step has to wait for
+        """
+        dependencies: dict[str, set[str]] = {name: set() for name in self.steps}
+        for step in self.steps.values():
+            for other in (*step.after, *step.before):
+                if other not in self.steps:
+                    raise ValueError(
+                        f"step {step.name!r} refers to unknown step {other!r} of the {self.stage} stage, "
+                        f"known are: {', '.join(self.steps)}"
+                    )
+            dependencies[step.name].update(step.after)
+            for other in step.before:
+                dependencies[other].add(step.name)
+        return dependencies
+
+    def order(self) -> list[str]:
+        """
+        all steps, each after its dependencies.
+        raises ValueError for dependency cycles.
+        """
+        dependencies = self.dependencies()
+        order: list[str] = []
+        visiting: list[str] = []
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name in visiting:
+                cycle = [*visiting[visiting.index(name) :], name]
+                raise ValueError(f"steps of the {self.stage} stage depend on each other: {' -> '.join(cycle)}")
+            visiting.append(name)
+            for dependency in sorted(dependencies[name]):
+                visit(dependency)
+            visiting.pop()
+            order.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return order
+
+    def critical_path(self, durations: dict[str, float]) -> float:
+        """
+        the duration of the longest chain of dependent steps, steps without duration count as 0
+        """
+        dependencies = self.dependencies()
+        finish: dict[str, float] = {}
+        for name in self.order():
+            start = max((finish[dependency] for dependency in dependencies[name]), default=0.0)
+            finish[name] = start + durations.get(name, 0.0)
+        return max(finish.values(), default=0.0)
+
+    def run(self, build: Build, durations: StepDurations | None = None) -> None:
+        """
+        run all steps as soon as their dependencies are done, at most `build.parallel` at a time.
+        a step with nothing to run in parallel runs on the calling thread.
+        after a step failed, no further steps are started, and its exception is raised.
+        the durations of the steps which ran are recorded in `durations`.
+        """
+        order = self.order()
+        dependencies = self.dependencies()
+        done: set[str] = set()
+        pending = list(order)
+        running: dict[Future[None], str] = {}
+        error: BaseException | None = None
+
+        with ThreadPoolExecutor(max_workers=max(1, build.parallel), thread_name_prefix="debmagic-step") as pool:
+            while pending or running:
+                ready = [name for name in pending if dependencies[name] <= done] if error is None else []
+                if len(ready) == 1 and not running:
+                    pending.remove(ready[0])
+                    self._run_step(build, self.steps[ready[0]], durations)
+                    done.add(ready[0])
+                    continue
+
+                for name in ready[: max(0, build.parallel - len(running))]:
+                    pending.remove(name)
+                    running[pool.submit(self._run_step, build, self.steps[name], durations)] = name
+
+                if not running:
+                    # a failed step stopped the scheduling
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if (exc := future.exception()) is not None:
+                        error = error or exc
+                    else:
+                        done.add(name)
+
+        if error is not None:
+            raise error
+
+    def is_up_to_date(self, build: Build, step: Step) -> bool:
+        """
+        whether the step declares inputs, they are unchanged since its last run, and its outputs exist
+        """
+        if not step.inputs:
+            return False
+        outputs_exist = all(any(build.source_dir.glob(pattern)) for pattern in step.outputs)
+        return outputs_exist and self._stamp(build, step).matches(self._digest(build, step))
+
+    def _run_step(self, build: Build, step: Step, durations: StepDurations | None) -> None:
+        if self.is_up_to_date(build, step):
+            print(f"debmagic:   step {step.name}: inputs are unchanged, skipping")
+            return
+
+        stamp = self._stamp(build, step)
+        # the inputs are hashed before running, changes made by the step itself cause a rerun
+        digest = self._digest(build, step) if step.inputs else None
+        stamp.remove()
+
+        print(f"debmagic:   step {step.name}")
+        start = time.monotonic()
+        step.func(build)
+        if build.dry_run:
+            return
+        if digest is not None:
+            stamp.write(digest)
+        if durations is not None:
+            durations.record(self.stage, step.name, time.monotonic() - start)
+
+    def _stamp(self, build: Build, step: Step) -> Stamp:
+        return Stamp(build.stamp_dir / "steps" / str(self.stage) / f"{step.name.replace('/', '_')}.stamp")
+
+    def _digest(self, build: Build, step: Step) -> str:
+        return fingerprint(step.name, *step.inputs, *step.outputs, files=_expand(build.source_dir, step.inputs))
+
+
+class StepDurations:
+    """
+    how long each step of a source package took when it last ran,
+    kept in debmagic's cache since the build state is removed when cleaning.
+    """
+
+    def __init__(self, path: Path, durations: dict[str, float]):
+        self.path = path
+        self._durations = durations
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, source_name: str) -> Self:
+        path = cache_dir("step-durations") / f"{source_name}.json"
+        try:
+            durations = json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            durations = {}
+        return cls(path, durations)
+
+    def get(self, stage: BuildStage, name: str) -> float | None:
+        return self._durations.get(f"{stage}/{name}")
+
+    def record(self, stage: BuildStage, name: str, seconds: float) -> None:
+        with self._lock:
+            self._durations[f"{stage}/{name}"] = round(seconds, 3)
+
+    def save(self) -> None:
+        with self._lock:
+            data = json.dumps(self._durations, indent=1, sort_keys=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_path.write_text(data)
+        tmp_path.replace(self.path)
+
+
+def _expand(base_dir: Path, patterns: tuple[str, ...]) -> set[Path]:
+    files: set[Path] = set()
+    for pattern in patterns:
+        files.update(path for path in base_dir.glob(pattern) if path.is_file())
+    return files
@@ -0,0 +1,142 @@
+"""
+collect test results and write them as JUnit XML and JSON reports.
+"""
+
+import json
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from debmagic.common.test_timer import DURATION_FIELD
+
+# automake test results which make the test suite fail
+FAILED_RESULTS = {"FAIL", "XPASS", "ERROR"}
+
+
+@dataclass
+class CheckResult:
+    name: str
+    #: automake result: PASS, FAIL, XFAIL, XPASS, SKIP or ERROR
+    result: str
+    duration: float | None = None
+    log_file: Path | None = None
+    #: how often the test was run until this result
+    attempts: int = 1
+
+    @property
+    def failed(self) -> bool:
+        return self.result in FAILED_RESULTS
+
+    @property
+    def flaky(self) -> bool:
+        return self.attempts > 1 and not self.failed
+
+
+@dataclass
+class CheckReport:
+    results: dict[str, CheckResult] = field(default_factory=dict)
+
+    @property
+    def failed(self) -> list[CheckResult]:
+        return [result for result in self.results.values() if result.failed]
+
+    def update(self, results: list[CheckResult]) -> None:
+        """add results of a (re-)run, counting the attempts of rerun tests"""
+        for result in results:
+            if previous := self.results.get(result.name):
+                result.attempts = previous.attempts + 1
+            self.results[result.name] = result
+
+    def summary(self) -> str:
+        counts: dict[str, int] = {}
+        for result in self.results.values():
+            counts[result.result] = counts.get(result.result, 0) + 1
+        flaky = sum(1 for result in self.results.values() if result.flaky)
+        parts = [f"{count} {name}" for name, count in sorted(counts.items())]
+        if flaky:
+            parts.append(f"{flaky} flaky")
+        return f"{len(self.results)} tests: {', '.join(parts)}"
+
+    def write_json(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = [
+            {**asdict(result), "log_file": str(result.log_file) if result.log_file else None}
+            for result in sorted(self.results.values(), key=lambda result: result.name)
+        ]
+        path.write_text(json.dumps(data, indent=2) + "\n")
+
+    def write_junit(self, path: Path, suite_name: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        results = sorted(self.results.values(), key=lambda result: result.name)
+        suite = ET.Element(
+            "testsuite",
+            name=suite_name,
+            tests=str(len(results)),
+            failures=str(sum(1 for result in results if result.result in {"FAIL", "XPASS"})),
+            errors=str(sum(1 for result in results if result.result == "ERROR")),
+            skipped=str(sum(1 for result in results if result.result == "SKIP")),
+            time=f"{sum(result.duration or 0 for result in results):.3f}",
+        )
+        for result in results:
+            case = ET.SubElement(suite, "testcase", name=result.name, classname=suite_name)
+            if result.duration is not None:
+                case.set("time", f"{result.duration:.3f}")
+            match result.result:
+                case "FAIL" | "XPASS":
+                    ET.SubElement(case, "failure", message=result.result)
+                case "ERROR":
+                    ET.SubElement(case, "error", message=result.result)
+                case "SKIP":
+                    ET.SubElement(case, "skipped")
+            if result.attempts > 1:
+                ET.SubElement(case, "system-out").text = f"attempts: {result.attempts}"
+
+        ET.indent(suite)
+        ET.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def parse_trs(trs_file: Path, base_dir: Path) -> CheckResult:
+    """
+    read an automake parallel-tests result file (`<test>.trs`)
+    """
+    results: list[str] = []
+    global_result: str | None = None
+    duration: float | None = None
+
+    for line in trs_file.read_text(errors="replace").splitlines():
+        field_name, _, value = line.partition(" ")
+        value = value.strip()
+        match field_name:
+            case ":test-result:":
+                results.append(value.split()[0] if value else "ERROR")
+            case ":global-test-result:":
+                global_result = value.split()[0] if value else None
+            case _ if field_name == DURATION_FIELD:
+                duration = float(value)
+
+    if global_result is None:
+        # tap tests have one result per test point
+        global_result = next((result for result in results if result in FAILED_RESULTS), None)
+        global_result = global_result or (results[0] if results else "ERROR")
+
+    log_file = trs_file.with_suffix(".log")
+    return CheckResult(
+        name=str(trs_file.relative_to(base_dir).with_suffix("")),
+        result=global_result,
+        duration=duration,
+        log_file=log_file if log_file.is_file() else None,
+    )
+
+
+def collect_automake_results(base_dir: Path) -> list[CheckResult]:
+    """
+    find all test result files below base_dir
+    """
+    results: list[CheckResult] = []
+    for dirpath, dirnames, filenames in os.walk(base_dir):
+        dirnames[:] = [name for name in dirnames if name not in {".git", "debian"}]
+        for filename in filenames:
+            if filename.endswith(".trs"):
+                results.append(parse_trs(Path(dirpath, filename), base_dir))
+    return results
@@ -0,0 +1,31 @@
+"""
+build many interdependent source packages: the order follows their Build-Depends on each other,
+independent ones are built concurrently, and each build can use the packages built before it
+through a local repository.
+
+```
+python -m debmagic.world --jobs 8 --world-dir _world src/foo src/libfoo ...
+```
+
+the builds can also run on other machines, see `debmagic.world.worker`.
+"""
+
+from ._builder import DEFAULT_BUILD_CMD, Builder, LocalBuilder
+from ._graph import BuildGraph, WorldError, WorldPackage
+from ._remote import RemoteBuilder
+from ._repo import LocalRepository
+from ._world import PackageStatus, World, build_world
+
+__all__ = [
+    "DEFAULT_BUILD_CMD",
+    "BuildGraph",
+    "Builder",
+    "LocalBuilder",
+    "LocalRepository",
+    "PackageStatus",
+    "RemoteBuilder",
+    "World",
+    "WorldError",
+    "WorldPackage",
+    "build_world",
+]
@@ -0,0 +1,78 @@
+import argparse
+import multiprocessing
+import shlex
+import sys
+from pathlib import Path
+
+from debmagic.common.utils import disable_output_buffer
+
+from ._builder import DEFAULT_BUILD_CMD
+from ._graph import WorldError
+from ._remote import RemoteBuilder
+from ._world import World
+
+
+def main(argv: list[str] | None = None) -> int:
+    cli = argparse.ArgumentParser(
+        prog="python -m debmagic.world",
+        description="build source packages in the order of their build dependencies",
+    )
+    cli.add_argument("source_dirs", nargs="+", type=Path, help="source trees containing debian/")
+    cli.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=max(1, multiprocessing.cpu_count() // 4),
+        help="how many packages to build concurrently",
+    )
+    cli.add_argument(
+        "--world-dir",
+        type=Path,
+        default=Path("debmagic-world"),
+        help="where to keep the local repository, build logs and state",
+    )
+    cli.add_argument(
+        "--build-cmd",
+        default=shlex.join(DEFAULT_BUILD_CMD),
+        help="command to build one source tree. {source_dir}, {repo} and {apt_source} are replaced",
+    )
+    cli.add_argument(
+        "--worker",
+        dest="workers",
+        action="append",
+        metavar="ADDRESS",
+        help="build on a `python -m debmagic.world.worker` at unix:<path> or <host>:<port> instead of locally. "
+        "can be given several times, --jobs is ignored then",
+    )
+    cli.add_argument(
+        "--worker-token-file",
+        type=Path,
+        help="file containing the token the workers were started with",
+    )
+    cli.add_argument("--rebuild", action="store_true", help="don't reuse the results of a previous run")
+    cli.add_argument("--status", action="store_true", help="only show the status table")
+    args = cli.parse_args(argv)
+
+    disable_output_buffer()
+    try:
+        token = args.worker_token_file.read_text().strip() if args.worker_token_file else None
+        builder = RemoteBuilder(args.workers, args.world_dir / "incoming", token=token) if args.workers else None
+        world = World(
+            args.source_dirs,
+            args.world_dir,
+            jobs=args.jobs,
+            build_cmd=shlex.split(args.build_cmd),
+            rebuild=args.rebuild,
+            builder=builder,
+        )
+        if args.status:
+            print(world.status_table())
+            return 0
+        return 0 if world.build() else 1
+    except WorldError as exc:
+        print(f"debmagic: world: {exc}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
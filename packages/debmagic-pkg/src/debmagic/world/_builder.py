@@ -0,0 +1,81 @@
+import os
+import subprocess
+from pathlib import Path
+from typing import BinaryIO
+
+from debian import deb822
+
+from ._graph import WorldError, WorldPackage
+from ._repo import LocalRepository, apt_source
+
+#: how each source tree is built. `{source_dir}`, `{repo}` and `{apt_source}` are replaced.
+#: the default doesn't use the local repository, it only builds worlds without dependencies between the sources.
+DEFAULT_BUILD_CMD = ["dpkg-buildpackage", "--unsigned-source", "--unsigned-changes", "--build=binary"]
+
+#: environment variables passed on to remote builds
+BUILD_OPTION_VARS = ("DEB_BUILD_OPTIONS", "DEB_BUILD_PROFILES")
+
+
+class Builder:
+    """
+    where and how source trees are built
+    """
+
+    #: how many builds can run at the same time
+    capacity: int = 1
+
+    def build(self, package: WorldPackage, build_cmd: list[str], repo: LocalRepository, log: BinaryIO) -> list[Path]:
+        """
+        build the package, writing the build output to log. returns the built .debs.
+        """
+        raise NotImplementedError()
+
+
+class LocalBuilder(Builder):
+    def __init__(self, capacity: int = 1):
+        self.capacity = capacity
+
+    def build(self, package: WorldPackage, build_cmd: list[str], repo: LocalRepository, log: BinaryIO) -> list[Path]:
+        returncode = run_build(package.source_dir, build_cmd, repo.path, log, dict(os.environ))
+        if returncode != 0:
+            raise WorldError(f"build failed with exit code {returncode}")
+        return built_debs(package)
+
+
+def run_build(source_dir: Path, build_cmd: list[str], repo_path: Path, log: BinaryIO, env: dict[str, str]) -> int:
+    replacements = {"source_dir": str(source_dir), "repo": str(repo_path), "apt_source": apt_source(repo_path)}
+    cmd = [arg.format(**replacements) for arg in build_cmd]
+    log.write(f"$ {' '.join(cmd)}\n".encode())
+    log.flush()
+    proc = subprocess.run(
+        cmd,
+        cwd=source_dir,
+        env={**env, "DEBMAGIC_WORLD_REPO": str(repo_path)},
+        stdout=log,
+        stderr=subprocess.STDOUT,
+        check=False,
+    )
+    return proc.returncode
+
+
+def built_debs(package: WorldPackage) -> list[Path]:
+    """
+    the packages listed in the newest .changes file dpkg-buildpackage wrote next to the source tree
+    """
+    version = package.version.partition(":")[2] or package.version
+    changes_files = sorted(
+        package.source_dir.parent.glob(f"{package.name}_{version}_*.changes"),
+        key=lambda path: path.stat().st_mtime,
+    )
+    if not changes_files:
+        raise WorldError(f"no {package.name}_{version}_*.changes file in {package.source_dir.parent}")
+
+    changes = deb822.Changes(changes_files[-1].read_text())
+    debs = [
+        changes_files[-1].parent / entry["name"]
+        for entry in changes["Files"]
+        if entry["name"].endswith((".deb", ".udeb"))
+    ]
+    if not debs:
+        raise WorldError(f"{changes_files[-1]} lists no packages")
+    return debs
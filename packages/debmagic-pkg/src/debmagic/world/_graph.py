@@ -0,0 +1,136 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Self
+
+from debmagic.common.errors import DebmagicError
+from debmagic.common.package import SourcePackage
+
+from debian import deb822
+
+
+class WorldError(DebmagicError):
+    pass
+
+
+@dataclass
+class WorldPackage:
+    source: SourcePackage
+    source_dir: Path
+
+    @classmethod
+    def from_source_dir(cls, source_dir: Path) -> Self:
+        return cls(SourcePackage.from_debian_directory(source_dir / "debian"), source_dir)
+
+    @property
+    def name(self) -> str:
+        return self.source.name
+
+    @property
+    def version(self) -> str:
+        return self.source.version
+
+    def provides(self) -> set[str]:
+        """
+        names of the binary packages, and what they provide
+        """
+        names: set[str] = set()
+        for binary_package in self.source.binary_packages:
+            names.add(binary_package.name)
+            if provides := binary_package.ctrl.get("Provides"):
+                for alternatives in deb822.PkgRelation.parse_relations(provides):
+                    names.update(relation["name"] for relation in alternatives)
+        return names
+
+
+@dataclass
+class BuildGraph:
+    """
+    the source packages to build, and which of them build-depend on which.
+    """
+
+    packages: dict[str, WorldPackage]
+    #: source name -> names of the sources it build-depends on
+    dependencies: dict[str, set[str]]
+    #: source name -> names of the sources build-depending on it
+    dependents: dict[str, set[str]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.dependents = {name: set() for name in self.packages}
+        for name, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                self.dependents[dependency].add(name)
+
+    @classmethod
+    def from_packages(cls, packages: list[WorldPackage]) -> Self:
+        by_name: dict[str, WorldPackage] = {}
+        providers: dict[str, set[str]] = {}
+        for package in packages:
+            if package.name in by_name:
+                raise WorldError(
+                    f"source {package.name!r} is in both {by_name[package.name].source_dir} and {package.source_dir}"
+                )
+            by_name[package.name] = package
+            for provided in package.provides():
+                providers.setdefault(provided, set()).add(package.name)
+
+        dependencies: dict[str, set[str]] = {}
+        for package in packages:
+            # any world package satisfying an alternative has to be built first
+            dependencies[package.name] = {
+                provider
+                for alternatives in package.source.build_depends
+                for relation in alternatives
+                for provider in providers.get(relation["name"], ())
+                if provider != package.name
+            }
+
+        graph = cls(by_name, dependencies)
+        graph.check_acyclic()
+        return graph
+
+    def check_acyclic(self) -> None:
+        """
+        raise a WorldError naming a dependency cycle, if there is one.
+        """
+        state: dict[str, str] = {}
+
+        def visit(name: str, path: list[str]) -> None:
+            state[name] = "visiting"
+            for dependency in sorted(self.dependencies[name]):
+                if state.get(dependency) == "visiting":
+                    cycle = [*path[path.index(dependency) :], dependency]
+                    raise WorldError(f"build dependency cycle: {' -> '.join(cycle)}")
+                if dependency not in state:
+                    visit(dependency, [*path, dependency])
+            state[name] = "done"
+
+        for name in sorted(self.packages):
+            if name not in state:
+                visit(name, [name])
+
+    def topological_order(self) -> list[str]:
+        """
+        sources sorted so each comes after all its build dependencies.
+        """
+        order: list[str] = []
+        remaining = {name: len(dependencies) for name, dependencies in self.dependencies.items()}
+        ready = sorted(name for name, count in remaining.items() if count == 0)
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for dependent in sorted(self.dependents[name]):
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        return order
+
+    def critical_path(self, durations: dict[str, float], default_duration: float = 1.0) -> dict[str, float]:
+        """
+        for each source: its own duration plus the longest chain of builds that has to wait for it.
+        building the sources with the highest values first shortens the whole build the most.
+        """
+        lengths: dict[str, float] = {}
+        for name in reversed(self.topological_order()):
+            downstream = max((lengths[dependent] for dependent in self.dependents[name]), default=0.0)
+            lengths[name] = durations.get(name, default_duration) + downstream
+        return lengths
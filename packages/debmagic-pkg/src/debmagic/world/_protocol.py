@@ -0,0 +1,182 @@
+"""
+the protocol between the world coordinator and its remote workers.
+
+each message is a JSON object prefixed by its length (4 bytes, big endian).
+messages with a `size` are followed by that many bytes of payload.
+
+a job connection goes like this:
+
+- coordinator: `job` with the manifests of the source tree and the local repository
+- worker: `need` listing the blobs (by sha256) it doesn't have cached yet
+- coordinator: one `blob` per needed file
+- worker: `log` messages while building, one `artifact` per built package, then `result`
+
+a `hello` message is answered with the worker's capacity.
+workers started with a token only accept `hello` and `job` messages carrying it,
+others are answered with `denied`.
+
+builds can be silent for a long time, so reads don't time out.
+instead, TCP keepalive probes detect a peer that went away without closing the connection.
+"""
+
+import json
+import os
+import socket
+import stat
+import struct
+import threading
+from pathlib import Path
+from typing import Protocol
+
+from debmagic.common.hashing import hash_file
+
+PROTOCOL_VERSION = 2
+
+_LENGTH = struct.Struct(">I")
+_CHUNK_SIZE = 1 << 20
+
+# the connection is dropped after 60s + 6 * 10s of silence from the peer's kernel
+_KEEPALIVE_IDLE = 60
+_KEEPALIVE_INTERVAL = 10
+_KEEPALIVE_COUNT = 6
+
+
+class ProtocolError(ConnectionError):
+    pass
+
+
+class Writable(Protocol):
+    def write(self, data: bytes, /) -> object: ...
+
+
+def connect(address: str, timeout: float | None = None) -> socket.socket:
+    """
+    connect to `unix:<path>` or `<host>:<port>`
+    """
+    if address.startswith("unix:"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(address.removeprefix("unix:"))
+        sock.settimeout(None)
+        return sock
+    host, _, port = address.rpartition(":")
+    sock = socket.create_connection((host.strip("[]"), int(port)), timeout=timeout)
+    sock.settimeout(None)
+    return sock
+
+
+def listen(address: str) -> socket.socket:
+    if address.startswith("unix:"):
+        path = Path(address.removeprefix("unix:"))
+        path.unlink(missing_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(str(path))
+        # only for the user running the worker, others would be able to run commands as them
+        path.chmod(0o600)
+    else:
+        host, _, port = address.rpartition(":")
+        sock = socket.create_server((host.strip("[]"), int(port)), reuse_port=False)
+    sock.listen()
+    return sock
+
+
+def _enable_keepalive(sock: socket.socket) -> None:
+    if sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # not available on all platforms, the system's defaults apply there
+    for option, value in (
+        ("TCP_KEEPIDLE", _KEEPALIVE_IDLE),
+        ("TCP_KEEPINTVL", _KEEPALIVE_INTERVAL),
+        ("TCP_KEEPCNT", _KEEPALIVE_COUNT),
+    ):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+class Connection:
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        _enable_keepalive(sock)
+        self._rfile = sock.makefile("rb")
+        self._wfile = sock.makefile("wb")
+        # log messages are sent from another thread
+        self._send_lock = threading.Lock()
+
+    def send(self, message: dict, payload: bytes | Path | None = None) -> None:
+        data = json.dumps(message).encode()
+        with self._send_lock:
+            self._wfile.write(_LENGTH.pack(len(data)) + data)
+            if isinstance(payload, Path):
+                with payload.open("rb") as fd:
+                    while chunk := fd.read(_CHUNK_SIZE):
+                        self._wfile.write(chunk)
+            elif payload is not None:
+                self._wfile.write(payload)
+            self._wfile.flush()
+
+    def receive(self) -> dict:
+        header = self._read(_LENGTH.size)
+        return json.loads(self._read(_LENGTH.unpack(header)[0]))
+
+    def receive_payload(self, size: int, target: Writable) -> None:
+        while size > 0:
+            chunk = self._rfile.read(min(size, _CHUNK_SIZE))
+            if not chunk:
+                raise ProtocolError("connection closed during transfer")
+            target.write(chunk)
+            size -= len(chunk)
+
+    def _read(self, size: int) -> bytes:
+        data = self._rfile.read(size)
+        if len(data) != size:
+            raise ProtocolError("connection closed")
+        return data
+
+    def close(self) -> None:
+        for closeable in (self._rfile, self._wfile, self._sock):
+            try:
+                closeable.close()
+            except OSError:
+                pass
+
+
+class ManifestCache:
+    """
+    sha256 of files, remembered by path, size, mtime and inode so unchanged files aren't hashed again.
+    """
+
+    def __init__(self):
+        self._digests: dict[tuple[str, int, int, int], str] = {}
+
+    def digest(self, path: Path, st: os.stat_result) -> str:
+        key = (str(path), st.st_size, st.st_mtime_ns, st.st_ino)
+        if (digest := self._digests.get(key)) is None:
+            digest = self._digests[key] = hash_file(path, "sha256")
+        return digest
+
+    def manifest(self, root: Path, paths: list[Path] | None = None) -> tuple[list[dict], dict[str, Path]]:
+        """
+        describe the files below root (or the given ones), without VCS metadata.
+        returns the entries and the path of each blob.
+        """
+        if paths is None:
+            paths = []
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(name for name in dirnames if name not in (".git", ".hg", ".svn"))
+                paths.extend(Path(dirpath, name) for name in sorted(filenames))
+                # symlinks to directories aren't followed
+                paths.extend(Path(dirpath, name) for name in dirnames if os.path.islink(os.path.join(dirpath, name)))
+
+        entries: list[dict] = []
+        blobs: dict[str, Path] = {}
+        for path in paths:
+            rel_path = path.relative_to(root).as_posix()
+            st = path.lstat()
+            if stat.S_ISLNK(st.st_mode):
+                entries.append({"path": rel_path, "link": os.readlink(path)})
+            elif stat.S_ISREG(st.st_mode):
+                digest = self.digest(path, st)
+                blobs[digest] = path
+                entries.append({"path": rel_path, "sha256": digest, "mode": stat.S_IMODE(st.st_mode)})
+        return entries, blobs
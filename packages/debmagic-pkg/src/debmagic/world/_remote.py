@@ -0,0 +1,179 @@
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from ._builder import BUILD_OPTION_VARS, Builder
+from ._graph import WorldError, WorldPackage
+from ._protocol import PROTOCOL_VERSION, Connection, ManifestCache, ProtocolError, connect
+from ._repo import LocalRepository
+
+
+@dataclass
+class _RemoteWorker:
+    address: str
+    capacity: int
+    running: int = 0
+    alive: bool = True
+
+
+class _WorkerBusyError(Exception):
+    pass
+
+
+class RemoteBuilder(Builder):
+    """
+    build on `python -m debmagic.world.worker` processes, each job on the worker with the most free slots.
+
+    the source tree and the local repository are sent along with each job, but only the files
+    the worker hasn't cached yet. the built packages are downloaded to `download_dir`.
+    when a worker can't be reached or drops the connection, its job is retried on another one.
+    the worker is only dropped for the rest of the run if it doesn't answer a `hello` afterwards either.
+    `token` is sent to workers that require one.
+    """
+
+    def __init__(
+        self, addresses: list[str], download_dir: Path, connect_timeout: float = 10.0, token: str | None = None
+    ):
+        self.download_dir = download_dir
+        self.connect_timeout = connect_timeout
+        self.token = token
+        self._workers: list[_RemoteWorker] = []
+        for address in addresses:
+            try:
+                capacity = self._hello(address)
+            except (OSError, ProtocolError) as exc:
+                print(f"debmagic: world: worker {address} is unavailable: {exc}")
+                continue
+            self._workers.append(_RemoteWorker(address, capacity))
+        if not self._workers:
+            raise WorldError(f"none of the workers is available: {', '.join(addresses)}")
+        self.capacity = sum(worker.capacity for worker in self._workers)
+        self._slots = threading.Condition()
+        self._manifests = ManifestCache()
+
+    def build(self, package: WorldPackage, build_cmd: list[str], repo: LocalRepository, log: BinaryIO) -> list[Path]:
+        tried: set[str] = set()
+        while True:
+            worker = self._acquire(tried)
+            busy = False
+            try:
+                log.write(f"debmagic: world: building on worker {worker.address}\n".encode())
+                log.flush()
+                return self._build_on(worker, package, build_cmd, repo, log)
+            except _WorkerBusyError:
+                # taken by someone else: try again once a slot frees up
+                busy = True
+            except (OSError, ProtocolError) as exc:
+                log.write(f"debmagic: world: worker {worker.address} failed: {exc}\n".encode())
+                log.flush()
+                print(f"debmagic: world: worker {worker.address} failed while building {package.name}: {exc}")
+                tried.add(worker.address)
+                self._probe(worker)
+            finally:
+                self._release(worker, wait=busy)
+
+    def _hello(self, address: str) -> int:
+        conn = Connection(connect(address, timeout=self.connect_timeout))
+        try:
+            conn.send({"type": "hello", "version": PROTOCOL_VERSION, "token": self.token})
+            reply = conn.receive()
+        finally:
+            conn.close()
+        if reply["type"] == "denied":
+            raise ProtocolError("the worker didn't accept the token")
+        if reply.get("version") != PROTOCOL_VERSION:
+            raise ProtocolError(f"protocol version {reply.get('version')} isn't supported")
+        return int(reply["capacity"])
+
+    def _probe(self, worker: _RemoteWorker) -> None:
+        """
+        after a failed job: keep the worker for other jobs if it's still reachable
+        """
+        try:
+            self._hello(worker.address)
+        except (OSError, ProtocolError) as exc:
+            print(f"debmagic: world: dropping worker {worker.address}: {exc}")
+            with self._slots:
+                worker.alive = False
+                self._slots.notify_all()
+
+    def _acquire(self, tried: set[str]) -> _RemoteWorker:
+        with self._slots:
+            while True:
+                candidates = [worker for worker in self._workers if worker.alive and worker.address not in tried]
+                if not candidates:
+                    raise WorldError("no worker left to build on")
+                free = [worker for worker in candidates if worker.running < worker.capacity]
+                if free:
+                    worker = max(free, key=lambda worker: worker.capacity - worker.running)
+                    worker.running += 1
+                    return worker
+                self._slots.wait()
+
+    def _release(self, worker: _RemoteWorker, wait: bool = False) -> None:
+        with self._slots:
+            worker.running -= 1
+            self._slots.notify_all()
+            if wait:
+                self._slots.wait(timeout=5)
+
+    def _build_on(
+        self, worker: _RemoteWorker, package: WorldPackage, build_cmd: list[str], repo: LocalRepository, log: BinaryIO
+    ) -> list[Path]:
+        source, source_blobs = self._manifests.manifest(package.source_dir)
+        repo_files, repo_blobs = self._manifests.manifest(repo.path, repo.files())
+        blobs = {**source_blobs, **repo_blobs}
+
+        conn = Connection(connect(worker.address, timeout=self.connect_timeout))
+        try:
+            conn.send(
+                {
+                    "type": "job",
+                    "token": self.token,
+                    "source_name": package.source_dir.name,
+                    "source": source,
+                    "repo": repo_files,
+                    "build_cmd": build_cmd,
+                    "env": {name: os.environ[name] for name in BUILD_OPTION_VARS if name in os.environ},
+                }
+            )
+            reply = conn.receive()
+            if reply["type"] == "busy":
+                raise _WorkerBusyError()
+            if reply["type"] == "denied":
+                raise ProtocolError("the worker didn't accept the token")
+            if reply["type"] != "need":
+                raise ProtocolError(f"unexpected reply {reply['type']!r}")
+            log.write(f"debmagic: world: sending {len(reply['blobs'])} of {len(blobs)} files\n".encode())
+            log.flush()
+            for digest in reply["blobs"]:
+                if (path := blobs.get(digest)) is None:
+                    raise ProtocolError(f"worker requested unknown blob {digest}")
+                conn.send({"type": "blob", "sha256": digest, "size": path.stat().st_size}, payload=path)
+
+            target_dir = self.download_dir / package.name
+            target_dir.mkdir(parents=True, exist_ok=True)
+            debs: list[Path] = []
+            while True:
+                message = conn.receive()
+                match message["type"]:
+                    case "log":
+                        conn.receive_payload(message["size"], log)
+                        log.flush()
+                    case "artifact":
+                        deb = target_dir / Path(message["name"]).name
+                        # a previous download may be hardlinked into the repository
+                        deb.unlink(missing_ok=True)
+                        with deb.open("wb") as fd:
+                            conn.receive_payload(message["size"], fd)
+                        debs.append(deb)
+                    case "result":
+                        if not message["ok"]:
+                            raise WorldError(message["error"])
+                        return debs
+                    case other:
+                        raise ProtocolError(f"unexpected message {other!r}")
+        finally:
+            conn.close()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+from ._graph import WorldError
+
+
+class LocalRepository:
+    """
+    a flat apt repository of the built packages, for the builds depending on them.
+    use it with the apt source line from `apt_source`.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        if not (self.path / "Packages").exists():
+            self._update_index()
+
+    @property
+    def apt_source(self) -> str:
+        return apt_source(self.path)
+
+    def files(self) -> list[Path]:
+        """
+        the packages and the index, e.g. to ship the repository to remote builds
+        """
+        return sorted(
+            path for path in self.path.iterdir() if path.name == "Packages" or path.suffix in (".deb", ".udeb")
+        )
+
+    def contains(self, file_names: list[str]) -> bool:
+        return all((self.path / name).is_file() for name in file_names)
+
+    def publish(self, debs: list[Path]) -> list[str]:
+        """
+        add the .debs and regenerate the package index. returns the file names in the repository.
+        """
+        names: list[str] = []
+        for deb in debs:
+            target = self.path / deb.name
+            target.unlink(missing_ok=True)
+            try:
+                os.link(deb, target)
+            except OSError:
+                shutil.copy2(deb, target)
+            names.append(deb.name)
+        self._update_index()
+        return names
+
+    def _update_index(self) -> None:
+        proc = subprocess.run(
+            ["dpkg-scanpackages", "--multiversion", "."],
+            cwd=self.path,
+            capture_output=True,
+            check=False,
+        )
+        if proc.returncode != 0:
+            raise WorldError(f"dpkg-scanpackages failed in {self.path}:\n{proc.stderr.decode(errors='replace')}")
+        tmp_file = self.path / "Packages.tmp"
+        tmp_file.write_bytes(proc.stdout)
+        tmp_file.replace(self.path / "Packages")
+
+
+def apt_source(path: Path) -> str:
+    return f"deb [trusted=yes] file:{path} ./"
@@ -0,0 +1,291 @@
+import hashlib
+import heapq
+import json
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from enum import StrEnum
+from pathlib import Path
+from typing import Self
+
+from ._builder import DEFAULT_BUILD_CMD, Builder, LocalBuilder
+from ._graph import BuildGraph, WorldError, WorldPackage
+from ._protocol import ManifestCache
+from ._repo import LocalRepository
+
+
+class PackageStatus(StrEnum):
+    waiting = "waiting"
+    building = "building"
+    done = "done"
+    up_to_date = "up-to-date"
+    """ built in a previous run, and nothing it depends on changed """
+    failed = "failed"
+    blocked = "blocked"
+    """ a build dependency failed """
+
+
+@dataclass
+class PackageState:
+    status: PackageStatus = PackageStatus.waiting
+    #: of the inputs the package was last built from
+    fingerprint: str | None = None
+    #: seconds the last successful build took
+    duration: float | None = None
+    #: file names of the built packages in the repository
+    debs: list[str] = field(default_factory=list)
+
+
+class WorldState:
+    """
+    the state of all builds, persisted after every change so an interrupted or failed run can resume.
+    """
+
+    def __init__(self, path: Path, packages: dict[str, PackageState]):
+        self.path = path
+        self.packages = packages
+
+    @classmethod
+    def load(cls, path: Path) -> Self:
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            return cls(path, {})
+        return cls(
+            path,
+            {
+                name: PackageState(
+                    status=PackageStatus(entry["status"]),
+                    fingerprint=entry["fingerprint"],
+                    duration=entry["duration"],
+                    debs=entry["debs"],
+                )
+                for name, entry in data["packages"].items()
+            },
+        )
+
+    def save(self) -> None:
+        data = {
+            "packages": {
+                name: {
+                    "status": str(state.status),
+                    "fingerprint": state.fingerprint,
+                    "duration": state.duration,
+                    "debs": state.debs,
+                }
+                for name, state in self.packages.items()
+            }
+        }
+        tmp_file = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_file.write_text(json.dumps(data, indent=1))
+        tmp_file.replace(self.path)
+
+
+@dataclass
+class _BuildResult:
+    debs: list[Path]
+    duration: float
+
+
+class World:
+    """
+    build a set of source trees in the order of their build dependencies on each other.
+    independent sources are built concurrently, those on the critical path first.
+    finished packages are published to a local repository (`<world_dir>/repo`) for the dependent builds.
+
+    the state is kept in `world_dir`: rerunning after a failure only builds what failed,
+    what changed, and what depends on those.
+    """
+
+    def __init__(
+        self,
+        source_dirs: list[Path],
+        world_dir: Path,
+        jobs: int = 1,
+        build_cmd: list[str] | None = None,
+        rebuild: bool = False,
+        builder: Builder | None = None,
+    ):
+        """
+        `jobs`: how many packages to build concurrently on this machine,
+        unless a `builder` is given, which determines the capacity.
+        """
+        self.world_dir = world_dir
+        self.world_dir.mkdir(parents=True, exist_ok=True)
+        self.log_dir = self.world_dir / "logs"
+        self.log_dir.mkdir(exist_ok=True)
+        self.builder = builder or LocalBuilder(jobs)
+        self.jobs = self.builder.capacity
+        self.build_cmd = build_cmd or DEFAULT_BUILD_CMD
+        self.rebuild = rebuild
+
+        self.graph = BuildGraph.from_packages([WorldPackage.from_source_dir(path.resolve()) for path in source_dirs])
+        self.repo = LocalRepository(self.world_dir / "repo")
+        self.state = WorldState.load(self.world_dir / "state.json")
+        self._manifests = ManifestCache()
+        self._fingerprints = {
+            name: _fingerprint(package, self._manifests) for name, package in self.graph.packages.items()
+        }
+
+    def build(self) -> bool:
+        """
+        build everything that isn't up to date. returns whether all packages were built.
+        """
+        self._check_build_cmd()
+        self._mark_up_to_date()
+        durations = {name: state.duration for name, state in self.state.packages.items() if state.duration}
+        priorities = self.graph.critical_path(durations)
+
+        ready: list[tuple[float, str]] = []
+        for name in self.graph.packages:
+            if self._status(name) == PackageStatus.waiting and self._dependencies_finished(name):
+                heapq.heappush(ready, (-priorities[name], name))
+        self._report()
+
+        running: dict[Future[_BuildResult], str] = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while ready or running:
+                while ready and len(running) < self.jobs:
+                    _, name = heapq.heappop(ready)
+                    self._set_status(name, PackageStatus.building)
+                    running[pool.submit(self._build_package, name)] = name
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        result = future.result()
+                        self._publish(name, result)
+                    except (WorldError, OSError, subprocess.SubprocessError) as exc:
+                        print(f"debmagic: world: {name} failed: {exc}")
+                        self._set_status(name, PackageStatus.failed)
+                        self._block_dependents(name)
+                        continue
+
+                    for dependent in self.graph.dependents[name]:
+                        if self._status(dependent) == PackageStatus.waiting and self._dependencies_finished(dependent):
+                            heapq.heappush(ready, (-priorities[dependent], dependent))
+                self._report()
+
+        print(self.status_table())
+        return all(self._status(name) in (PackageStatus.done, PackageStatus.up_to_date) for name in self.graph.packages)
+
+    def status_table(self) -> str:
+        rows = [("package", "version", "status", "duration", "log")]
+        for name in self.graph.topological_order():
+            state = self.state.packages.get(name, PackageState())
+            duration = f"{state.duration:.1f}s" if state.duration is not None else "-"
+            log = str(self._log_file(name)) if self._log_file(name).exists() else "-"
+            rows.append((name, self.graph.packages[name].version, str(state.status), duration, log))
+        widths = [max(len(row[idx]) for row in rows) for idx in range(len(rows[0]) - 1)]
+        return "\n".join(
+            "  ".join([*(cell.ljust(width) for cell, width in zip(row[:-1], widths, strict=True)), row[-1]])
+            for row in rows
+        )
+
+    def _check_build_cmd(self) -> None:
+        """
+        builds depending on other packages of the world need them from the local repository.
+        a command not referring to it would build against the system's packages, or fail to.
+        """
+        if any("{repo}" in arg or "{apt_source}" in arg for arg in self.build_cmd):
+            return
+        dependent = sorted(name for name, dependencies in self.graph.dependencies.items() if dependencies)
+        if dependent:
+            raise WorldError(
+                f"{', '.join(dependent)} build-depend on packages of the world, "
+                "but the build command doesn't use the local repository: pass {repo} or {apt_source} to it, "
+                "e.g. sbuild --extra-repository='{apt_source}'"
+            )
+
+    def _mark_up_to_date(self) -> None:
+        """
+        keep the results of previous runs whose inputs didn't change, and whose dependencies are kept too.
+        everything else is (re)built.
+        """
+        for name in self.graph.topological_order():
+            state = self.state.packages.setdefault(name, PackageState())
+            up_to_date = (
+                not self.rebuild
+                and state.status in (PackageStatus.done, PackageStatus.up_to_date)
+                and state.fingerprint == self._fingerprints[name]
+                and self.repo.contains(state.debs)
+                and all(
+                    self._status(dependency) == PackageStatus.up_to_date for dependency in self.graph.dependencies[name]
+                )
+            )
+            state.status = PackageStatus.up_to_date if up_to_date else PackageStatus.waiting
+        self.state.save()
+
+    def _status(self, name: str) -> PackageStatus:
+        return self.state.packages[name].status
+
+    def _set_status(self, name: str, status: PackageStatus) -> None:
+        self.state.packages[name].status = status
+        self.state.save()
+
+    def _dependencies_finished(self, name: str) -> bool:
+        return all(
+            self._status(dependency) in (PackageStatus.done, PackageStatus.up_to_date)
+            for dependency in self.graph.dependencies[name]
+        )
+
+    def _block_dependents(self, name: str) -> None:
+        for dependent in self.graph.dependents[name]:
+            if self._status(dependent) == PackageStatus.waiting:
+                self._set_status(dependent, PackageStatus.blocked)
+                self._block_dependents(dependent)
+
+    def _log_file(self, name: str) -> Path:
+        return self.log_dir / f"{name}.log"
+
+    def _build_package(self, name: str) -> _BuildResult:
+        package = self.graph.packages[name]
+        print(f"debmagic: world: building {name} {package.version}")
+        start = time.monotonic()
+        with self._log_file(name).open("wb") as log:
+            try:
+                debs = self.builder.build(package, self.build_cmd, self.repo, log)
+            except WorldError as exc:
+                raise WorldError(f"{exc}, see {self._log_file(name)}") from exc
+        return _BuildResult(debs, time.monotonic() - start)
+
+    def _publish(self, name: str, result: _BuildResult) -> None:
+        state = self.state.packages[name]
+        state.debs = self.repo.publish(result.debs)
+        state.duration = result.duration
+        # the build leaves its outputs in the source tree, they must not cause a rebuild next time
+        state.fingerprint = _fingerprint(self.graph.packages[name], self._manifests)
+        print(f"debmagic: world: {name} done in {result.duration:.1f}s, published {len(result.debs)} packages")
+        self._set_status(name, PackageStatus.done)
+
+    def _report(self) -> None:
+        counts: dict[PackageStatus, int] = {}
+        for name in self.graph.packages:
+            state = self.state.packages[name]
+            counts[state.status] = counts.get(state.status, 0) + 1
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        print(f"debmagic: world: {summary}")
+        (self.world_dir / "status.txt").write_text(self.status_table() + "\n")
+
+
+def build_world(
+    source_dirs: list[Path],
+    world_dir: Path,
+    jobs: int = 1,
+    build_cmd: list[str] | None = None,
+    rebuild: bool = False,
+    builder: Builder | None = None,
+) -> bool:
+    return World(source_dirs, world_dir, jobs=jobs, build_cmd=build_cmd, rebuild=rebuild, builder=builder).build()
+
+
+def _fingerprint(package: WorldPackage, manifests: ManifestCache) -> str:
+    """
+    changing the version or any file of the source tree causes a rebuild.
+    """
+    digest = hashlib.sha256(package.version.encode())
+    entries, _ = manifests.manifest(package.source_dir)
+    digest.update(json.dumps(entries, sort_keys=True).encode())
+    return digest.hexdigest()
@@ -0,0 +1,248 @@
+"""
+a remote build worker for `debmagic.world`.
+
+```
+python -m debmagic.world.worker --listen unix:/run/debmagic-worker.sock --capacity 4 --work-dir /var/tmp/debmagic-worker
+```
+
+whoever can send jobs to the worker runs commands as its user.
+unix sockets are only accessible to that user, workers listening on TCP require a shared token
+(`--token-file`), which the coordinator has to send along.
+
+source trees and repository contents are cached in `<work-dir>/blobs` by their sha256,
+so repeated builds only transfer what changed.
+"""
+
+import argparse
+import hashlib
+import hmac
+import multiprocessing
+import os
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+
+from ._builder import BUILD_OPTION_VARS, built_debs, run_build
+from ._graph import WorldError, WorldPackage
+from ._protocol import PROTOCOL_VERSION, Connection, ProtocolError, listen
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+class Worker:
+    def __init__(self, work_dir: Path, capacity: int = 1, token: str | None = None):
+        self.work_dir = work_dir
+        self.capacity = capacity
+        self.token = token
+        self.blob_dir = self.work_dir / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.job_dir = self.work_dir / "jobs"
+        self.job_dir.mkdir(exist_ok=True)
+        self._slots = threading.BoundedSemaphore(capacity)
+        self._server: socket.socket | None = None
+
+    def serve(self, address: str, ready: threading.Event | None = None) -> None:
+        """
+        handle connections until `shutdown` is called.
+        """
+        if not address.startswith("unix:") and self.token is None:
+            raise WorldError(f"listening on {address} requires a token, otherwise anyone can run commands")
+        self._server = listen(address)
+        if ready is not None:
+            ready.set()
+        print(f"debmagic: worker: listening on {address} with capacity {self.capacity}")
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                # the server socket was closed
+                return
+            threading.Thread(target=self._handle, args=(Connection(sock),), daemon=True).start()
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            try:
+                # wakes up the accept() in serve
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._server.close()
+
+    def _handle(self, conn: Connection) -> None:
+        try:
+            message = conn.receive()
+            if self.token is not None and not hmac.compare_digest(
+                str(message.get("token", "")).encode(), self.token.encode()
+            ):
+                conn.send({"type": "denied"})
+                raise ProtocolError("client sent a wrong token")
+            match message["type"]:
+                case "hello":
+                    conn.send({"type": "hello", "version": PROTOCOL_VERSION, "capacity": self.capacity})
+                case "job":
+                    if not self._slots.acquire(blocking=False):
+                        conn.send({"type": "busy"})
+                        return
+                    try:
+                        self._run_job(conn, message)
+                    finally:
+                        self._slots.release()
+                case _:
+                    raise ProtocolError(f"unexpected message {message['type']!r}")
+        except (OSError, ProtocolError, KeyError) as exc:
+            print(f"debmagic: worker: connection failed: {exc}", file=sys.stderr)
+        finally:
+            conn.close()
+
+    def _run_job(self, conn: Connection, job: dict) -> None:
+        source_name = job["source_name"]
+        # the name of a directory below the job's, nothing else
+        if not isinstance(source_name, str) or source_name in ("", ".", "..") or "/" in source_name:
+            raise ProtocolError(f"invalid source name {source_name!r}")
+
+        entries = [*job["source"], *job["repo"]]
+        needed = sorted(
+            {entry["sha256"] for entry in entries if "sha256" in entry and not self._blob(entry["sha256"]).exists()}
+        )
+        conn.send({"type": "need", "blobs": needed})
+        for _ in needed:
+            message = conn.receive()
+            if message["type"] != "blob":
+                raise ProtocolError(f"expected a blob, got {message['type']!r}")
+            self._receive_blob(conn, message["sha256"], message["size"])
+
+        job_dir = self.job_dir / uuid.uuid4().hex
+        try:
+            source_dir = job_dir / "src" / source_name
+            repo_dir = job_dir / "repo"
+            # the build may modify its source files in place, the cache must stay intact
+            self._materialize(source_dir, job["source"], copy=True)
+            self._materialize(repo_dir, job["repo"], copy=False)
+
+            env = {name: value for name, value in os.environ.items() if name not in BUILD_OPTION_VARS}
+            env.update(job["env"])
+            read_fd, write_fd = os.pipe()
+            forwarder = threading.Thread(target=_forward_log, args=(conn, read_fd))
+            forwarder.start()
+            try:
+                with os.fdopen(write_fd, "wb") as log:
+                    returncode = run_build(source_dir, job["build_cmd"], repo_dir, log, env)
+            finally:
+                forwarder.join()
+
+            if returncode != 0:
+                conn.send({"type": "result", "ok": False, "error": f"build failed with exit code {returncode}"})
+                return
+            try:
+                debs = built_debs(WorldPackage.from_source_dir(source_dir))
+            except WorldError as exc:
+                conn.send({"type": "result", "ok": False, "error": str(exc)})
+                return
+            for deb in debs:
+                conn.send({"type": "artifact", "name": deb.name, "size": deb.stat().st_size}, payload=deb)
+            conn.send({"type": "result", "ok": True})
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _blob(self, digest: str) -> Path:
+        if not _SHA256.match(digest):
+            raise ProtocolError(f"invalid blob digest {digest!r}")
+        return self.blob_dir / digest[:2] / digest
+
+    def _receive_blob(self, conn: Connection, digest: str, size: int) -> None:
+        target = self._blob(digest)
+        target.parent.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=target.parent, delete=False) as tmp:
+            conn.receive_payload(size, _HashingWriter(tmp, hasher := hashlib.sha256()))
+        if hasher.hexdigest() != digest:
+            os.unlink(tmp.name)
+            raise ProtocolError(f"blob {digest} was corrupted in transfer")
+        os.chmod(tmp.name, 0o444)
+        os.replace(tmp.name, target)
+
+    def _materialize(self, root: Path, entries: list[dict], copy: bool) -> None:
+        root.mkdir(parents=True, exist_ok=True)
+        for entry in entries:
+            rel_path = os.path.normpath(entry["path"])
+            if rel_path.startswith(("/", "..")):
+                raise ProtocolError(f"path {entry['path']!r} is outside of the tree")
+            path = root / rel_path
+            # writing through symlinks of the tree itself would escape it
+            if any((root / parent).is_symlink() for parent in Path(rel_path).parents):
+                raise ProtocolError(f"path {entry['path']!r} is below a symlink")
+            if os.path.lexists(path):
+                raise ProtocolError(f"path {entry['path']!r} is listed twice")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if "link" in entry:
+                path.symlink_to(entry["link"])
+            elif copy:
+                shutil.copyfile(self._blob(entry["sha256"]), path)
+                path.chmod(entry["mode"])
+            else:
+                os.link(self._blob(entry["sha256"]), path)
+
+
+class _HashingWriter:
+    def __init__(self, target, hasher):
+        self._target = target
+        self._hasher = hasher
+
+    def write(self, data: bytes) -> None:
+        self._hasher.update(data)
+        self._target.write(data)
+
+
+def _forward_log(conn: Connection, read_fd: int) -> None:
+    with os.fdopen(read_fd, "rb", buffering=0) as pipe:
+        while chunk := pipe.read(1 << 16):
+            try:
+                conn.send({"type": "log", "size": len(chunk)}, payload=chunk)
+            except OSError:
+                # keep draining so the build doesn't block on a full pipe
+                pass
+
+
+def main(argv: list[str] | None = None) -> int:
+    cli = argparse.ArgumentParser(
+        prog="python -m debmagic.world.worker",
+        description="build source packages for a debmagic world on this machine",
+    )
+    cli.add_argument("--listen", required=True, help="unix:<path> or <host>:<port>")
+    cli.add_argument(
+        "--capacity",
+        type=int,
+        default=max(1, multiprocessing.cpu_count() // 4),
+        help="how many packages to build concurrently",
+    )
+    cli.add_argument(
+        "--token-file",
+        type=Path,
+        help="file containing the token clients have to send, required when listening on TCP",
+    )
+    cli.add_argument(
+        "--work-dir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "debmagic-worker",
+        help="where to cache the transferred files and run the builds",
+    )
+    args = cli.parse_args(argv)
+
+    token = args.token_file.read_text().strip() if args.token_file else None
+    worker = Worker(args.work_dir, capacity=args.capacity, token=token)
+    try:
+        worker.serve(args.listen)
+    except WorldError as exc:
+        print(f"debmagic: worker: {exc}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        worker.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import types
+from pathlib import Path
+
+import pytest
+from debmagic.v0 import Build
+
+
+@pytest.fixture
+def make_build(tmp_path: Path):
+    """
+    create a Build for a source package in tmp_path, without reading debian/control or dpkg's environment.
+    """
+
+    def make_build(package_names: list[str], **build_env: str) -> Build:
+        binary_packages = [types.SimpleNamespace(name=name) for name in package_names]
+        package = types.SimpleNamespace(
+            build_env=build_env,
+            source_package=types.SimpleNamespace(name=package_names[0], binary_packages=binary_packages),
+        )
+        return Build(
+            package=package,  # ty:ignore[invalid-argument-type]
+            source_dir=tmp_path,
+            binary_packages=list(binary_packages),  # ty:ignore[invalid-argument-type]
+            install_base_dir=tmp_path / "debian",
+            architecture_target="x86_64-linux-gnu",
+            architecture_host="x86_64-linux-gnu",
+            parallel=2,
+            prefix=Path("/usr"),
+        )
+
+    return make_build
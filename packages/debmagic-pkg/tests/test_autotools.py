@@ -0,0 +1,144 @@
+from pathlib import Path
+
+from debmagic.v0 import RecordingExecutor, ReplayExecutor, autotools
+from debmagic.v0._build import InternalPreset
+from debmagic.v0._build_stage import BuildStage
+from debmagic.v0._module.autotools import (
+    _autoconf_subprojects,
+    _common_log_drivers,
+    _log_drivers,
+    _merge_cache,
+    _read_cache,
+)
+
+CACHE_OLD = """\
+# This file is a shell script that caches the results of configure
+ac_cv_build=${ac_cv_build=x86_64-pc-linux-gnu}
+test ${ac_cv_header_stdio_h+y} || ac_cv_header_stdio_h=yes
+ac_cv_env_CC_set=set
+"""
+
+CACHE_NEW = """\
+ac_cv_header_stdio_h=${ac_cv_header_stdio_h=no}
+ac_cv_func_fork=${ac_cv_func_fork=yes}
+"""
+
+
+def test_autoconf_cache_parsing(tmp_path: Path):
+    cache_file = tmp_path / "config.cache"
+    cache_file.write_text(CACHE_OLD)
+
+    entries = _read_cache(cache_file)
+
+    # precious environment variables are never shared
+    assert set(entries) == {"ac_cv_build", "ac_cv_header_stdio_h"}
+
+
+def test_autoconf_cache_merge(tmp_path: Path):
+    shared = tmp_path / "shared.cache"
+    shared.write_text(CACHE_OLD)
+    private = tmp_path / "private.cache"
+    private.write_text(CACHE_NEW)
+
+    _merge_cache(private, shared)
+
+    merged = _read_cache(shared)
+    assert set(merged) == {"ac_cv_build", "ac_cv_func_fork", "ac_cv_header_stdio_h"}
+    assert merged["ac_cv_header_stdio_h"] == "ac_cv_header_stdio_h=${ac_cv_header_stdio_h=no}\n"
+
+
+def test_autoconf_subprojects(tmp_path: Path):
+    (tmp_path / "configure.ac").write_text("AC_INIT([top], [1.0])\nAC_CONFIG_SUBDIRS([libfoo tools/bar])\n")
+    (tmp_path / "libfoo").mkdir()
+    (tmp_path / "libfoo" / "configure.ac").write_text("AC_INIT([libfoo], [1.0])\n")
+    (tmp_path / "tools" / "bar").mkdir(parents=True)
+    (tmp_path / "tools" / "bar" / "configure.ac").write_text("AC_CONFIG_SUBDIRS(baz)\n")
+    (tmp_path / "tools" / "bar" / "baz").mkdir()
+
+    assert _autoconf_subprojects(tmp_path) == [
+        tmp_path,
+        tmp_path / "libfoo",
+        tmp_path / "tools" / "bar",
+        tmp_path / "tools" / "bar" / "baz",
+    ]
+
+
+def test_autoconf_subprojects_dynamic(tmp_path: Path):
+    (tmp_path / "configure.ac").write_text("AC_CONFIG_SUBDIRS([$extra_dirs])\n")
+
+    assert _autoconf_subprojects(tmp_path) is None
+
+
+def test_preset_steps(make_build, tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("DEBMAGIC_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "configure.ac").write_text("AC_INIT([foo], [1.0])\n")
+    build = make_build(["foo", "foo-doc"], DEB_HOST_MULTIARCH="x86_64-linux-gnu")
+    build.executor = RecordingExecutor()
+    preset = autotools.Preset()
+    assert preset.required_tools(build) == ["autoreconf", "make"]
+
+    configure_steps = preset.steps(BuildStage.configure)
+    assert configure_steps is not None
+    assert [(step.name, step.after) for step in configure_steps] == [("autoreconf", ()), ("configure", ("autoreconf",))]
+    configure_steps[0].func(build)
+    # after probing the autotools versions
+    assert build.executor.commands()[-1] == ["autoreconf", "--force", "--install", "--verbose"]
+
+    (tmp_path / "configure").write_text("#!/bin/sh\n")
+    (tmp_path / "Makefile").write_text("install:\n")
+    build.executor = RecordingExecutor()
+    install_steps = preset.steps(BuildStage.install)
+    assert install_steps is not None
+    assert [step.name for step in install_steps] == ["make-install", "distribute"]
+    install_steps[0].func(build)
+    assert build.executor.commands() == [["make", f"DESTDIR={build.staging_dir}", "install"]]
+
+
+def test_log_drivers(tmp_path: Path):
+    for subdir, driver in (("lib", "$(SHELL) $(top_srcdir)/build-aux/test-driver"), ("tests", "./custom-driver")):
+        (tmp_path / subdir).mkdir()
+        (tmp_path / subdir / "Makefile.am").touch()
+        (tmp_path / subdir / "Makefile").write_text(
+            f"LOG_DRIVER = {driver}\nTAP_LOG_DRIVER = $(SHELL) $(top_srcdir)/build-aux/tap-driver.sh\n"
+        )
+
+    drivers = _log_drivers(tmp_path)
+    assert drivers[tmp_path / "tests"]["LOG_DRIVER"] == "./custom-driver"
+    # LOG_DRIVER can't be overridden for all directories at once
+    assert _common_log_drivers(drivers) == (
+        {"TAP_LOG_DRIVER": "$(SHELL) $(top_srcdir)/build-aux/tap-driver.sh"},
+        {"LOG_DRIVER"},
+    )
+
+
+def _executor() -> ReplayExecutor:
+    # the make data base of a makefile providing clean and distclean
+    return ReplayExecutor(strict=False).respond("make -pRrq", stdout="# Files\nclean:\ndistclean:\n")
+
+
+def test_configure_skipped_after_clean(make_build, tmp_path: Path):
+    (tmp_path / "configure").write_text("#!/bin/sh\n")
+    (tmp_path / "Makefile").write_text("clean:\ndistclean:\n")
+    build = make_build(["foo"], DEB_HOST_MULTIARCH="x86_64-linux-gnu")
+    preset = autotools.Preset()
+
+    def clean_and_configure() -> list[list[str]]:
+        build.executor = _executor()
+        InternalPreset().clean(build)
+        preset.clean(build)
+        preset.configure(build)
+        (tmp_path / "config.status").touch()
+        return [cmd for cmd in build.executor.commands() if cmd[:2] != ["make", "-pRrq"]]
+
+    first = clean_and_configure()
+    assert first[0] == ["make", "clean"]
+    assert first[1][0] == "./configure"
+    # make clean keeps config.status, and the configure stamp survives the clean stage
+    assert clean_and_configure() == [["make", "clean"]]
+
+    build.full_clean = True
+    build.executor = _executor()
+    InternalPreset().clean(build)
+    preset.clean(build)
+    assert build.executor.commands()[-1] == ["make", "distclean"]
+    assert not build.stamp_dir.exists()
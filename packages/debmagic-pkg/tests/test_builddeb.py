@@ -0,0 +1,66 @@
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+from pathlib import Path
+
+import pytest
+from debmagic.v0 import builddeb
+
+
+def _ar_members(deb: Path) -> dict[str, bytes]:
+    data = deb.read_bytes()
+    assert data.startswith(builddeb.AR_MAGIC)
+    members: dict[str, bytes] = {}
+    pos = len(builddeb.AR_MAGIC)
+    while pos < len(data):
+        header = data[pos : pos + 60]
+        name, size = header[:16].decode().strip(), int(header[48:58])
+        members[name] = data[pos + 60 : pos + 60 + size]
+        pos += 60 + size + size % 2
+    return members
+
+
+@pytest.mark.parametrize("compression", ["xz", "none"])
+def test_build_deb(tmp_path: Path, make_build, monkeypatch: pytest.MonkeyPatch, compression: str):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    pkg_dir = tmp_path / "debian" / "pkg"
+    (pkg_dir / "DEBIAN").mkdir(parents=True)
+    (pkg_dir / "DEBIAN" / "control").write_text(
+        "Package: pkg\nVersion: 1:1.0-1\nArchitecture: all\nMaintainer: Someone <someone@example.org>\n"
+        "Description: test package\n"
+    )
+    (pkg_dir / "usr" / "bin").mkdir(parents=True)
+    (pkg_dir / "usr" / "bin" / "tool").write_text("#!/bin/sh\n")
+    (pkg_dir / "usr" / "bin" / "tool").chmod(0o755)
+    os.link(pkg_dir / "usr" / "bin" / "tool", pkg_dir / "usr" / "bin" / "tool2")
+    (pkg_dir / "usr" / "bin" / "link").symlink_to("tool")
+
+    build = make_build(["pkg"])
+    (deb,) = builddeb.build_debs(build, dest_dir=tmp_path, compression=compression)
+    assert deb == tmp_path / "pkg_1.0-1_all.deb"
+
+    members = _ar_members(deb)
+    suffix = ".xz" if compression == "xz" else ""
+    assert list(members) == ["debian-binary", "control.tar.xz", f"data.tar{suffix}"]
+    assert members["debian-binary"] == b"2.0\n"
+
+    with tarfile.open(fileobj=io.BytesIO(members[f"data.tar{suffix}"])) as tar:
+        infos = tar.getmembers()
+    # tarfile strips the trailing slash of directories
+    assert [info.name for info in infos] == [
+        ".",
+        "./usr",
+        "./usr/bin",
+        "./usr/bin/tool",
+        "./usr/bin/tool2",
+        "./usr/bin/link",
+    ]
+    assert all(info.uid == 0 and info.uname == "root" and info.mtime <= 1700000000 for info in infos)
+    assert infos[4].islnk() and infos[5].issym()
+
+    if shutil.which("dpkg-deb"):
+        contents = subprocess.run(["dpkg-deb", "--contents", deb], check=True, capture_output=True, text=True)
+        assert "./usr/bin/tool" in contents.stdout
+        subprocess.run(["dpkg-deb", "--info", deb], check=True, capture_output=True)
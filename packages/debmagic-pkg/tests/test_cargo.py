@@ -0,0 +1,75 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+from debmagic.common.executor import CommandCall
+from debmagic.v0 import RecordingExecutor
+from debmagic.v0._module import cargo
+
+RUST_ENV = {"DEB_BUILD_RUST_TYPE": "x86_64-unknown-linux-gnu", "DEB_HOST_RUST_TYPE": "x86_64-unknown-linux-gnu"}
+
+
+class CargoExecutor(RecordingExecutor):
+    """
+    records the commands, rustc reports its version and `cargo install` installs a program into --root
+    """
+
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        super().run(call, check)
+        argv = call.argv
+        if argv[0] == "rustc":
+            return call.result(stdout="rustc 1.85.0\n")
+        if argv[:2] == ["cargo", "install"]:
+            bin_dir = Path(argv[argv.index("--root") + 1]) / "bin"
+            bin_dir.mkdir(parents=True)
+            (bin_dir / "foo").write_text("program")
+        return call.result()
+
+
+@pytest.fixture(autouse=True)
+def cargo_env(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("DEBMAGIC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cargo, "DEBIAN_CARGO_REGISTRY", tmp_path / "no-registry")
+    (tmp_path / "Cargo.toml").write_text("[package]\nname = 'foo'\n")
+
+
+def test_build(make_build, tmp_path: Path):
+    (tmp_path / "vendor").mkdir()
+    build = make_build(["foo"], **RUST_ENV)
+    build.executor = CargoExecutor()
+
+    cargo.build(build)
+
+    rustc, cargo_build = build.executor.calls
+    # the toolchain is probed with the build's executor
+    assert rustc.argv == ["rustc", "--version", "--verbose"]
+    assert cargo_build.argv[:5] == ["cargo", "build", "--target=x86_64-unknown-linux-gnu", "-j2", "--offline"]
+    assert f'source.debmagic-vendored.directory="{tmp_path / "vendor"}"' in cargo_build.argv
+    assert cargo_build.env is not None
+    assert Path(cargo_build.env["CARGO_TARGET_DIR"]).is_relative_to(tmp_path / "cache" / "cargo")
+
+
+def test_test_cross(make_build):
+    build = make_build(["foo"], **{**RUST_ENV, "DEB_HOST_RUST_TYPE": "aarch64-unknown-linux-gnu"})
+    build.executor = CargoExecutor()
+
+    cargo.test(build)
+
+    assert build.executor.calls == []
+
+
+@pytest.mark.parametrize("package_names", [["foo"], ["foo", "foo-doc"]])
+def test_install(make_build, tmp_path: Path, package_names: list[str]):
+    (tmp_path / "debian").mkdir()
+    (tmp_path / "debian" / "foo.install").write_text("usr/bin\n")
+    (tmp_path / "Cargo.lock").touch()
+    build = make_build(package_names, **RUST_ENV)
+    build.executor = CargoExecutor()
+
+    cargo.install(build)
+
+    cargo_install = build.executor.calls[-1]
+    expected = build.install_dirs["foo"] if len(package_names) == 1 else build.staging_dir
+    assert cargo_install.argv[-4:] == ["--root", str(expected / "usr"), "--no-track", "--locked"]
+    # the staging dir is distributed into the packages
+    assert (build.install_dirs["foo"] / "usr" / "bin" / "foo").read_text() == "program"
@@ -0,0 +1,65 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+from debmagic.common.executor import CommandCall
+from debmagic.v0 import RecordingExecutor
+from debmagic.v0._build import BuildError
+from debmagic.v0._module import cmake
+
+
+class ConfigureExecutor(RecordingExecutor):
+    """
+    records the commands, cmake generates the build.ninja
+    """
+
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        super().run(call, check)
+        if call.argv[0] == "cmake":
+            build_dir = Path(call.argv[call.argv.index("-B") + 1])
+            build_dir.mkdir(parents=True, exist_ok=True)
+            (build_dir / "build.ninja").touch()
+        return call.result()
+
+
+def test_configure(make_build, tmp_path: Path):
+    build = make_build(["foo"], DEB_HOST_MULTIARCH="x86_64-linux-gnu")
+    build.executor = ConfigureExecutor()
+    with pytest.raises(BuildError, match=r"no 'CMakeLists\.txt'"):
+        cmake.configure(build)
+
+    (tmp_path / "CMakeLists.txt").write_text("project(foo)\n")
+    cmake.configure(build, "-DFOO=ON")
+    [cmd] = build.executor.commands()
+    assert cmd[:7] == ["cmake", "-S", str(tmp_path), "-B", str(build.build_dir), "-G", "Ninja"]
+    assert "-DCMAKE_INSTALL_LIBDIR=lib/x86_64-linux-gnu" in cmd
+    assert cmd[-1] == "-DFOO=ON"
+
+    # ninja re-runs cmake itself, only changed arguments configure again
+    cmake.configure(build, "-DFOO=ON")
+    assert len(build.executor.calls) == 1
+    cmake.configure(build, "-DFOO=OFF")
+    assert len(build.executor.calls) == 2
+
+    # the clean stage of the next build keeps the configured build directory
+    cmake.Preset().clean(build)
+    cmake.configure(build, "-DFOO=OFF")
+    assert len(build.executor.calls) == 2
+
+    build.full_clean = True
+    cmake.Preset().clean(build)
+    assert not build.build_dir.exists()
+    cmake.configure(build, "-DFOO=OFF")
+    assert len(build.executor.calls) == 3
+
+
+def test_preset_without_cmakelists(make_build):
+    build = make_build(["foo"])
+    build.executor = RecordingExecutor()
+    preset = cmake.Preset()
+
+    assert preset.required_tools(build) == []
+    preset.configure(build)
+    preset.build(build)
+    preset.install(build)
+    assert build.executor.calls == []
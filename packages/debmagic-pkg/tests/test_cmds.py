@@ -0,0 +1,66 @@
+import time
+
+import pytest
+from debmagic.v0 import Build
+from debmagic.v0._build import BuildError
+from debmagic.v0._build_stage import BuildStage
+
+
+def test_cmds(make_build, capsys):
+    build = make_build(["foo"])
+    results = build.cmds(["echo one", "echo two", "sh -c 'echo html; echo pdf'"])
+    assert [result.label for result in results] == ["echo", "echo#2", "sh"]
+    assert [result.output for result in results] == ["one\n", "two\n", "html\npdf\n"]
+
+    results = build.cmds({"docs": ["sh", "-c", "echo html; echo pdf"]})
+    assert results[0].ok
+    out = capsys.readouterr().out
+    # the output of each command is kept together
+    assert "[docs] html\n[docs] pdf\n" in out
+    assert "[echo#2] two\n" in out
+
+
+def test_cmds_fail_fast(make_build, capsys):
+    build = make_build(["foo"])
+    start = time.monotonic()
+    with pytest.raises(BuildError, match=r"\[fail\] sh -c 'exit 3' failed with exit code 3"):
+        build.cmds({"slow": "sh -c 'sleep 10; true'", "fail": "sh -c 'exit 3'"})
+    # the running sibling was terminated, including the commands it started
+    assert time.monotonic() - start < 5
+    out = capsys.readouterr().out
+    assert "[slow] cancelled" in out
+
+    with build.batch(fail_fast=False) as batch:
+        batch.submit("true")
+        batch.submit("sh -c 'sleep 0.2; echo done'", label="late")
+    assert [result.output for result in batch.results] == ["", "done\n"]
+
+
+def test_cmds_input(make_build):
+    build = make_build(["foo"])
+    # the input is sent once, while the command runs for a while
+    results = build.cmds({"cat": "sh -c 'sleep 0.3; cat'"}, input="hi\n")
+    assert results[0].output == "hi\n"
+
+
+def test_submitted_commands_terminated_when_build_fails(make_build, tmp_path, monkeypatch):
+    monkeypatch.setenv("DEBMAGIC_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "debian").mkdir()
+    submitted = []
+
+    def clean(build: Build) -> None:
+        submitted.append(build.submit("sleep 30"))
+        raise BuildError("clean failed")
+
+    build = make_build(["foo"])
+    build.package.presets = []
+    build.package.stage_functions = {BuildStage.clean: clean}
+    build.package.stage_steps = {}
+    build.package.custom_functions = {}
+
+    start = time.monotonic()
+    with pytest.raises(BuildError, match="clean failed"):
+        build.run(BuildStage.clean)
+    assert time.monotonic() - start < 10
+    assert submitted[0].cancelled() or submitted[0].result().cancelled
+    assert build._command_pool is None
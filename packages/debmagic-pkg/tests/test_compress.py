@@ -0,0 +1,40 @@
+import gzip
+import os
+from pathlib import Path
+
+from debmagic.v0 import compress
+
+
+def test_compress(tmp_path: Path, make_build):
+    pkg_dir = tmp_path / "debian" / "pkg"
+    doc_dir = pkg_dir / "usr" / "share" / "doc" / "pkg"
+    man_dir = pkg_dir / "usr" / "share" / "man" / "man1"
+    doc_dir.mkdir(parents=True)
+    man_dir.mkdir(parents=True)
+    (doc_dir / "changelog").write_text("small changelog")
+    (doc_dir / "README").write_text("small readme")
+    (doc_dir / "big.txt").write_text("x" * 5000)
+    (doc_dir / "big.html").write_text("x" * 5000)
+    (doc_dir / "copyright").write_text("x" * 5000)
+    (man_dir / "tool.1").write_text(".TH tool")
+    (man_dir / "tool.1").chmod(0o755)
+    os.link(man_dir / "tool.1", man_dir / "tool-hard.1")
+    (man_dir / "alias.1").symlink_to("tool.1")
+    # absolute targets point into the package, not the host
+    (man_dir / "alias-abs.1").symlink_to("/usr/share/man/man1/alias.1")
+
+    build = make_build(["pkg"])
+    compress.dh_compress(build)
+
+    assert sorted(os.listdir(doc_dir)) == ["README", "big.html", "big.txt.gz", "changelog.gz", "copyright"]
+    assert gzip.decompress((doc_dir / "changelog.gz").read_bytes()) == b"small changelog"
+
+    tool = man_dir / "tool.1.gz"
+    assert gzip.decompress(tool.read_bytes()) == b".TH tool"
+    assert tool.stat().st_mode & 0o111 == 0
+    # no timestamp in the header
+    assert tool.read_bytes()[4:8] == b"\0\0\0\0"
+    assert (man_dir / "tool-hard.1.gz").samefile(tool)
+    assert os.readlink(man_dir / "alias.1.gz") == "tool.1.gz"
+    assert not (man_dir / "alias.1").is_symlink()
+    assert os.readlink(man_dir / "alias-abs.1.gz") == "/usr/share/man/man1/alias.1.gz"
@@ -0,0 +1,47 @@
+import os
+from pathlib import Path
+
+from debmagic.v0 import dedup
+
+
+def test_dedup(tmp_path: Path, make_build):
+    data_dir = tmp_path / "debian" / "foo-data" / "usr" / "share" / "foo"
+    (data_dir / "a").mkdir(parents=True)
+    (data_dir / "b").mkdir()
+    (data_dir / "a" / "icon.png").write_bytes(b"png" * 100)
+    (data_dir / "b" / "icon.png").write_bytes(b"png" * 100)
+    (data_dir / "b" / "other.png").write_bytes(b"gif" * 100)
+    opt_dir = tmp_path / "debian" / "foo-data" / "opt" / "foo" / "share" / "icons" / "hicolor"
+    opt_dir.mkdir(parents=True)
+    (opt_dir / "icon.png").write_bytes(b"png" * 100)
+    etc_dir = tmp_path / "debian" / "foo-data" / "etc" / "foo"
+    etc_dir.mkdir(parents=True)
+    (etc_dir / "icon.png").write_bytes(b"png" * 100)
+    bin_dir = tmp_path / "debian" / "foo-data" / "usr" / "bin"
+    bin_dir.mkdir()
+    for name in ("tool", "tool-alias"):
+        (bin_dir / name).write_bytes(b"#!/bin/sh\n" + b"true\n" * 50)
+        (bin_dir / name).chmod(0o755)
+    lib_dir = tmp_path / "debian" / "foo-data" / "usr" / "lib"
+    (lib_dir / "plugins").mkdir(parents=True)
+    (lib_dir / "libfoo.so.1").write_bytes(b"lib" * 100)
+    (lib_dir / "plugins" / "foo.so").write_bytes(b"lib" * 100)
+
+    doc_dir = tmp_path / "debian" / "foo" / "usr" / "share" / "doc" / "foo"
+    doc_dir.mkdir(parents=True)
+    (doc_dir / "manual.txt").write_bytes(b"gif" * 100)
+
+    build = make_build(["foo", "foo-data"])
+    duplicates = dedup.dedup(build)
+
+    assert os.readlink(data_dir / "b" / "icon.png") == "../a/icon.png"
+    assert os.readlink(opt_dir / "icon.png") == "/usr/share/foo/a/icon.png"
+    assert not (data_dir / "a" / "icon.png").is_symlink()
+    # conffiles, executables and shared libraries stay
+    assert not (etc_dir / "icon.png").is_symlink()
+    assert not (bin_dir / "tool-alias").is_symlink()
+    assert not (lib_dir / "plugins" / "foo.so").is_symlink()
+
+    assert duplicates == [
+        dedup.Duplicate(300, [("foo", "usr/share/doc/foo/manual.txt"), ("foo-data", "usr/share/foo/b/other.png")])
+    ]
@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+
+import pytest
+from debmagic.v0 import dh
+from debmagic.v0._build import BuildError
+from debmagic.v0._build_stage import BuildStage
+
+
+def test_parallel_packages(tmp_path: Path, make_build, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    helper = bin_dir / "dh_md5sums"
+    helper.write_text('#!/bin/sh\necho "md5sums $@"\n[ "$1" != "-pbroken" ]\n')
+    helper.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    preset = dh.Preset(parallel_packages=True)
+    preset._initialized = True
+    build = make_build(["foo", "bar"])
+    preset._run_dh_seq_cmds(build, ["dh_md5sums -a"])
+
+    log_dir = build.state_dir / "dh-logs"
+    assert (log_dir / "foo.log").read_text() == "$ dh_md5sums -pfoo\nmd5sums -pfoo\n"
+    assert (log_dir / "bar.log").read_text() == "$ dh_md5sums -pbar\nmd5sums -pbar\n"
+
+    build = make_build(["foo", "broken"])
+    with pytest.raises(BuildError, match="dh_md5sums failed for broken"):
+        preset._run_dh_seq_cmds(build, ["dh_md5sums"])
+
+
+def test_skip_noop_helpers(tmp_path: Path, make_build, monkeypatch, capsys):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    helper = bin_dir / "dh_installinfo"
+    helper.write_text(
+        '#!/bin/sh\n# PROMISE: DH NOOP WITHOUT pkgfile(info) tmp(usr/share/info) cli-options()\necho "$@" >> info.log\n'
+    )
+    helper.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    dh.helper_promise.cache_clear()
+
+    preset = dh.Preset()
+    preset._initialized = True
+    (tmp_path / "debian").mkdir()
+    build = make_build(["foo", "foo-doc"])
+
+    preset._run_dh_seq_cmds(build, ["dh_installinfo -a -O--buildsystem=cmake"])
+    assert not (tmp_path / "info.log").exists()
+    assert "skipped 1 dh helpers with nothing to do: dh_installinfo" in capsys.readouterr().out
+
+    (tmp_path / "debian" / "foo-doc.info").write_text("doc/foo.info\n")
+    preset._run_dh_seq_cmds(build, ["dh_installinfo -a -O--buildsystem=cmake"])
+    assert (tmp_path / "info.log").read_text() == "-a -O--buildsystem=cmake\n"
+
+
+def test_steps_report_skipped_once(tmp_path: Path, make_build, monkeypatch, capsys):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name, pkgfile in (("dh_installinfo", "info"), ("dh_installman", "manpages")):
+        helper = bin_dir / name
+        helper.write_text(f"#!/bin/sh\n# PROMISE: DH NOOP WITHOUT pkgfile({pkgfile}) cli-options()\nexit 1\n")
+        helper.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    dh.helper_promise.cache_clear()
+
+    preset = dh.Preset()
+    preset._initialized = True
+    preset._install_seq = ["dh_installinfo -a", "dh_installman -a"]
+    (tmp_path / "debian").mkdir()
+    build = make_build(["foo"])
+
+    steps = preset.steps(BuildStage.install)
+    assert steps is not None
+    for step in steps:
+        step.func(build)
+    assert (
+        capsys.readouterr().out == "debmagic: skipped 2 dh helpers with nothing to do: dh_installinfo dh_installman\n"
+    )
+
+
+def test_skip_noop_helpers_main_package(tmp_path: Path, make_build, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    helper = bin_dir / "dh_installinfo"
+    helper.write_text('#!/bin/sh\n# PROMISE: DH NOOP WITHOUT pkgfile(info) cli-options()\necho "$@" >> info.log\n')
+    helper.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    dh.helper_promise.cache_clear()
+
+    preset = dh.Preset()
+    preset._initialized = True
+    (tmp_path / "debian").mkdir()
+    (tmp_path / "debian" / "info").write_text("doc/foo.info\n")
+    build = make_build(["foo", "foo-doc"])
+    # debian/info belongs to foo, which isn't built
+    build.binary_packages = build.binary_packages[1:]
+
+    preset._run_dh_seq_cmds(build, ["dh_installinfo -a"])
+    assert not (tmp_path / "info.log").exists()
+
+    build.binary_packages = build.package.source_package.binary_packages
+    preset._run_dh_seq_cmds(build, ["dh_installinfo -a"])
+    assert (tmp_path / "info.log").read_text() == "-a\n"
@@ -0,0 +1,36 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+from debmagic.common.executor import UnexpectedCommandError
+from debmagic.v0 import RecordingExecutor, ReplayExecutor, make
+
+
+def test_recording_executor(make_build, tmp_path: Path):
+    build = make_build(["foo"])
+    build.executor = RecordingExecutor()
+
+    build.cmd("false --flag 'some arg'", cwd=tmp_path, env={"LC_ALL": "C"})
+    build.cmd(["install", "-d", tmp_path / "dir"])
+
+    assert build.executor.commands() == [["false", "--flag", "some arg"], ["install", "-d", str(tmp_path / "dir")]]
+    assert build.executor.calls[0].cwd == tmp_path
+    assert build.executor.calls[0].env == {"LC_ALL": "C"}
+    assert not (tmp_path / "dir").exists()
+
+
+def test_replay_executor(make_build, tmp_path: Path):
+    (tmp_path / "Makefile").write_text("check:\n\t./t\n")
+    build = make_build(["foo"])
+    executor = ReplayExecutor()
+    executor.respond(["make", "-pRrq"], stdout="# Files\ncheck: all\n").respond("false", returncode=1)
+    build.executor = executor
+
+    assert make.first_target(build, ["test", "check"]) == "check"
+    assert build.executor.calls[0].cwd == tmp_path
+
+    with pytest.raises(subprocess.CalledProcessError):
+        build.cmd("false")
+    assert build.cmd("false", check=False).returncode == 1
+    with pytest.raises(UnexpectedCommandError):
+        build.cmd("true")
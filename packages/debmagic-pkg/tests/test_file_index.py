@@ -0,0 +1,44 @@
+import shutil
+from pathlib import Path
+
+from debmagic.common.elf import ET_DYN, ET_EXEC
+from debmagic.v0 import FileKind
+
+
+def test_file_index(tmp_path: Path, make_build):
+    pkg_dir = tmp_path / "debian" / "pkg"
+    (pkg_dir / "DEBIAN").mkdir(parents=True)
+    (pkg_dir / "DEBIAN" / "postinst").write_text("#!/bin/sh\n")
+    bin_dir = pkg_dir / "usr" / "bin"
+    bin_dir.mkdir(parents=True)
+    shutil.copy("/bin/true", bin_dir / "true")
+    (bin_dir / "tool").write_text("#!/usr/bin/python3 -I\nprint()\n")
+    (bin_dir / "alias").symlink_to("tool")
+    lib_dir = pkg_dir / "usr" / "lib"
+    lib_dir.mkdir()
+    (lib_dir / "libfoo.a").write_bytes(b"!<arch>\n")
+    (lib_dir / "data.txt").write_text("data")
+
+    build = make_build(["pkg"])
+    index = build.file_index()
+    files = {info.path: info for info in index.files(pkg_dir)}
+    assert list(files) == ["usr/bin/alias", "usr/bin/tool", "usr/bin/true", "usr/lib/data.txt", "usr/lib/libfoo.a"]
+    assert files["usr/bin/true"].kind == FileKind.elf
+    assert files["usr/bin/true"].elf_type in (ET_EXEC, ET_DYN)
+    assert files["usr/bin/tool"].kind == FileKind.script
+    assert files["usr/bin/tool"].interpreter == "/usr/bin/python3 -I"
+    assert files["usr/bin/alias"].kind == FileKind.symlink
+    assert files["usr/lib/libfoo.a"].kind == FileKind.static_lib
+    assert files["usr/lib/data.txt"].kind == FileKind.data
+    assert files["usr/lib/data.txt"].size == 4
+
+    # cached until invalidated
+    (lib_dir / "new.txt").write_text("new")
+    assert build.file_index() is index
+    build.invalidate_file_index()
+    index = build.file_index()
+    assert "usr/lib/new.txt" in {info.path for info in index.files(pkg_dir)}
+
+    # commands may change the trees
+    build.cmd(["sh", "-c", f"echo new > {lib_dir / 'cmd.txt'}"])
+    assert "usr/lib/cmd.txt" in {info.path for info in build.file_index().files(pkg_dir)}
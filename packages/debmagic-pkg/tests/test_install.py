@@ -0,0 +1,108 @@
+import os
+from pathlib import Path
+
+import pytest
+from debmagic.v0 import ReplayExecutor, install
+from debmagic.v0._build import BuildError
+
+
+def test_distribute(tmp_path: Path, make_build):
+    staging = tmp_path / "debian" / "tmp"
+    lib_dir = staging / "usr" / "lib" / "x86_64-linux-gnu"
+    lib_dir.mkdir(parents=True)
+    (lib_dir / "libfoo.so.1.0").write_text("lib")
+    (lib_dir / "libfoo.so.1").symlink_to("libfoo.so.1.0")
+    (lib_dir / "libfoo.so").symlink_to("libfoo.so.1")
+    (lib_dir / "libfoo.a").write_text("static")
+    (lib_dir / "libfoo.la").write_text("libtool")
+    (lib_dir / "plugins").mkdir()
+    (lib_dir / "plugins" / "a.so").write_text("plugin")
+    include_dir = staging / "usr" / "include" / "foo"
+    include_dir.mkdir(parents=True)
+    (include_dir / "foo.h").write_text("header")
+    (staging / "usr" / "bin").mkdir()
+    (staging / "usr" / "bin" / "foo").write_text("tool")
+    (tmp_path / "debian" / "foo.conf").write_text("conf")
+
+    (tmp_path / "debian" / "libfoo1.install").write_text(
+        "usr/lib/${DEB_HOST_MULTIARCH}/libfoo.so.*\nusr/lib/*/plugins\n"
+    )
+    (tmp_path / "debian" / "libfoo-dev.install").write_text(
+        "# headers and link library\nusr/include\nusr/lib/*/libfoo.{so,a}\n"
+    )
+    (tmp_path / "debian" / "foo-tools.install").write_text("usr/bin/foo\ndebian/foo.conf etc/foo/\n")
+    (tmp_path / "debian" / "not-installed").write_text("usr/lib/*/*.la\n")
+
+    build = make_build(["libfoo1", "libfoo-dev", "foo-tools"], DEB_HOST_MULTIARCH="x86_64-linux-gnu")
+    assert install.destdir(build) == staging
+    assert install.distribute(build) == []
+
+    lib_target = tmp_path / "debian" / "libfoo1" / "usr" / "lib" / "x86_64-linux-gnu"
+    assert sorted(os.listdir(lib_target)) == ["libfoo.so.1", "libfoo.so.1.0", "plugins"]
+    assert (lib_target / "libfoo.so.1.0").samefile(lib_dir / "libfoo.so.1.0")
+    assert os.readlink(lib_target / "libfoo.so.1") == "libfoo.so.1.0"
+    assert (lib_target / "plugins" / "a.so").read_text() == "plugin"
+
+    dev_dir = tmp_path / "debian" / "libfoo-dev" / "usr"
+    assert (dev_dir / "include" / "foo" / "foo.h").read_text() == "header"
+    assert os.readlink(dev_dir / "lib" / "x86_64-linux-gnu" / "libfoo.so") == "libfoo.so.1"
+    assert (dev_dir / "lib" / "x86_64-linux-gnu" / "libfoo.a").is_file()
+
+    tools_dir = tmp_path / "debian" / "foo-tools"
+    assert (tools_dir / "usr" / "bin" / "foo").is_file()
+    assert (tools_dir / "etc" / "foo" / "foo.conf").read_text() == "conf"
+
+
+def test_distribute_unclaimed(tmp_path: Path, make_build):
+    staging = tmp_path / "debian" / "tmp" / "usr" / "share" / "foo"
+    staging.mkdir(parents=True)
+    (staging / "data").write_text("data")
+    (staging / "extra").write_text("extra")
+    (tmp_path / "debian" / "foo.install").write_text("usr/share/foo/data\n")
+    (tmp_path / "debian" / "bar.install").write_text("usr/share/foo/data\n")
+
+    build = make_build(["foo", "bar"])
+    assert install.distribute(build, move=True) == ["usr/share/foo/extra"]
+    # claimed by two packages, so it was linked instead of moved
+    assert (staging / "data").is_file()
+    with pytest.raises(BuildError, match="not installed"):
+        install.distribute(build, fail_missing=True)
+
+    (tmp_path / "debian" / "bar.install").write_text("usr/share/missing\n")
+    with pytest.raises(BuildError, match="missing"):
+        install.distribute(build)
+
+
+def test_distribute_filtered_packages(tmp_path: Path, make_build):
+    staging = tmp_path / "debian" / "tmp" / "usr"
+    (staging / "bin").mkdir(parents=True)
+    (staging / "bin" / "foo").write_text("tool")
+    (staging / "share" / "foo").mkdir(parents=True)
+    (staging / "share" / "foo" / "data").write_text("data")
+    # debhelper uses debian/install for the first package in debian/control
+    (tmp_path / "debian" / "install").write_text("usr/bin\n")
+    (tmp_path / "debian" / "foo-data.install").write_text("usr/share/foo\n")
+
+    build = make_build(["foo", "foo-data"])
+    # like binary-arch, only one of the packages is built
+    build.select_packages({"foo"})
+    assert install.destdir(build) == tmp_path / "debian" / "tmp"
+    assert install.distribute(build) == ["usr/share/foo/data"]
+    assert (tmp_path / "debian" / "foo" / "usr" / "bin" / "foo").is_file()
+    assert not (tmp_path / "debian" / "foo-data").exists()
+
+
+def test_distribute_executable_install_file(tmp_path: Path, make_build):
+    staging = tmp_path / "debian" / "tmp" / "usr" / "bin"
+    staging.mkdir(parents=True)
+    (staging / "foo").write_text("tool")
+    install_file = tmp_path / "debian" / "foo.install"
+    install_file.write_text("#!/usr/bin/dh-exec\nusr/bin/${DEB_HOST_ARCH}-foo\n")
+    install_file.chmod(0o755)
+
+    build = make_build(["foo"])
+    build.executor = ReplayExecutor().respond([str(install_file)], stdout="usr/bin/foo\n")
+    assert install.distribute(build) == []
+
+    assert build.executor.commands() == [[str(install_file)]]
+    assert (tmp_path / "debian" / "foo" / "usr" / "bin" / "foo").is_file()
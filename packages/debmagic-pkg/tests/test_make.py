@@ -0,0 +1,119 @@
+import gc
+import os
+import subprocess
+import weakref
+from pathlib import Path
+
+from debmagic.common.executor import CommandCall
+from debmagic.v0 import RecordingExecutor
+from debmagic.v0._module import make
+from debmagic.v0._module.make import MakeDatabase
+
+MAKE_DATA_BASE = """\
+# GNU Make 4.4.1
+# Make data base, printed on Mon Oct 19 01:24:55 2026
+
+# Variables
+
+# makefile (from 'Makefile', line 1)
+LOG_DRIVER = $(SHELL) $(top_srcdir)/build-aux/test-driver
+# default
+.DEFAULT_GOAL := all
+# makefile (from 'Makefile', line 9)
+CFLAGS = -O2
+define some_recipe
+not_a_var = 1
+endef
+# variable set hash-table stats:
+# Load=79/1024=8%, Rehash=0, Collisions=14/125=11%
+
+# Implicit Rules
+
+%.o: %.c
+\tcc
+
+# Files
+
+check: all
+#  Implicit rule search has not been done.
+#  recipe to execute (from 'Makefile', line 6):
+\t./t
+
+# Not a target:
+Makefile:
+#  Implicit rule search has been done.
+
+distclean: clean
+
+.SUFFIXES:
+
+all: foo
+
+foo:
+
+.PHONY: all check clean distclean
+
+# files hash-table stats:
+# Load=9/1024=1%, Rehash=0, Collisions=0/18=0%
+# Finished Make data base on Mon Oct 19 01:24:55 2026
+"""
+
+
+def test_make_database_parsing():
+    db = MakeDatabase.parse(MAKE_DATA_BASE)
+
+    assert db.targets == {"check", "distclean", "all", "foo"}
+    assert db.phony == {"all", "check", "clean", "distclean"}
+    assert db.default_goal == "all"
+    assert db.variables == {
+        "LOG_DRIVER": "$(SHELL) $(top_srcdir)/build-aux/test-driver",
+        ".DEFAULT_GOAL": "all",
+        "CFLAGS": "-O2",
+    }
+    assert db.has_target("distclean")
+    assert not db.has_target("%.o")
+
+
+class DatabaseExecutor(RecordingExecutor):
+    """
+    records the commands, make prints the data base
+    """
+
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        super().run(call, check)
+        return call.result(returncode=1, stdout=MAKE_DATA_BASE)
+
+
+def test_make_database_cache(make_build, tmp_path: Path):
+    (tmp_path / "Makefile").write_text("all:\n")
+    build = make_build(["foo"])
+    build.executor = DatabaseExecutor()
+
+    assert make.first_target(build, ["distclean", "clean"]) == "distclean"
+    assert make.database(build).default_goal == "all"
+    assert len(build.executor.calls) == 1
+
+    # another executor, like the one recording a plan, probes again
+    build.executor = DatabaseExecutor()
+    make.database(build)
+    assert build.executor.commands() == [["make", "-pRrq", ".DEFAULT"]]
+
+
+def test_make_database_cache_eviction(make_build, tmp_path: Path):
+    makefile = tmp_path / "Makefile"
+    makefile.write_text("all:\n")
+    build = make_build(["foo"])
+    build.executor = DatabaseExecutor()
+
+    make.database(build)
+    os.utime(makefile, ns=(0, 0))
+    make.database(build)
+    # the data base of the old makefile is replaced
+    assert len(build.executor.calls) == 2
+    assert list(make._database_cache[build.executor]) == [makefile]
+
+    # and doesn't keep the executor alive
+    executor = weakref.ref(build.executor)
+    build.executor = DatabaseExecutor()
+    gc.collect()
+    assert executor() is None
@@ -0,0 +1,29 @@
+import hashlib
+from pathlib import Path
+
+from debmagic.v0 import md5sums
+
+
+def _md5(data: bytes) -> str:
+    return hashlib.md5(data).hexdigest()
+
+
+def test_md5sums(tmp_path: Path, make_build):
+    pkg_dir = tmp_path / "debian" / "pkg"
+    (pkg_dir / "DEBIAN").mkdir(parents=True)
+    (pkg_dir / "etc").mkdir()
+    (pkg_dir / "usr" / "share" / "doc").mkdir(parents=True)
+    (pkg_dir / "DEBIAN" / "conffiles").write_text("/etc/conf\nremove-on-upgrade /etc/old\n")
+    (pkg_dir / "etc" / "conf").write_text("conf")
+    (pkg_dir / "usr" / "b").write_bytes(b"b")
+    (pkg_dir / "usr" / "Z").write_bytes(b"Z")
+    (pkg_dir / "usr" / "share" / "doc" / "a\\b").write_bytes(b"escaped")
+    (pkg_dir / "usr" / "link").symlink_to("b")
+
+    build = make_build(["pkg"])
+    md5sums.dh_md5sums(build)
+
+    # C locale sort order, no conffiles, no symlinks, md5sum's escaping
+    assert (pkg_dir / "DEBIAN" / "md5sums").read_bytes() == (
+        f"{_md5(b'Z')}  usr/Z\n{_md5(b'b')}  usr/b\n\\{_md5(b'escaped')}  usr/share/doc/a\\\\b\n".encode()
+    )
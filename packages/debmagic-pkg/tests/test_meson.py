@@ -0,0 +1,75 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+from debmagic.common.executor import CommandCall
+from debmagic.v0 import RecordingExecutor
+from debmagic.v0._build import BuildError
+from debmagic.v0._module import meson
+
+
+class SetupExecutor(RecordingExecutor):
+    """
+    records the commands, `meson setup` generates the build.ninja
+    """
+
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        super().run(call, check)
+        if call.argv[:2] == ["meson", "setup"]:
+            build_dir = Path(call.argv[-1])
+            build_dir.mkdir(parents=True, exist_ok=True)
+            (build_dir / "build.ninja").touch()
+        return call.result()
+
+
+def test_configure(make_build, tmp_path: Path):
+    (tmp_path / "meson.build").write_text("project('foo')\n")
+    build = make_build(["foo"], DEB_HOST_MULTIARCH="x86_64-linux-gnu")
+    build.executor = SetupExecutor()
+
+    meson.configure(build, ["-Dfoo=true"])
+    meson.configure(build, ["-Dfoo=true"])
+    # changed options keep the build directory
+    meson.configure(build, ["-Dfoo=false"])
+
+    setups = build.executor.commands()
+    assert len(setups) == 2
+    assert "--libdir=lib/x86_64-linux-gnu" in setups[0]
+    assert "--reconfigure" not in setups[0]
+    assert setups[1][-3:] == ["-Dfoo=false", "--reconfigure", str(build.build_dir)]
+
+
+def test_test(make_build, tmp_path: Path):
+    build = make_build(["foo"])
+    build.executor = RecordingExecutor()
+
+    meson.test(build, ["--suite", "unit"])
+
+    assert build.executor.commands() == [
+        [
+            "meson",
+            "test",
+            "-C",
+            str(build.build_dir),
+            "--no-rebuild",
+            "--print-errorlogs",
+            "--num-processes",
+            "2",
+            "--suite",
+            "unit",
+        ]
+    ]
+
+
+def test_configure_cross(make_build, tmp_path: Path):
+    (tmp_path / "meson.build").write_text("project('foo')\n")
+    build = make_build(["foo"], DEB_HOST_MULTIARCH="aarch64-linux-gnu")
+    build.architecture_host = "aarch64-linux-gnu"
+    build.executor = SetupExecutor()
+
+    with pytest.raises(BuildError, match="needs a meson cross file"):
+        meson.configure(build)
+    assert build.executor.commands() == []
+
+    meson.configure(build, ["--cross-file=debian/aarch64.ini"])
+    assert "--cross-file=debian/aarch64.ini" in build.executor.commands()[0]
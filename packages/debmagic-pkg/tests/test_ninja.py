@@ -0,0 +1,62 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+from debmagic.common.executor import CommandCall
+from debmagic.v0 import RecordingExecutor
+from debmagic.v0._build import BuildError
+from debmagic.v0._module import ninja
+
+
+class InstallExecutor(RecordingExecutor):
+    """
+    records the commands, `ninja install` installs a program into DESTDIR
+    """
+
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        super().run(call, check)
+        if call.argv[-1] == "install":
+            assert call.env is not None
+            bin_dir = Path(call.env["DESTDIR"]) / "usr" / "bin"
+            bin_dir.mkdir(parents=True)
+            (bin_dir / "foo").write_text("program")
+        return call.result()
+
+
+def test_build(make_build, tmp_path: Path):
+    build = make_build(["foo"])
+    build.executor = RecordingExecutor()
+    with pytest.raises(BuildError, match="was the build configured"):
+        ninja.build(build)
+
+    build.build_dir.mkdir(parents=True)
+    (build.build_dir / "build.ninja").touch()
+    ninja.build(build, targets=["foo"])
+    assert build.executor.commands() == [["ninja", "-C", str(build.build_dir), "-j2", "foo"]]
+
+
+@pytest.mark.parametrize("package_names", [["foo"], ["foo", "foo-doc"]])
+def test_install(make_build, tmp_path: Path, package_names: list[str]):
+    (tmp_path / "debian").mkdir()
+    (tmp_path / "debian" / "foo.install").write_text("usr/bin\n")
+    build = make_build(package_names)
+    build.executor = InstallExecutor()
+
+    ninja.install(build)
+
+    [call] = build.executor.calls
+    assert call.env is not None
+    expected = build.install_dirs["foo"] if len(package_names) == 1 else build.staging_dir
+    assert call.env["DESTDIR"] == str(expected)
+    # the staging dir is distributed into the packages
+    assert (build.install_dirs["foo"] / "usr" / "bin" / "foo").read_text() == "program"
+
+
+def test_install_destdir(make_build, tmp_path: Path):
+    build = make_build(["foo", "foo-doc"])
+    build.executor = InstallExecutor()
+
+    ninja.install(build, destdir=tmp_path / "custom")
+
+    assert (tmp_path / "custom" / "usr" / "bin" / "foo").is_file()
+    assert not build.install_dirs["foo"].exists()
@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+
+from debmagic.common.utils import run_cmd
+from debmagic.v0 import Build, LocalExecutor, Preset, RecordingExecutor
+from debmagic.v0._build_stage import BuildStage
+from debmagic.v0._plan import plan
+from debmagic.v0._steps import Step, StepDurations
+
+
+def test_plan(make_build, tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("DEBMAGIC_CACHE_DIR", str(tmp_path / "cache"))
+
+    class MakePreset(Preset):
+        def build(self, build: Build) -> None:
+            raise AssertionError("the steps are planned instead")
+
+        def steps(self, stage: BuildStage) -> list[Step] | None:
+            def make(build: Build) -> None:
+                # a probe, its output is needed to decide what to run
+                jobs = run_cmd(["echo", "-j3"], capture_output=True, text=True, executor=build.executor).stdout
+                build.cmd(["make", jobs.strip()], cwd=build.source_dir, env={**os.environ, "V": "1"})
+                if not build.dry_run:
+                    (build.source_dir / "built").touch()
+
+            return [Step("make", make)]
+
+    def configure(build: Build) -> None:
+        build.cmd("./configure")
+
+    def docs(build: Build) -> None:
+        build.cmd("make html")
+
+    build = make_build(["foo"])
+    # like `rules.py plan`, the commands setting up the package were recorded as probes
+    build.executor = RecordingExecutor(probe_executor=LocalExecutor())
+    run_cmd(["echo", "dh", "build", "--no-act"], capture_output=True, executor=build.executor)
+    build.package.presets = [MakePreset()]
+    build.package.stage_functions = {BuildStage.configure: configure}
+    build.package.stage_steps = {BuildStage.build: [Step("docs", docs, after=("make",))]}
+    build._completed_stages = {BuildStage.clean, BuildStage.prepare}
+    durations = StepDurations.load("foo")
+    durations.record(BuildStage.build, "make", 10.0)
+    durations.record(BuildStage.build, "docs", 2.5)
+    durations.save()
+
+    result = plan(build, BuildStage.build)
+    assert [stage["stage"] for stage in result["stages"]] == ["clean", "prepare", "configure", "build"]
+    configure, build_stage = result["stages"][2:]
+    assert configure["provider"] == "rules file"
+    assert configure["steps"][0]["commands"][0]["argv"] == ["./configure"]
+    assert configure["estimated_seconds"] is None
+
+    make, docs = build_stage["steps"]
+    assert make["commands"] == [{"argv": ["make", "-j3"], "shell": False, "cwd": str(tmp_path), "env": {"V": "1"}}]
+    assert docs["after"] == ["make"]
+    assert build_stage["estimated_seconds"] == 12.5
+    assert [probe["argv"] for probe in result["probes"]] == [["echo", "dh", "build", "--no-act"], ["echo", "-j3"]]
+    assert not result["cost_complete"]
+
+    # nothing was run, and the build is usable afterwards
+    assert not build.dry_run
+    assert not (tmp_path / "built").exists()
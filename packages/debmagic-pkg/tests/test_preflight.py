@@ -0,0 +1,96 @@
+import time
+from pathlib import Path
+
+import pytest
+from debmagic.v0 import Build, Preset, dh, install
+from debmagic.v0._build import BuildError
+from debmagic.v0._build_stage import BuildStage
+from debmagic.v0._package import CustomFunction
+from debmagic.v0._steps import Step
+from debmagic.v0._types import CustomFuncArg
+
+
+def test_preflight(make_build, tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("DEBMAGIC_CACHE_DIR", str(tmp_path / "cache"))
+    ran: list[str] = []
+
+    class ToolPreset(Preset):
+        def required_tools(self, build: Build) -> list[str]:
+            return ["sh", "debmagic-missing-tool"]
+
+        def preflight(self, build: Build) -> list[str]:
+            # like the presets installing into the staging dir
+            return install.check_install_files(build)
+
+        def build(self, build: Build) -> None:
+            ran.append("build")
+
+    def test() -> None:
+        ran.append("test")
+
+    (tmp_path / "debian").mkdir()
+    (tmp_path / "debian" / "libfooo.install").write_text("usr/lib\n")
+    (tmp_path / "debian" / "libfoo.install").write_text("usr/lib/{libfoo,libbar.so*\nusr/lib/${DEB_HOST_ARCH}/*.so\n")
+
+    build = make_build(["foo", "libfoo"], DEB_HOST_MULTIARCH="x86_64-linux-gnu")
+    build.package.presets = [ToolPreset()]
+    build.package.stage_functions = {BuildStage.test: test}
+    build.package.stage_steps = {BuildStage.build: [Step("docs", lambda build: None, after=("compile",))]}
+    build.package.custom_functions = {
+        "release": CustomFunction(lambda files: None, {"files": CustomFuncArg("files", list[str], None)})
+    }
+    build._completed_stages = {BuildStage.clean, BuildStage.prepare}
+
+    start = time.monotonic()
+    with pytest.raises(BuildError) as exc_info:
+        build.run(BuildStage.test)
+    assert time.monotonic() - start < 1
+    assert ran == []
+    assert str(exc_info.value).splitlines()[1:] == [
+        "  configure stage is provided by neither the rules file nor a preset",
+        "  build stage: step 'docs' refers to unknown step 'compile' of the build stage, known are: build, docs",
+        "  test step 'test' can't be called with the build: too many positional arguments",
+        "  debian/libfoo.install:1: unbalanced brackets in pattern 'usr/lib/{libfoo,libbar.so*'",
+        "  debian/libfoo.install:2: unknown variable ${DEB_HOST_ARCH} in install file",
+        "  debian/libfooo.install belongs to no binary package, did you mean debian/libfoo.install?",
+        "  'debmagic-missing-tool' is not on PATH, but required by test_preflight.test_preflight.<locals>.ToolPreset",
+        "  custom function 'release': annotation list[str] of argument 'files' can't convert command line values",
+    ]
+
+    # completed stages aren't checked again
+    build._completed_stages = {stage for stage in BuildStage if stage != BuildStage.package}
+    build.package.presets = []
+    build.package.stage_functions = {BuildStage.package: lambda build: ran.append("package")}
+    build.package.custom_functions = {}
+    (tmp_path / "debian" / "libfooo.install").unlink()
+    (tmp_path / "debian" / "libfoo.install").write_text("usr/lib/*.so.* usr/lib/${DEB_HOST_MULTIARCH}\n")
+    build.run(BuildStage.package)
+    assert ran == ["package"]
+
+
+def test_dh_override_typo():
+    dhp = dh.Preset()
+    dhp._seq_ids = {"dh_auto_install", "dh_install"}
+
+    def dh_auto_instal(build: Build) -> None:
+        pass
+
+    with pytest.raises(ValueError, match=r"your override 'dh_auto_instal', did you mean 'dh_auto_install'\?"):
+        dhp.override(dh_auto_instal)
+
+
+def test_dh_install_files(make_build, tmp_path: Path):
+    (tmp_path / "debian").mkdir()
+    # debian/install belongs to the first package of debian/control
+    (tmp_path / "debian" / "install").write_text("usr/bin/${env:DEBMAGIC_UNSET_VAR}foo usr/share/foo${Space}bar\n")
+    (tmp_path / "debian" / "foo-data.install").write_text("usr/share/{a,b\n")
+    build = make_build(["foo", "foo-data"])
+
+    dhp = dh.Preset()
+    dhp._initialized = True
+    dhp._seq_ids = {"dh_auto_install", "dh_install"}
+    # debhelper's dh_install reads the install files itself
+    assert dhp.preflight(build) == []
+
+    dhp.override(install.dh_install)
+    assert dhp.preflight(build) == ["debian/foo-data.install:1: unbalanced brackets in pattern 'usr/share/{a,b'"]
@@ -0,0 +1,117 @@
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+from debmagic.common.executor import CommandCall
+from debmagic.v0 import RecordingExecutor, python
+from debmagic.v0._module.python import _INSTALL_WHEEL_SCRIPT
+
+
+class WheelExecutor(RecordingExecutor):
+    """
+    records the commands, `-m build` creates the wheel and the install script reports the dist-packages dir
+    """
+
+    def __init__(self, wheel_tag: str):
+        super().__init__()
+        self.wheel_tag = wheel_tag
+
+    def run(self, call: CommandCall, check: bool = True) -> subprocess.CompletedProcess:
+        super().run(call, check)
+        argv = call.argv
+        if argv[1:3] == ["-m", "build"]:
+            dist_dir = Path(argv[argv.index("--outdir") + 1])
+            (dist_dir / f"foo-1.0-{self.wheel_tag}.whl").touch()
+        if argv[1] == "-c":
+            return call.result(stdout="/usr/lib/python3/dist-packages\n")
+        return call.result()
+
+
+@pytest.fixture(autouse=True)
+def interpreters(monkeypatch):
+    monkeypatch.setattr(python, "interpreters", lambda *args: ["python3.12", "python3.13"])
+
+
+def test_build_binary_wheels(make_build, tmp_path: Path):
+    (tmp_path / "setup.py").write_text("setup()\n")
+    (tmp_path / "foo.c").write_text("int foo;\n")
+    (tmp_path / "debian").mkdir()
+    build = make_build(["python3-foo"])
+    build.executor = WheelExecutor("cp312-cp312-linux_x86_64")
+
+    python.build(build)
+
+    builds = [call for call in build.executor.calls if call.argv[1:3] == ["-m", "build"]]
+    assert [call.cwd for call in builds] == [tmp_path, tmp_path / ".pybuild" / "cpython3_3.13" / "src"]
+    # the other interpreter builds in its own copy of the tree
+    copy_dir = tmp_path / ".pybuild" / "cpython3_3.13" / "src"
+    assert (copy_dir / "foo.c").is_file()
+    assert not (copy_dir / "debian").exists()
+    assert not (copy_dir / ".pybuild").exists()
+
+
+def test_build_pure_wheel_once(make_build, tmp_path: Path):
+    (tmp_path / "pyproject.toml").write_text("[project]\nname = 'foo'\n")
+    build = make_build(["python3-foo"])
+    build.executor = WheelExecutor("py3-none-any")
+
+    python.build(build)
+
+    assert [call.argv[0] for call in build.executor.calls if call.argv[1:3] == ["-m", "build"]] == ["python3.12"]
+    assert (tmp_path / ".pybuild" / "cpython3_3.13" / "dist" / "foo-1.0-py3-none-any.whl").is_file()
+
+
+@pytest.mark.parametrize("package_names", [["python3-foo"], ["python3-foo", "python-foo-doc"]])
+def test_install(make_build, tmp_path: Path, package_names: list[str]):
+    (tmp_path / "pyproject.toml").write_text("[project]\nname = 'foo'\n")
+    build = make_build(package_names)
+    # the source package is named differently than its binary packages
+    build.package.source_package.name = "python-foo"
+    build.executor = WheelExecutor("py3-none-any")
+    python.build(build)
+
+    python.install(build)
+
+    expected = build.install_dirs["python3-foo"] if len(package_names) == 1 else build.staging_dir
+    installs = [call.argv for call in build.executor.calls if call.argv[1] == "-c"]
+    assert [argv[-1] for argv in installs[-2:]] == [str(expected), str(expected)]
+
+
+def _wheel(path: Path, files: dict[str, str]) -> Path:
+    files = {
+        **files,
+        "foo-1.0.dist-info/METADATA": "Metadata-Version: 2.1\nName: foo\nVersion: 1.0\n",
+        "foo-1.0.dist-info/WHEEL": "Wheel-Version: 1.0\nRoot-Is-Purelib: false\n",
+    }
+    record = "".join(f"{name},,\n" for name in files) + "foo-1.0.dist-info/RECORD,,\n"
+    with zipfile.ZipFile(path, "w") as wheel:
+        for name, content in files.items():
+            wheel.writestr(name, content)
+        wheel.writestr("foo-1.0.dist-info/RECORD", record)
+    return path
+
+
+def test_install_wheels_into_shared_dir(tmp_path: Path):
+    pytest.importorskip("installer")
+    destdir = tmp_path / "dest"
+    # the wheels of two interpreters, with the same pure module and different extension modules
+    for tag in ("cp312", "cp313"):
+        wheel = _wheel(
+            tmp_path / f"foo-1.0-{tag}-{tag}-linux_x86_64.whl",
+            {"foo/__init__.py": "import foo._ext\n", f"foo/_ext.{tag}.so": tag},
+        )
+        proc = subprocess.run(
+            [sys.executable, "-c", _INSTALL_WHEEL_SCRIPT, wheel, destdir], capture_output=True, text=True, check=True
+        )
+
+    site_dir = destdir / proc.stdout.strip().splitlines()[-1].lstrip("/")
+    assert sorted(path.name for path in (site_dir / "foo").iterdir()) == [
+        "__init__.py",
+        "_ext.cp312.so",
+        "_ext.cp313.so",
+    ]
+    record = (site_dir / "foo-1.0.dist-info" / "RECORD").read_text()
+    assert "foo/_ext.cp312.so," in record and "foo/_ext.cp313.so," in record
+    assert record.count("foo/__init__.py,") == 1
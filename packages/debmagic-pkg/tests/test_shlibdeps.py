@@ -0,0 +1,85 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from debmagic.v0 import shlibdeps
+
+
+def test_dpkg_index(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DEBMAGIC_CACHE_DIR", str(tmp_path / "cache"))
+    info_dir = tmp_path / "dpkg" / "info"
+    info_dir.mkdir(parents=True)
+    (tmp_path / "dpkg" / "status").write_text("")
+    (info_dir / "libfoo1:amd64.list").write_text(
+        "/usr/lib/x86_64-linux-gnu\n/usr/lib/x86_64-linux-gnu/libfoo.so.1\n/usr/share/doc/libfoo1\n"
+    )
+    (info_dir / "libfoo1:amd64.symbols").write_text("libfoo.so.1 libfoo1 #MINVER#\n foo@Base 1.0\n")
+    (info_dir / "libbar2.shlibs").write_text("libbar 2 libbar2 (>= 2.1)\nudeb: libbar 2 libbar2-udeb\n")
+
+    index = shlibdeps.dpkg_index(tmp_path / "dpkg")
+    assert index.libraries == {"libfoo.so.1": [("/usr/lib/x86_64-linux-gnu/libfoo.so.1", "libfoo1:amd64")]}
+    assert index.symbols == {"libfoo1:amd64": {"libfoo.so.1": str(info_dir / "libfoo1:amd64.symbols")}}
+    assert index.shlibs == {"libbar2": {"libbar 2": "libbar2 (>= 2.1)"}}
+
+    # served from the cache until dpkg's database changes
+    (info_dir / "libfoo1:amd64.list").write_text("")
+    assert shlibdeps.dpkg_index(tmp_path / "dpkg") == index
+
+
+def test_merge_dependencies():
+    assert shlibdeps.merge_dependencies(["libc6 (>= 2.4)", "libc6", "libc6 (>= 2.34)", "libc6 (>= 2.14)"]) == [
+        "libc6 (>= 2.34)"
+    ]
+
+
+def test_ld_so_conf_dirs(tmp_path: Path):
+    conf_dir = tmp_path / "ld.so.conf.d"
+    conf_dir.mkdir()
+    (conf_dir / "b.conf").write_text("# second\n/opt/b/lib\n")
+    (conf_dir / "a.conf").write_text("/opt/a/lib:/opt/a/lib64 # comment\n")
+    (conf_dir / "a.txt").write_text("/ignored\n")
+    (tmp_path / "ld.so.conf").write_text(f"/usr/local/lib\ninclude {conf_dir}/*.conf\n")
+
+    assert shlibdeps.ld_so_conf_dirs(tmp_path / "ld.so.conf") == [
+        "/usr/local/lib",
+        "/opt/a/lib",
+        "/opt/a/lib64",
+        "/opt/b/lib",
+    ]
+
+
+def test_resolve_with_runpath(tmp_path: Path):
+    index = shlibdeps.DpkgIndex(
+        libraries={"libplugin.so.1": [("/usr/lib/foo/libplugin.so.1", "libfoo-plugins")]},
+        symbols={},
+        shlibs={"libfoo-plugins": {"libplugin 1": "libfoo-plugins (>= 1.2)"}},
+    )
+    resolver = shlibdeps._Resolver(index, ["/usr/lib"])
+    info = shlibdeps._ObjectInfo(
+        path=tmp_path / "usr/bin/foo",
+        soname=None,
+        needed=["libplugin.so.1"],
+        undefined=[],
+        version_requirements={},
+        library_path=["$ORIGIN/../lib/foo"],
+    )
+
+    with pytest.raises(LookupError, match=r"no installed package provides libplugin\.so\.1"):
+        resolver.dependency("libplugin.so.1", info)
+    search_dirs = shlibdeps.expand_origin(info.library_path, "/usr/bin")
+    assert resolver.dependency("libplugin.so.1", info, search_dirs) == "libfoo-plugins (>= 1.2)"
+
+
+@pytest.mark.skipif(not shutil.which("gcc"), reason="needs gcc")
+def test_read_object_runpath(tmp_path: Path):
+    source = tmp_path / "main.c"
+    source.write_text("int main(void) { return 0; }\n")
+    binary = tmp_path / "main"
+    subprocess.run(
+        ["gcc", "-Wl,--enable-new-dtags", "-Wl,-rpath,$ORIGIN/../lib/foo:/opt/foo", "-o", binary, source], check=True
+    )
+
+    info = shlibdeps._read_object(binary)
+    assert info is not None
+    assert info.library_path == ["$ORIGIN/../lib/foo", "/opt/foo"]
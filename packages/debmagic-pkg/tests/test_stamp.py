@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from debmagic.v0._stamp import Stamp, fingerprint
+
+
+def test_fingerprint(tmp_path: Path):
+    config = tmp_path / "config"
+    missing = fingerprint("a", files=[config])
+    config.write_text("x")
+    created = fingerprint("a", files=[config])
+
+    assert missing != created
+    assert fingerprint("a", files=[config]) == created
+    config.write_text("y")
+    assert fingerprint("a", files=[config]) != created
+    # the values are separated, so their boundaries matter
+    assert fingerprint("ab", "c") != fingerprint("a", "bc")
+
+
+def test_stamp(tmp_path: Path):
+    stamp = Stamp(tmp_path / "state" / "configure")
+    assert not stamp.matches("abc")
+
+    stamp.write("abc")
+    assert stamp.matches("abc")
+    assert not stamp.matches("def")
+    assert list(stamp.path.parent.iterdir()) == [stamp.path]
+
+    stamp.remove()
+    stamp.remove()
+    assert not stamp.matches("abc")
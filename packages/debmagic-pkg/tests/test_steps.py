@@ -0,0 +1,126 @@
+import threading
+from pathlib import Path
+
+import pytest
+from debmagic.v0 import Build, Preset
+from debmagic.v0._build_stage import BuildStage
+from debmagic.v0._steps import Step, StepGraph
+
+
+def test_step_graph_order(make_build):
+    build = make_build(["foo"])
+    ran: list[str] = []
+    both_running = threading.Barrier(2, timeout=5)
+
+    def step(name: str, concurrent: bool = False):
+        def run(build: Build) -> None:
+            if concurrent:
+                # fails unless both steps run at the same time
+                both_running.wait()
+            ran.append(name)
+
+        return run
+
+    graph = StepGraph(BuildStage.build)
+    graph.add(Step("compile", step("compile")))
+    graph.add(Step("docs", step("docs", concurrent=True), after=("compile",)))
+    graph.add(Step("manpages", step("manpages", concurrent=True), after=("compile",)))
+    graph.add(Step("generate", step("generate"), before=("compile",)))
+    graph.run(build)
+    assert ran[:2] == ["generate", "compile"]
+    assert sorted(ran[2:]) == ["docs", "manpages"]
+
+    graph.add(Step("cycle", step("cycle"), after=("docs",), before=("generate",)))
+    with pytest.raises(ValueError, match=r"depend on each other: .*cycle"):
+        graph.run(build)
+
+
+def test_step_skipped_when_inputs_unchanged(make_build, tmp_path: Path):
+    build = make_build(["foo"])
+    (tmp_path / "doc").mkdir()
+    (tmp_path / "doc" / "index.rst").write_text("docs\n")
+    runs: list[str] = []
+
+    def docs(build: Build) -> None:
+        runs.append("docs")
+        (tmp_path / "html").mkdir(exist_ok=True)
+
+    graph = StepGraph(BuildStage.build)
+    graph.add(Step("docs", docs, inputs=("doc/*.rst",), outputs=("html",)))
+    graph.run(build)
+    graph.run(build)
+    assert runs == ["docs"]
+
+    (tmp_path / "doc" / "index.rst").write_text("changed docs\n")
+    graph.run(build)
+    (tmp_path / "html").rmdir()
+    graph.run(build)
+    assert runs == ["docs", "docs", "docs"]
+
+
+def test_rules_steps_with_preset_steps(make_build, tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("DEBMAGIC_CACHE_DIR", str(tmp_path / "cache"))
+    ran: list[str] = []
+
+    class StepPreset(Preset):
+        def build(self, build: Build) -> None:
+            raise AssertionError("the steps are run instead")
+
+        def steps(self, stage: BuildStage) -> list[Step] | None:
+            return [
+                Step("configure", lambda build: ran.append("configure")),
+                Step("make", lambda build: ran.append("make"), after=("configure",)),
+            ]
+
+    build = make_build(["foo"])
+    build.package.presets = [StepPreset()]
+    build.package.stage_functions = {}
+    build.package.stage_steps = {BuildStage.build: [Step("docs", lambda build: ran.append("docs"), after=("make",))]}
+    build.package.custom_functions = {}
+    (tmp_path / "debian").mkdir()
+    build._completed_stages = {stage for stage in BuildStage if stage != BuildStage.build}
+
+    build.run(BuildStage.build)
+    assert ran == ["configure", "make", "docs"]
+    assert build.is_stage_completed(BuildStage.build)
+    assert (tmp_path / "cache" / "step-durations" / "foo.json").is_file()
+
+
+def test_step_skipped_in_next_build(make_build, tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("DEBMAGIC_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "debian").mkdir()
+    (tmp_path / "doc").mkdir()
+    (tmp_path / "doc" / "index.rst").write_text("docs\n")
+    ran: list[str] = []
+
+    def docs(build: Build) -> None:
+        ran.append("docs")
+        (tmp_path / "html").mkdir(exist_ok=True)
+
+    class StepPreset(Preset):
+        def clean(self, build: Build) -> None:
+            ran.append("clean")
+
+        def prepare(self, build: Build) -> None: ...
+
+        def configure(self, build: Build) -> None: ...
+
+        def build(self, build: Build) -> None: ...
+
+        def steps(self, stage: BuildStage) -> list[Step] | None:
+            if stage == BuildStage.build:
+                return [Step("docs", docs, inputs=("doc/*.rst",), outputs=("html",))]
+            return None
+
+    def run_build() -> None:
+        build = make_build(["foo"])
+        build.package.presets = [StepPreset()]
+        build.package.stage_functions = {}
+        build.package.stage_steps = {}
+        build.package.custom_functions = {}
+        build.run(BuildStage.build)
+
+    # each build starts with the clean stage, which keeps the step stamps
+    run_build()
+    run_build()
+    assert ran == ["clean", "docs", "clean"]
@@ -0,0 +1,47 @@
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from debmagic.common.elf import ET_DYN, ElfFile
+from debmagic.v0 import strip
+
+
+@pytest.mark.skipif(not (shutil.which("gcc") and shutil.which("objcopy")), reason="needs gcc and binutils")
+def test_strip(tmp_path: Path, make_build):
+    bin_dir = tmp_path / "debian" / "pkg" / "usr" / "bin"
+    bin_dir.mkdir(parents=True)
+    source = tmp_path / "hello.c"
+    source.write_text("int main(void) { return 0; }\n")
+    binary = bin_dir / "hello"
+    subprocess.run(["gcc", "-g", "-Wl,--build-id", "-o", binary, source], check=True)
+    hardlink = bin_dir / "hello-link"
+    os.link(binary, hardlink)
+
+    elf = ElfFile.read(binary)
+    assert elf is not None and elf.type == ET_DYN and elf.has_debug_info
+    build_id = elf.build_id
+    assert build_id
+
+    build = make_build(["pkg"])
+    # the hardlinked binary is stripped once
+    assert len(strip._find_objects(build, "pkg", tmp_path / "debian" / "pkg", set())) == 1
+    strip.dh_strip(build)
+
+    stripped = ElfFile.read(binary)
+    assert stripped is not None and not stripped.has_debug_info and not stripped.has_symtab
+    assert stripped.section(".gnu_debuglink") is not None
+    assert hardlink.stat().st_ino == binary.stat().st_ino
+
+    debug_file = strip.dbgsym_dir(build, "pkg") / strip.debug_file_path(build_id)
+    assert debug_file.is_file()
+    assert (tmp_path / "debian" / ".debhelper" / "pkg" / "dbgsym-build-ids").read_text() == build_id
+    index = json.loads((build.state_dir / "build-ids.json").read_text())
+    assert index[build_id]["file"] == "/usr/bin/hello"
+
+
+def test_not_elf(tmp_path: Path):
+    (tmp_path / "script").write_text("#!/bin/sh\n")
+    assert ElfFile.read(tmp_path / "script") is None
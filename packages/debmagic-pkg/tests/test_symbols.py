@@ -0,0 +1,80 @@
+from pathlib import Path
+
+from debmagic.common.symbols_file import parse_symbols_file, read_symbols_file
+from debmagic.v0 import ReplayExecutor, symbols
+
+TEMPLATE = """\
+libfoo.so.1 libfoo1 #MINVER#
+* Build-Depends-Package: libfoo-dev
+ foo_init@Base 1.0
+ foo_gone@Base 1.0
+ (optional)foo_opt@Base 1.1
+ (arch=!amd64)foo_arm@Base 1.2
+ (symver)FOO_2 2.0
+ (c++)"foo::bar()@Base" 1.3
+"""
+
+
+def test_compare():
+    exports = symbols.LibraryExports(
+        path=Path("libfoo.so.1"),
+        soname="libfoo.so.1",
+        symbols=[
+            symbols.ExportedSymbol("foo_init@Base"),
+            symbols.ExportedSymbol("foo_new@Base"),
+            symbols.ExportedSymbol("foo_v2@FOO_2"),
+            symbols.ExportedSymbol("_ZN3foo3barEv@Base", demangled="foo::bar()@Base"),
+            symbols.ExportedSymbol("_init@Base"),
+        ],
+    )
+    result = symbols.compare("libfoo1", [exports], parse_symbols_file(TEMPLATE), "2.1-1", "amd64")
+
+    assert (result.new_symbols, result.lost_symbols) == (1, 1)
+    assert symbols.render(result.libraries, "amd64", with_missing=True) == (
+        "libfoo.so.1 libfoo1 #MINVER#\n"
+        "* Build-Depends-Package: libfoo-dev\n"
+        " (symver)FOO_2 2.0\n"
+        ' (c++)"foo::bar()@Base" 1.3\n'
+        "#MISSING: 2.1-1# foo_gone@Base 1.0\n"
+        " foo_init@Base 1.0\n"
+        " foo_new@Base 2.1-1\n"
+    )
+
+
+def test_new_library():
+    exports = symbols.LibraryExports(
+        path=Path("libbar.so.2"), soname="libbar.so.2", symbols=[symbols.ExportedSymbol("bar@Base")]
+    )
+    result = symbols.compare("libbar2", [exports], [], "1.0", "amd64")
+    assert result.new_libraries == ["libbar.so.2"]
+    assert symbols.render(result.libraries, "amd64") == "libbar.so.2 libbar2 #MINVER#\n bar@Base 1.0\n"
+
+
+def test_read_symbols_file_include_and_package(tmp_path: Path):
+    (tmp_path / "common.symbols").write_text(" foo_common@Base 1.0\n")
+    (tmp_path / "libfoo1.symbols").write_text(
+        '# comment\nlibfoo.so.1 #PACKAGE# #MINVER#\n foo_init@Base 1.0\n#include "common.symbols"\n'
+    )
+    (library,) = read_symbols_file(tmp_path / "libfoo1.symbols", package="libfoo1")
+    assert library.dependencies == ["libfoo1 #MINVER#"]
+    assert list(library.symbols) == ["foo_init@Base", "foo_common@Base"]
+
+
+def test_check_levels():
+    lost_symbol = symbols.SymbolsResult(package="libfoo1", libraries=[], lost_symbols=1)
+    new_symbol = symbols.SymbolsResult(package="libfoo1", libraries=[], new_symbols=1)
+    lost_library = symbols.SymbolsResult(package="libfoo1", libraries=[], lost_libraries=["libfoo.so.0"])
+    new_library = symbols.SymbolsResult(package="libfoo1", libraries=[], new_libraries=["libfoo.so.2"])
+    results = [lost_symbol, new_symbol, lost_library, new_library]
+    for level in range(5):
+        assert [symbols.check_failed(result, level) for result in results] == [i < level for i in range(4)]
+
+
+def test_demangle_through_executor():
+    exported = [symbols.ExportedSymbol("_ZN3foo3barEv@Base"), symbols.ExportedSymbol("foo_init@Base")]
+    executor = ReplayExecutor().respond(["c++filt"], stdout="foo::bar()\n")
+
+    symbols._demangle(exported, executor)
+
+    assert executor.calls[0].options["input"] == "_ZN3foo3barEv\n"
+    assert [symbol.demangled for symbol in exported] == ["foo::bar()@Base", None]
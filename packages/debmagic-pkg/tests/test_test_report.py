@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from debmagic.v0._test_report import CheckReport, collect_automake_results
+
+
+def test_automake_results(tmp_path: Path):
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "ok.sh.trs").write_text(
+        ":test-result: PASS\n:global-test-result: PASS\n:recheck: no\n:copy-in-global-log: no\n"
+        ":debmagic-duration: 1.500\n"
+    )
+    # tap test without global result
+    (tmp_path / "tests" / "suite.tap.trs").write_text(":test-result: PASS\n:test-result: FAIL 2 - broken\n")
+
+    report = CheckReport()
+    report.update(collect_automake_results(tmp_path))
+
+    assert report.results["tests/ok.sh"].result == "PASS"
+    assert report.results["tests/ok.sh"].duration == 1.5
+    assert report.results["tests/suite.tap"].result == "FAIL"
+    assert [result.name for result in report.failed] == ["tests/suite.tap"]
+
+    # a successful retry
+    (tmp_path / "tests" / "suite.tap.trs").write_text(":test-result: PASS\n:global-test-result: PASS\n")
+    report.update([result for result in collect_automake_results(tmp_path) if result.name == "tests/suite.tap"])
+
+    assert not report.failed
+    assert report.results["tests/suite.tap"].flaky
+    assert report.summary() == "2 tests: 2 PASS, 1 flaky"
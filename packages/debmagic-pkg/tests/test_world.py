@@ -0,0 +1,250 @@
+import io
+import json
+import re
+import socket
+import textwrap
+import threading
+from pathlib import Path
+
+import pytest
+from debmagic.world import BuildGraph, PackageStatus, RemoteBuilder, World, WorldError, WorldPackage
+from debmagic.world._protocol import Connection, ProtocolError, connect, listen
+from debmagic.world._repo import LocalRepository
+from debmagic.world.worker import Worker
+
+# builds a .deb of each binary package and a .changes file, like dpkg-buildpackage -b
+FAKE_BUILD = """#!/bin/sh
+set -e
+[ ! -e debian/fail ]
+name=$(sed -n 's/^Source: //p' debian/control)
+files=""
+for pkg in $(sed -n 's/^Package: //p' debian/control); do
+    mkdir -p "debian/$pkg/DEBIAN"
+    printf 'Package: %s\\nVersion: 1.0\\nArchitecture: all\\n' "$pkg" > "debian/$pkg/DEBIAN/control"
+    printf 'Maintainer: x <x@example.com>\\nDescription: x\\n' >> "debian/$pkg/DEBIAN/control"
+    dpkg-deb --root-owner-group -Zgzip --build "debian/$pkg" "../${pkg}_1.0_all.deb" > /dev/null
+    files="$files\\n 0 0 misc optional ${pkg}_1.0_all.deb"
+done
+printf "Source: $name\\nFiles:$files\\n" > "../${name}_1.0_all.changes"
+echo "$name" >> "$1"
+"""
+
+
+def _source(base: Path, name: str, binaries: list[str], build_depends: str = "") -> Path:
+    debian_dir = base / name / "debian"
+    debian_dir.mkdir(parents=True)
+    control = f"Source: {name}\nBuild-Depends: {build_depends}\n" if build_depends else f"Source: {name}\n"
+    for binary in binaries:
+        control += f"\nPackage: {binary}\nArchitecture: all\n"
+    (debian_dir / "control").write_text(control)
+    (debian_dir / "changelog").write_text(
+        textwrap.dedent(f"""\
+            {name} (1.0) unstable; urgency=medium
+
+              * entry
+
+             -- x <x@example.com>  Mon, 01 Jan 2024 00:00:00 +0000
+            """)
+    )
+    return base / name
+
+
+def test_graph(tmp_path: Path):
+    sources = [
+        _source(tmp_path, "app", ["app"], "libfoo-dev (>= 1.0), tool | other-tool"),
+        _source(tmp_path, "libfoo", ["libfoo1", "libfoo-dev"], "debhelper"),
+        _source(tmp_path, "tool", ["tool"]),
+        _source(tmp_path, "docs", ["docs"]),
+    ]
+    graph = BuildGraph.from_packages([WorldPackage.from_source_dir(path) for path in sources])
+    assert graph.dependencies["app"] == {"libfoo", "tool"}
+    assert graph.topological_order() == ["docs", "libfoo", "tool", "app"]
+    assert graph.critical_path({"app": 10, "libfoo": 5}) == {"app": 10, "libfoo": 15, "tool": 11, "docs": 1}
+
+
+def test_graph_cycle(tmp_path: Path):
+    sources = [_source(tmp_path, "a", ["a"], "b"), _source(tmp_path, "b", ["b"], "a")]
+    with pytest.raises(WorldError, match="cycle: a -> b -> a"):
+        BuildGraph.from_packages([WorldPackage.from_source_dir(path) for path in sources])
+
+
+def test_world_build_cmd_without_repo(tmp_path: Path):
+    src = tmp_path / "src"
+    sources = [_source(src, "app", ["app"], "libfoo-dev"), _source(src, "libfoo", ["libfoo1", "libfoo-dev"])]
+
+    with pytest.raises(WorldError, match="app build-depend on packages of the world"):
+        World(sources, tmp_path / "world").build()
+    # sources without dependencies on each other can use any command
+    World(sources[1:], tmp_path / "world2", build_cmd=["true"])._check_build_cmd()
+
+
+def test_world(tmp_path: Path):
+    build_script = tmp_path / "fake-build"
+    build_script.write_text(FAKE_BUILD)
+    build_script.chmod(0o755)
+    build_log = tmp_path / "built.log"
+
+    src = tmp_path / "src"
+    sources = [
+        _source(src, "app", ["app"], "libfoo-dev"),
+        _source(src, "libfoo", ["libfoo1", "libfoo-dev"]),
+        _source(src, "tool", ["tool"]),
+    ]
+    (src / "libfoo" / "debian" / "fail").touch()
+
+    def world() -> World:
+        return World(sources, tmp_path / "world", jobs=2, build_cmd=[str(build_script), str(build_log), "{repo}"])
+
+    assert not world().build()
+    state = json.loads((tmp_path / "world" / "state.json").read_text())["packages"]
+    assert {name: entry["status"] for name, entry in state.items()} == {
+        "app": PackageStatus.blocked,
+        "libfoo": PackageStatus.failed,
+        "tool": PackageStatus.done,
+    }
+    assert build_log.read_text() == "tool\n"
+
+    # resume: only what failed and what depends on it is built
+    (src / "libfoo" / "debian" / "fail").unlink()
+    assert world().build()
+    assert build_log.read_text() == "tool\nlibfoo\napp\n"
+    packages = (tmp_path / "world" / "repo" / "Packages").read_text()
+    assert "Package: libfoo-dev" in packages and "Package: app" in packages
+    assert "up-to-date" in (tmp_path / "world" / "status.txt").read_text()
+
+    # the build outputs in the source trees don't count, but changed sources do
+    assert world().build()
+    assert build_log.read_text() == "tool\nlibfoo\napp\n"
+    (src / "tool" / "main.c").write_text("int main;\n")
+    assert world().build()
+    assert build_log.read_text() == "tool\nlibfoo\napp\ntool\n"
+
+
+def _start_worker(
+    tmp_path: Path, name: str, capacity: int, token: str | None = None, worker_class: type[Worker] = Worker
+) -> tuple[Worker, str]:
+    worker = worker_class(tmp_path / name, capacity=capacity, token=token)
+    address = f"unix:{tmp_path / f'{name}.sock'}"
+    ready = threading.Event()
+    threading.Thread(target=worker.serve, args=(address,), kwargs={"ready": ready}, daemon=True).start()
+    ready.wait()
+    return worker, address
+
+
+def test_world_remote(tmp_path: Path):
+    build_script = tmp_path / "fake-build"
+    build_script.write_text(FAKE_BUILD)
+    build_script.chmod(0o755)
+    build_log = tmp_path / "built.log"
+    src = tmp_path / "src"
+    sources = [_source(src, "app", ["app"], "libfoo-dev"), _source(src, "libfoo", ["libfoo1", "libfoo-dev"])]
+
+    worker_a, address_a = _start_worker(tmp_path, "a", capacity=1)
+    worker_b, address_b = _start_worker(tmp_path, "b", capacity=2)
+    try:
+        builder = RemoteBuilder([address_a, address_b, f"unix:{tmp_path / 'gone.sock'}"], tmp_path / "incoming")
+        assert builder.capacity == 3
+        # b has the most free slots, but goes away: its builds are retried on a
+        worker_b.shutdown()
+
+        def world(rebuild: bool = False) -> World:
+            return World(
+                sources,
+                tmp_path / "world",
+                build_cmd=[str(build_script), str(build_log), "{repo}"],
+                rebuild=rebuild,
+                builder=builder,
+            )
+
+        assert world().build()
+        assert build_log.read_text() == "libfoo\napp\n"
+        assert (tmp_path / "incoming" / "app" / "app_1.0_all.deb").is_file()
+        libfoo_log = (tmp_path / "world" / "logs" / "libfoo.log").read_text()
+        assert f"worker {address_b} failed" in libfoo_log
+        assert f"building on worker {address_a}" in libfoo_log
+
+        # only what the worker hasn't cached is sent again
+        assert world(rebuild=True).build()
+        libfoo_log = (tmp_path / "world" / "logs" / "libfoo.log").read_text()
+        sent, total = (int(count) for count in re.findall(r"sending (\d+) of (\d+) files", libfoo_log)[-1])
+        # the source tree is cached, the repository got app's packages since
+        assert 0 < sent < total
+    finally:
+        worker_a.shutdown()
+
+
+def test_worker_security(tmp_path: Path):
+    with pytest.raises(WorldError, match="requires a token"):
+        Worker(tmp_path / "tcp").serve("127.0.0.1:0")
+
+    worker, address = _start_worker(tmp_path, "w", capacity=1, token="secret")
+    try:
+        with pytest.raises(WorldError, match="none of the workers is available"):
+            RemoteBuilder([address], tmp_path / "incoming", token="wrong")
+        assert RemoteBuilder([address], tmp_path / "incoming", token="secret").capacity == 1
+    finally:
+        worker.shutdown()
+
+    for source_name in ("..", "../../outside", ""):
+        job = {"source_name": source_name, "source": [], "repo": []}
+        with pytest.raises(ProtocolError, match="invalid source name"):
+            worker._run_job(None, job)  # ty:ignore[invalid-argument-type]
+
+    with pytest.raises(ProtocolError, match="invalid blob digest"):
+        worker._materialize(tmp_path / "tree", [{"path": "a", "sha256": "../../etc/passwd", "mode": 0o644}], copy=True)
+
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    entries = [{"path": "link", "link": str(outside)}, {"path": "link/file", "sha256": "0" * 64, "mode": 0o644}]
+    with pytest.raises(ProtocolError, match="below a symlink"):
+        worker._materialize(tmp_path / "tree2", entries, copy=True)
+    assert list(outside.iterdir()) == []
+
+
+def test_connection_keepalive():
+    server = listen("127.0.0.1:0")
+    host, port = server.getsockname()[:2]
+    try:
+        client = Connection(connect(f"{host}:{port}", timeout=5))
+        accepted, _ = server.accept()
+        served = Connection(accepted)
+        for conn in (client, served):
+            assert conn._sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+        client.close()
+        served.close()
+    finally:
+        server.close()
+
+
+class _FlakyWorker(Worker):
+    """drops the connection of its first job"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failed = False
+
+    def _run_job(self, conn, job):
+        if not self.failed:
+            self.failed = True
+            raise ProtocolError("dropped")
+        super()._run_job(conn, job)
+
+
+def test_remote_worker_kept_after_failed_job(tmp_path: Path):
+    build_script = tmp_path / "fake-build"
+    build_script.write_text(FAKE_BUILD)
+    build_script.chmod(0o755)
+    package = WorldPackage.from_source_dir(_source(tmp_path / "src", "libfoo", ["libfoo1"]))
+    repo = LocalRepository(tmp_path / "repo")
+
+    worker, address = _start_worker(tmp_path, "w", capacity=1, worker_class=_FlakyWorker)
+    try:
+        builder = RemoteBuilder([address], tmp_path / "incoming")
+        build_cmd = [str(build_script), str(tmp_path / "built.log")]
+        # the job isn't retried on the same worker, but the worker still answers and builds the next job
+        with pytest.raises(WorldError, match="no worker left"):
+            builder.build(package, build_cmd, repo, io.BytesIO())
+        debs = builder.build(package, build_cmd, repo, io.BytesIO())
+        assert debs == [tmp_path / "incoming" / "libfoo" / "libfoo1_1.0_all.deb"]
+    finally:
+        worker.shutdown()